@@ -1,20 +1,45 @@
 import os
+import gzip
+import hashlib
+import heapq
 import json
+import math
+import threading
+import time
 import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
+import numpy as np
+import shapely
 import uvicorn
-from fastapi import FastAPI, Query, Body
+from fastapi import FastAPI, Query, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
+from starlette.concurrency import run_in_threadpool
 
 from pyproj import Transformer
-from shapely.geometry import shape as shp_shape, mapping as shp_mapping, Point
-from shapely.ops import unary_union, transform as shp_transform
-from shapely.strtree import STRtree
+from shapely.geometry import shape as shp_shape, mapping as shp_mapping
+from shapely.ops import unary_union
 
 from pydantic import BaseModel, Field
+from scipy.spatial import cKDTree
+
+import cache_geo
+import teselas
+
+try:  # opcionales: si están, JSON más rápido y brotli además de gzip
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # ===== NUEVO: Modelos Pydantic para la creación de instancias =====
 class InstancePoint(BaseModel):
@@ -31,6 +56,22 @@ class InstancePayload(BaseModel):
     c1: float
     c2: float
 
+class BuildInstancePayload(BaseModel):
+    name: str = Field(..., description="Nombre del archivo, ej: MiInstancia.dat")
+    alcaldia: str
+    spacing_m: float = Field(250, ge=10, le=2000, description="Separación de la malla de nodos de demanda")
+    min_dist_m: float = Field(0, ge=0, le=2000, description="Distancia mínima de los nodos a cámaras existentes")
+    impacto_delito: Optional[str] = None
+    modelo_prob: Literal["uniforme", "conteo", "proporcional"] = Field(
+        "proporcional", description="prob_ohca: 1.0 | reportes del nodo | reportes / máximo")
+    incluir_vacios: bool = Field(False, description="Mantener nodos de la malla sin reportes asignados")
+    incluir_camaras: bool = True
+    prob_camaras: float = 1.0
+    presupuesto: float = Field(alias="P")
+    radio: float = Field(alias="R")
+    c1: float
+    c2: float
+
 # ===================== Config =====================
 BASE = Path(__file__).resolve().parent
 
@@ -40,7 +81,22 @@ DEMOG_PATH = Path(os.getenv("DEMOG_FILE", BASE / "INSTANCES Camera/DatosProcesad
 COLONIAS_PATH = Path(os.getenv("COLONIAS_FILE", BASE / "INSTANCES Camera/DatosProcesadosGeoJSON/GeoJSON/GeoColonias.geojson"))
 REPORTES_PATH = Path(os.getenv("REPORTES_FILE", BASE / "INSTANCES Camera/DatosProcesadosGeoJSON/GeoJSON/reportes_incidenciaU.geojson"))
 
-app = FastAPI(title="Cámaras CDMX – Instancias")
+# Respuestas serializadas que se guardan (LRU; /densidad agrega una por combinación de parámetros)
+MAX_RESPUESTAS = int(os.getenv("MAX_RESPUESTAS", 256))
+# Celdas de la malla que se evalúan por bloque (acota la memoria con spacing fino)
+GRID_CELDAS_BLOQUE = int(os.getenv("GRID_CELDAS_BLOQUE", 1 << 20))
+# Cargar todas las capas en segundo plano al arrancar (PRECARGAR_CAPAS=0 para cargarlas a pedido)
+PRECARGAR_CAPAS = os.getenv("PRECARGAR_CAPAS", "1") != "0"
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    if PRECARGAR_CAPAS:
+        # no se espera: el servidor atiende de inmediato y los pedidos que
+        # necesiten una capa todavía en carga esperan esa misma carga
+        threading.Thread(target=_precargar_capas, name="precarga-capas", daemon=True).start()
+    yield
+
+app = FastAPI(title="Cámaras CDMX – Instancias", lifespan=_lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
@@ -53,42 +109,104 @@ _tf_wgs2utm = Transformer.from_crs(4326, 32614, always_xy=True)  # (lon,lat)->(x
 
 # Caches
 _cache_points: Dict[str, Any] | None = None
-_meta_cache: Dict[str, List[str]] | None = None
+_meta_cache: Dict[str, List[str]] = {}  # se reemplaza entero (copia) al agregar claves
+_meta_lock = threading.Lock()
 _hulls_cache: Dict[str, Any] | None = None  # fronteras por alcaldía (WGS84)
 _colonias_cache: Dict[str, Any] | None = None  # colonias (WGS84)
 _reportes_cache: Dict[str, Any] | None = None  # reportes (WGS84)
+# Índices invertidos (posiciones en "features"), armados una vez al cargar
+_indice_points: Dict[str, List[int]] = {}  # alcaldía normalizada -> posiciones
+_indice_reportes: Dict[str, Dict[Any, List[int]]] = {}  # "alc", "imp", "alc_imp" -> {clave: posiciones}
+_reportes_xy: np.ndarray = np.empty((0, 2))  # reportes en UTM (m), nan si no tienen geometría
 
 # ===================== Utiles =====================
+def _una_vez(fn):
+    """
+    Carga single-flight: la primera llamada ejecuta fn y las concurrentes esperan
+    esa misma carga en vez de repetirla. Si fn falla, la próxima llamada reintenta.
+    """
+    lock = threading.Lock()
+
+    @wraps(fn)
+    def envoltura():
+        if envoltura.listo: return
+        with lock:
+            if not envoltura.listo:
+                fn()
+                envoltura.listo = True
+    envoltura.listo = False
+    return envoltura
+
+async def _asegurar(*cargas):
+    """Desde una ruta async: espera las capas pendientes en el threadpool sin bloquear el event loop."""
+    for carga in cargas:
+        if not carga.listo:
+            await run_in_threadpool(carga)
+
+def _actualizar_meta(**claves):
+    global _meta_cache
+    with _meta_lock:
+        _meta_cache = {**_meta_cache, **claves}
+
 def _normalize(s: str) -> str:
     if not isinstance(s, str): return ""
     s = s.casefold()
     return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
 
+def _xy_utm_to_wgs(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    """Arreglos x, y (m) -> lon, lat en una sola llamada a pyproj."""
+    return _tf_utm2wgs.transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+
+def _xy_wgs_to_utm(lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+    """Arreglos lon, lat -> x, y (m) en una sola llamada a pyproj."""
+    return _tf_wgs2utm.transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+def _coords_utm_to_wgs(coords: np.ndarray) -> np.ndarray:
+    return np.column_stack(_xy_utm_to_wgs(coords[:, 0], coords[:, 1]))
+
+def _coords_wgs_to_utm(coords: np.ndarray) -> np.ndarray:
+    return np.column_stack(_xy_wgs_to_utm(coords[:, 0], coords[:, 1]))
+
 def _geom_utm_to_wgs(geom):
-    return shp_transform(lambda x, y, z=None: _tf_utm2wgs.transform(x, y), geom)
+    """Geometría (o arreglo de geometrías) UTM -> WGS84; todas las coordenadas van juntas a pyproj."""
+    return shapely.transform(geom, _coords_utm_to_wgs)
 
 def _geom_wgs_to_utm(geom):
-    return shp_transform(lambda lon, lat, z=None: _tf_wgs2utm.transform(lon, lat), geom)
+    return shapely.transform(geom, _coords_wgs_to_utm)
 
 # ===================== Puntos existentes =====================
 def _transform_points_geojson(data: Dict[str, Any]) -> Dict[str, Any]:
     feats = data.get("features", [])
-    for f in feats:
+    # se juntan las coordenadas válidas y se transforman todas de una vez
+    idx, xs, ys, fallidos = [], [], [], []
+    for i, f in enumerate(feats):
         g = f.get("geometry")
         if not g or g.get("type") != "Point": continue
         coords = g.get("coordinates") or []
         if len(coords) < 2: continue
-        x, y = coords[0], coords[1]
         try:
-            lon, lat = _tf_utm2wgs.transform(float(x), float(y))
-            g["coordinates"] = [lon, lat]
-        except Exception:
-            p = f.get("properties", {})
-            lat2 = p.get("latitud"); lon2 = p.get("longitud")
-            if isinstance(lat2, (int,float)) and isinstance(lon2, (int,float)):
-                g["coordinates"] = [float(lon2), float(lat2)]
+            x, y = float(coords[0]), float(coords[1])
+        except (TypeError, ValueError):
+            fallidos.append(f)
+            continue
+        idx.append(i); xs.append(x); ys.append(y)
+
+    if idx:
+        lon, lat = _xy_utm_to_wgs(xs, ys)
+        ok = np.isfinite(lon) & np.isfinite(lat)  # pyproj marca con inf lo que no pudo transformar
+        for i, lo, la, bien in zip(idx, lon.tolist(), lat.tolist(), ok.tolist()):
+            if bien:
+                feats[i]["geometry"]["coordinates"] = [lo, la]
             else:
-                f["geometry"] = None
+                fallidos.append(feats[i])
+
+    for f in fallidos:
+        p = f.get("properties", {})
+        lat2 = p.get("latitud"); lon2 = p.get("longitud")
+        if isinstance(lat2, (int,float)) and isinstance(lon2, (int,float)):
+            f["geometry"]["coordinates"] = [float(lon2), float(lat2)]
+        else:
+            f["geometry"] = None
     data["crs"] = {"type":"name","properties":{"name":"urn:ogc:def:crs:EPSG::4326"}}
     return data
 
@@ -99,26 +217,33 @@ def _load_points() -> Dict[str, Any]:
         raw = json.load(fh)
     return _transform_points_geojson(raw)
 
+@_una_vez
 def _ensure_points_meta():
-    global _cache_points, _meta_cache
-    if _cache_points is None:
-        _cache_points = _load_points()
-        alcaldias = set()
-        for f in _cache_points.get("features", []):
-            p = f.get("properties", {})
-            if isinstance(p.get("alcaldia"), str):
-                alcaldias.add(p["alcaldia"].strip())
-        _meta_cache = {"alcaldias": sorted(alcaldias)}
-
-def _filter_points_by_alcaldia(feats: List[Dict[str, Any]], alcaldia: Optional[str]) -> List[Dict[str, Any]]:
+    global _cache_points, _indice_points
+    puntos = cache_geo.cargar_o_construir("camaras", [GEO_PATH], _load_points)
+    alcaldias = set()
+    indice: Dict[str, List[int]] = {}
+    for i, f in enumerate(puntos.get("features", [])):
+        p = f.get("properties") or {}
+        alc = p.get("alcaldia")
+        if isinstance(alc, str):
+            alcaldias.add(alc.strip())
+        indice.setdefault(_normalize(alc), []).append(i)
+    _actualizar_meta(alcaldias=sorted(alcaldias))
+    _indice_points = indice
+    _cache_points = puntos
+
+def _posiciones(indice: Dict[str, List[int]], n_alc: str) -> List[int]:
+    """Posiciones de las claves que contienen n_alc (coincidencia por subcadena, en orden original)."""
+    listas = [pos for clave, pos in indice.items() if n_alc in clave]
+    if len(listas) == 1:
+        return listas[0]
+    return list(heapq.merge(*listas))  # cada lista ya está en orden
+
+def _filter_points_by_alcaldia(alcaldia: Optional[str]) -> List[Dict[str, Any]]:
     if not alcaldia: return []
-    n_alc = _normalize(alcaldia)
-    out = []
-    for f in feats:
-        p = f.get("properties", {})
-        if n_alc in _normalize(p.get("alcaldia","")):
-            out.append(f)
-    return out
+    feats = _cache_points.get("features", [])
+    return [feats[i] for i in _posiciones(_indice_points, _normalize(alcaldia))]
 
 # ===== NUEVO: Carga y procesamiento de reportes de incidencia =====
 def _load_reports() -> Dict[str, Any]:
@@ -129,33 +254,138 @@ def _load_reports() -> Dict[str, Any]:
     # Reutilizamos la misma lógica de transformación de coordenadas
     return _transform_points_geojson(raw)
 
+@_una_vez
 def _ensure_reports_meta():
-    global _reportes_cache, _meta_cache
-    if _reportes_cache is None:
-        _reportes_cache = _load_reports()
-        impactos = set()
-        for f in _reportes_cache.get("features", []):
-            props = f.get("properties", {})
-            impacto = props.get("impacto_delito")
-            if isinstance(impacto, str) and impacto.strip():
-                impactos.add(impacto.strip())
-        # Asegurarnos que el meta_cache ya existe
-        if _meta_cache is None: _meta_cache = {}
-        _meta_cache["impactos_delito"] = sorted(list(impactos))
+    global _reportes_cache, _indice_reportes, _reportes_xy
+    reportes = cache_geo.cargar_o_construir("reportes", [REPORTES_PATH], _load_reports)
+    impactos = set()
+    indice: Dict[str, Dict[Any, List[int]]] = {"alc": {}, "imp": {}, "alc_imp": {}}
+    for i, f in enumerate(reportes.get("features", [])):
+        props = f.get("properties") or {}
+        impacto = props.get("impacto_delito")
+        impacto = impacto.strip() if isinstance(impacto, str) else ""
+        if impacto:
+            impactos.add(impacto)
+        n_alc = _normalize(props.get("alcaldia", ""))
+        indice["alc"].setdefault(n_alc, []).append(i)
+        indice["imp"].setdefault(impacto, []).append(i)
+        indice["alc_imp"].setdefault((n_alc, impacto), []).append(i)
+    # se agrega a meta sin pisar lo que cargó _ensure_points_meta
+    _actualizar_meta(impactos_delito=sorted(list(impactos)))
+    _indice_reportes = indice
+    _reportes_xy = _puntos_utm(reportes.get("features", []))
+    _reportes_cache = reportes
+
+def _puntos_utm(feats: List[Dict[str, Any]]) -> np.ndarray:
+    """Coordenadas UTM (n, 2) de features Point en WGS84, alineadas con 'feats' (nan sin geometría)."""
+    lonlat = np.full((len(feats), 2), np.nan)
+    for i, f in enumerate(feats):
+        g = f.get("geometry") or {}
+        coords = g.get("coordinates") or []
+        if g.get("type") == "Point" and len(coords) >= 2:
+            lonlat[i] = coords[0], coords[1]
+    return _coords_wgs_to_utm(lonlat) if len(lonlat) else np.empty((0, 2))
 
 # ===== NUEVO: Filtrado de reportes por alcaldía e impacto =====
-def _filter_reports(feats: List[Dict[str, Any]], alcaldia: Optional[str], impacto: Optional[str]) -> List[Dict[str, Any]]:
-    results = feats
-    if alcaldia:
-        n_alc = _normalize(alcaldia)
-        results = [f for f in results if _normalize(f.get("properties", {}).get("alcaldia", "")) == n_alc]
-    
-    if impacto:
-        # No normalizamos el impacto para mantener las categorías exactas
-        impacto_clean = impacto.strip()
-        results = [f for f in results if (f.get("properties", {}).get("impacto_delito", "") or "").strip() == impacto_clean]
-        
-    return results
+def _posiciones_reportes(alcaldia: Optional[str], impacto: Optional[str]) -> Optional[List[int]]:
+    """Posiciones de los reportes que cumplen los filtros (None = todos)."""
+    # No normalizamos el impacto para mantener las categorías exactas
+    n_alc = _normalize(alcaldia) if alcaldia else None
+    impacto_clean = impacto.strip() if impacto else None
+    if n_alc is not None and impacto_clean is not None:
+        return _indice_reportes["alc_imp"].get((n_alc, impacto_clean), [])
+    if n_alc is not None:
+        return _indice_reportes["alc"].get(n_alc, [])
+    if impacto_clean is not None:
+        return _indice_reportes["imp"].get(impacto_clean, [])
+    return None
+
+def _filter_reports(alcaldia: Optional[str], impacto: Optional[str]) -> List[Dict[str, Any]]:
+    feats = _reportes_cache.get("features", [])
+    pos = _posiciones_reportes(alcaldia, impacto)
+    if pos is None:
+        return list(feats)
+    return [feats[i] for i in pos]
+
+# ===================== Densidad de reportes =====================
+_SQRT3 = math.sqrt(3.0)
+
+def _celdas_hex(xy: np.ndarray, tam: float) -> np.ndarray:
+    """Celda (q, r) axial de hexágonos 'pointy-top' de radio 'tam' (m) con origen en (0, 0) UTM."""
+    q = (_SQRT3 / 3.0 * xy[:, 0] - xy[:, 1] / 3.0) / tam
+    r = (2.0 / 3.0 * xy[:, 1]) / tam
+    # redondeo cúbico: se corrige la coordenada que más se alejó al redondear
+    cx, cz = q, r
+    cy = -cx - cz
+    rx, ry, rz = np.rint(cx), np.rint(cy), np.rint(cz)
+    dx, dy, dz = np.abs(rx - cx), np.abs(ry - cy), np.abs(rz - cz)
+    corrige_x = (dx > dy) & (dx > dz)
+    corrige_z = ~corrige_x & (dz >= dy)
+    rx = np.where(corrige_x, -ry - rz, rx)
+    rz = np.where(corrige_z, -rx - ry, rz)
+    return np.column_stack((rx, rz)).astype(np.int64)
+
+def _centros_hex(celdas: np.ndarray, tam: float) -> np.ndarray:
+    q, r = celdas[:, 0], celdas[:, 1]
+    return np.column_stack((tam * _SQRT3 * (q + r / 2.0), tam * 1.5 * r))
+
+def _vertices(centros: np.ndarray, tam: float, forma: str) -> np.ndarray:
+    """(m, k+1, 2) vértices de cada celda, anillo cerrado, en UTM."""
+    if forma == "hex":
+        ang = np.radians(30.0 + 60.0 * np.arange(7))
+        dx, dy = tam * np.cos(ang), tam * np.sin(ang)
+    else:
+        h = tam / 2.0
+        dx, dy = np.array([-h, h, h, -h, -h]), np.array([-h, -h, h, h, -h])
+    return np.stack((centros[:, :1] + dx, centros[:, 1:] + dy), axis=2)
+
+@lru_cache(maxsize=64)
+def _densidad_reportes(forma: str, tam_m: float, alcaldia: Optional[str], impacto: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reportes agregados en celdas hexagonales (radio tam_m) o cuadradas (lado tam_m), en UTM.
+    Devuelve (centros (m, 2), conteos (m,)), ordenados por celda. Memoizada por parámetros.
+    """
+    _ensure_reports_meta()
+    pos = _posiciones_reportes(alcaldia, impacto)
+    xy = _reportes_xy if pos is None else _reportes_xy[np.asarray(pos, dtype=np.int64)]
+    xy = xy[np.isfinite(xy).all(axis=1)]
+    if not len(xy):
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    if forma == "hex":
+        celdas = _celdas_hex(xy, tam_m)
+    else:
+        celdas = np.floor(xy / tam_m).astype(np.int64)
+    unicas, conteos = np.unique(celdas, axis=0, return_counts=True)
+    centros = _centros_hex(unicas, tam_m) if forma == "hex" else (unicas + 0.5) * tam_m
+    centros.setflags(write=False); conteos.setflags(write=False)
+    return centros, conteos
+
+def _densidad_geojson(forma: str, tam_m: float, alcaldia: Optional[str], impacto: Optional[str]) -> Dict[str, Any]:
+    centros, conteos = _densidad_reportes(forma, tam_m, alcaldia, impacto)
+    total = int(conteos.sum())
+    features: List[Dict[str, Any]] = []
+    if len(centros):
+        # todos los vértices y centros en una sola transformación
+        verts = _vertices(centros, tam_m, forma)
+        m, k, _ = verts.shape
+        lonlat = np.round(_coords_utm_to_wgs(np.concatenate((verts.reshape(-1, 2), centros))), 6)
+        anillos, centros_wgs = lonlat[:m * k].reshape(m, k, 2).tolist(), lonlat[m * k:].tolist()
+        for anillo, centro, n in zip(anillos, centros_wgs, conteos.tolist()):
+            features.append({
+                "type": "Feature",
+                "properties": {"n": n, "peso": n / total, "centro": centro},
+                "geometry": {"type": "Polygon", "coordinates": [anillo]},
+            })
+    return {
+        "type": "FeatureCollection",
+        "name": "densidad_reportes",
+        "crs": {"type":"name","properties":{"name":"urn:ogc:def:crs:EPSG::4326"}},
+        "forma": forma,
+        "tam_m": tam_m,
+        "total": total,
+        "max_n": int(conteos.max()) if len(conteos) else 0,
+        "features": features,
+    }
 
 # ===================== Fronteras (disolver colonias) =====================
 def _build_hulls_from_demog() -> Dict[str, Any]:
@@ -178,9 +408,9 @@ def _build_hulls_from_demog() -> Dict[str, Any]:
         groups.setdefault(alc, []).append(g_utm)
 
     out_features: List[Dict[str, Any]] = []
-    for alc, geoms in groups.items():
-        dissolved_utm = unary_union(geoms)
-        dissolved_wgs = _geom_utm_to_wgs(dissolved_utm)
+    nombres = list(groups)
+    dissolved_wgs_all = _geom_utm_to_wgs(np.array([unary_union(groups[alc]) for alc in nombres], dtype=object))
+    for alc, dissolved_wgs in zip(nombres, dissolved_wgs_all):
         if dissolved_wgs.is_empty: continue
         out_features.append({
             "type":"Feature",
@@ -195,10 +425,10 @@ def _build_hulls_from_demog() -> Dict[str, Any]:
         "features": out_features
     }
 
+@_una_vez
 def _ensure_hulls():
     global _hulls_cache
-    if _hulls_cache is not None: return
-    _hulls_cache = _build_hulls_from_demog()
+    _hulls_cache = cache_geo.cargar_o_construir("fronteras", [DEMOG_PATH], _build_hulls_from_demog)
 
 def _get_hull_geometry_wgs(alcaldia: str):
     _ensure_hulls()
@@ -208,11 +438,13 @@ def _get_hull_geometry_wgs(alcaldia: str):
     return None
 
 # ===================== Colonias (polígonos) =====================
+@_una_vez
 def _ensure_colonias():
-    """Carga GeoColonias.json (EPSG:32614), transforma a WGS84 y agrupa por alcaldía."""
     global _colonias_cache
-    if _colonias_cache is not None:
-        return
+    _colonias_cache = cache_geo.cargar_o_construir("colonias", [COLONIAS_PATH], _build_colonias)
+
+def _build_colonias() -> Dict[str, Any]:
+    """Carga GeoColonias.json (EPSG:32614), transforma a WGS84 y agrupa por alcaldía."""
     if not COLONIAS_PATH.exists():
         raise FileNotFoundError(f"No se encontró GeoColonias.json en: {COLONIAS_PATH}")
     with open(COLONIAS_PATH, "r", encoding="utf-8") as fh:
@@ -222,6 +454,7 @@ def _ensure_colonias():
     by_alc: Dict[str, List[Dict[str, Any]]] = {}
     names: Dict[str, List[str]] = {}
 
+    validas: List[Tuple[str, str, Any]] = []
     for feat in gj.get("features", []):
         props = feat.get("properties", {}) or {}
         alc = (props.get("alcaldia") or "").strip()
@@ -230,19 +463,22 @@ def _ensure_colonias():
         if not alc or not col or not geom:
             continue
         try:
-            g_utm = shp_shape(geom)
-            g_wgs = _geom_utm_to_wgs(g_utm)
-            if g_wgs.is_empty:
-                continue
-            f_wgs = {"type":"Feature","properties":{"alcaldia":alc,"colonia":col},"geometry":shp_mapping(g_wgs)}
-            feats_wgs.append(f_wgs)
-            by_alc.setdefault(alc, []).append(f_wgs)
-            names.setdefault(alc, set()).add(col)
+            validas.append((alc, col, shp_shape(geom)))
         except Exception:
             continue
 
+    # todas las colonias en una sola transformación
+    geoms_wgs = _geom_utm_to_wgs(np.array([g for _, _, g in validas], dtype=object)) if validas else []
+    for (alc, col, _), g_wgs in zip(validas, geoms_wgs):
+        if g_wgs is None or g_wgs.is_empty:
+            continue
+        f_wgs = {"type":"Feature","properties":{"alcaldia":alc,"colonia":col},"geometry":shp_mapping(g_wgs)}
+        feats_wgs.append(f_wgs)
+        by_alc.setdefault(alc, []).append(f_wgs)
+        names.setdefault(alc, set()).add(col)
+
     names = {k: sorted(list(v)) for k, v in names.items()}
-    _colonias_cache = {
+    return {
         "type":"FeatureCollection",
         "crs":{"type":"name","properties":{"name":"urn:ogc:def:crs:EPSG::4326"}},
         "features": feats_wgs,
@@ -251,70 +487,84 @@ def _ensure_colonias():
     }
 
 # ===================== Malla de candidatos =====================
-def _grid_points_in_polygon_utm(poly_utm, spacing: float) -> List[Tuple[float, float]]:
+def _grid_points_in_polygon_utm(poly_utm, spacing: float, celdas_bloque: int = GRID_CELDAS_BLOQUE) -> np.ndarray:
     """
     Malla cuadrada dentro del polígono UTM (spacing en metros). Incluye borde (.covers).
+    Devuelve un arreglo (n, 2) de (x, y), fila por fila (y creciente, luego x).
+
+    La malla se arma con NumPy y se prueba con shapely.intersects_xy sobre la
+    geometría preparada (para un punto equivale a covers), en bloques de filas de
+    a lo más 'celdas_bloque' celdas; las filas fuera del polígono se saltan.
     """
     minx, miny, maxx, maxy = poly_utm.bounds
     xs = int((maxx - minx) // spacing) + 1
     ys = int((maxy - miny) // spacing) + 1
-    pts: List[Tuple[float, float]] = []
-    y = miny
-    for _ in range(ys):
-        x = minx
-        for _ in range(xs):
-            p = Point(x, y)
-            if poly_utm.covers(p):
-                pts.append((x, y))
-            x += spacing
-        y += spacing
-    return pts
-
-def _generate_candidates_for_alcaldia(alcaldia: str, spacing_m: float, min_dist_m: float, limit: Optional[int]) -> Dict[str, Any]:
+    gx = minx + np.arange(xs) * spacing
+    gy = miny + np.arange(ys) * spacing
+
+    shapely.prepare(poly_utm)
+    filas = max(1, int(celdas_bloque) // xs)
+    partes: List[np.ndarray] = []
+    for i in range(0, ys, filas):
+        by = gy[i:i + filas]
+        # banda de filas: si no toca el polígono no hay nada que probar
+        banda = shapely.box(minx, by[0], maxx, by[-1])
+        if not poly_utm.intersects(banda):
+            continue
+        mx, my = np.meshgrid(gx, by)
+        mx, my = mx.ravel(), my.ravel()
+        dentro = shapely.intersects_xy(poly_utm, mx, my)
+        if dentro.any():
+            partes.append(np.column_stack((mx[dentro], my[dentro])))
+    if not partes:
+        return np.empty((0, 2))
+    return np.concatenate(partes)
+
+def _candidatos_utm(alcaldia: str, spacing_m: float, min_dist_m: float,
+                    limit: Optional[int]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
     """
-    Crea candidatos:
+    (candidatos, cámaras) de la alcaldía en UTM, arreglos (n, 2):
       - malla con 'spacing_m'
       - excluye puntos a menos de 'min_dist_m' de cámaras existentes (si > 0)
+    None si la alcaldía no tiene frontera.
     """
     _ensure_points_meta()
     hull_wgs = _get_hull_geometry_wgs(alcaldia)
     if hull_wgs is None:
-        return {"type":"FeatureCollection","features":[]}
+        return None
 
     hull_utm = _geom_wgs_to_utm(hull_wgs)
 
-    feats = _filter_points_by_alcaldia(_cache_points.get("features", []), alcaldia)
-    existing_pts_utm = []
+    feats = _filter_points_by_alcaldia(alcaldia)
+    lonlat = []
     for f in feats:
         g = f.get("geometry") or {}
         if g.get("type") != "Point": continue
-        lonlat = g.get("coordinates") or []
-        if len(lonlat) < 2: continue
-        lon, lat = float(lonlat[0]), float(lonlat[1])
-        x, y = _tf_wgs2utm.transform(lon, lat)
-        existing_pts_utm.append(Point(x, y))
-    tree = STRtree(existing_pts_utm) if existing_pts_utm else None
+        coords = g.get("coordinates") or []
+        if len(coords) < 2: continue
+        lonlat.append((float(coords[0]), float(coords[1])))
+    existing_xy = _coords_wgs_to_utm(np.asarray(lonlat)) if lonlat else np.empty((0, 2))
 
     grid_xy = _grid_points_in_polygon_utm(hull_utm, spacing_m)
 
+    # filtro de distancia mínima: vecino más cercano de todos los candidatos a la vez
+    if len(existing_xy) and float(min_dist_m) > 0 and len(grid_xy):
+        dist, _ = cKDTree(existing_xy).query(grid_xy, k=1)
+        grid_xy = grid_xy[dist >= float(min_dist_m)]
+    if limit:
+        grid_xy = grid_xy[:limit]
+    return grid_xy, existing_xy
+
+def _generate_candidates_for_alcaldia(alcaldia: str, spacing_m: float, min_dist_m: float, limit: Optional[int]) -> Dict[str, Any]:
+    """Candidatos de _candidatos_utm como FeatureCollection WGS84."""
+    res = _candidatos_utm(alcaldia, spacing_m, min_dist_m, limit)
+    if res is None:
+        return {"type":"FeatureCollection","features":[]}
+    grid_xy, _ = res
+
     candidates: List[Dict[str, Any]] = []
-    for (x, y) in grid_xy:
-        pt = Point(x, y)
-
-        # filtro de distancia mínima robusto
-        if tree is not None and float(min_dist_m) > 0:
-            try:
-                buf = pt.buffer(float(min_dist_m))
-                near = tree.query(buf)  # len(...) > 0 si hay algo cerca
-                n = len(near) if hasattr(near, "__len__") else (0 if near is None else 1)
-                if n > 0:
-                    continue
-            except Exception:
-                # fallback
-                if any(pt.distance(g) < float(min_dist_m) for g in existing_pts_utm):
-                    continue
-
-        lon, lat = _tf_utm2wgs.transform(x, y)
+    lons, lats = _xy_utm_to_wgs(grid_xy[:, 0], grid_xy[:, 1])
+    for lon, lat in zip(lons.tolist(), lats.tolist()):
         candidates.append({
             "type":"Feature",
             "properties":{
@@ -325,8 +575,6 @@ def _generate_candidates_for_alcaldia(alcaldia: str, spacing_m: float, min_dist_
             },
             "geometry":{"type":"Point","coordinates":[lon, lat]}
         })
-        if limit and len(candidates) >= limit:
-            break
 
     return {
         "type":"FeatureCollection",
@@ -335,30 +583,253 @@ def _generate_candidates_for_alcaldia(alcaldia: str, spacing_m: float, min_dist_
         "features": candidates
     }
 
+# ===================== Archivos .dat =====================
+def _contenido_dat(nombre_instancia: str, presupuesto: float, radio: float, c1: float, c2: float,
+                   filas: List[Tuple[int, float, float, int, float]], fmt_prob: str = ".2f") -> str:
+    """Texto del .dat (formato que lee Reader_DRP); filas = (id, x, y, flag, prob) en UTM."""
+    content_lines = [
+        "/* CONJUNTOS */",
+        f"set N:= {len(filas)} ;",
+        "",
+        "/* PARAMETROS */",
+        f"param P:= {presupuesto} ;",
+        f"param R:= {radio} ;",
+        f"param c1:= {c1} ;",
+        f"param c2:= {c2} ;",
+        f'param nombre_instancia := "{nombre_instancia}" ;',
+        "",
+        "param : coordx coordy flag prob_ohca:="
+    ]
+    content_lines += [f"{i} {x:.6f} {y:.6f} {flag} {prob:{fmt_prob}}" for (i, x, y, flag, prob) in filas]
+    content_lines.append(";")
+    return "\n".join(content_lines)
+
+def _asignar_reportes(nodos_xy: np.ndarray, alcaldia: str, impacto: Optional[str]) -> Tuple[np.ndarray, int]:
+    """Reportes por nodo: cada reporte filtrado va a su nodo más cercano (una consulta al KD-tree)."""
+    _ensure_reports_meta()
+    pos = _posiciones_reportes(alcaldia, impacto)
+    xy = _reportes_xy if pos is None else _reportes_xy[np.asarray(pos, dtype=np.int64)]
+    xy = xy[np.isfinite(xy).all(axis=1)]
+    if not len(xy) or not len(nodos_xy):
+        return np.zeros(len(nodos_xy), dtype=np.int64), int(len(xy))
+    _, cercano = cKDTree(nodos_xy).query(xy, k=1)
+    return np.bincount(cercano, minlength=len(nodos_xy)), int(len(xy))
+
+def _probabilidades(conteos: np.ndarray, modelo: str) -> np.ndarray:
+    if modelo == "uniforme":
+        return np.ones(len(conteos))
+    if modelo == "conteo":
+        return conteos.astype(float)
+    # proporcional: el nodo con más reportes vale 1
+    maximo = conteos.max() if len(conteos) else 0
+    return conteos / maximo if maximo > 0 else np.zeros(len(conteos))
+
+def _construir_instancia(p: BuildInstancePayload) -> Dict[str, Any]:
+    """
+    Arma el .dat de una alcaldía sin pasar puntos por el navegador:
+      - cámaras existentes (flag=1, prob_camaras), primero, como en las instancias alcaldia_*.dat
+      - nodos de demanda (flag=0) = malla de _candidatos_utm; cada reporte (filtrado por
+        alcaldía e impacto) se asigna a su nodo más cercano y prob_ohca sale de modelo_prob
+    """
+    res = _candidatos_utm(p.alcaldia, p.spacing_m, p.min_dist_m, None)
+    if res is None:
+        raise ValueError(f"Alcaldía sin frontera: {p.alcaldia}")
+    grid_xy, camaras_xy = res
+    conteos, n_reportes = _asignar_reportes(grid_xy, p.alcaldia, p.impacto_delito)
+    prob = _probabilidades(conteos, p.modelo_prob)
+    if not p.incluir_vacios:
+        con_reportes = conteos > 0
+        grid_xy, conteos, prob = grid_xy[con_reportes], conteos[con_reportes], prob[con_reportes]
+    if not p.incluir_camaras:
+        camaras_xy = np.empty((0, 2))
+
+    xy = np.concatenate((camaras_xy, grid_xy))
+    flags = [1] * len(camaras_xy) + [0] * len(grid_xy)
+    probs = [p.prob_camaras] * len(camaras_xy) + prob.tolist()
+    filas = list(zip(range(1, len(xy) + 1), xy[:, 0].tolist(), xy[:, 1].tolist(), flags, probs))
+    if not filas:
+        raise ValueError("La instancia quedó sin puntos (¿alcaldía o impacto sin reportes?).")
+
+    nombre = os.path.basename(p.name.strip())
+    if not nombre.endswith(".dat"):
+        nombre += ".dat"
+    instance_dir = BASE / "INSTANCES"
+    instance_dir.mkdir(exist_ok=True)
+    file_path = instance_dir / nombre
+    with open(file_path, "w", encoding="utf-8") as f:
+        # probabilidades con más decimales: con 'proporcional' los nodos chicos quedarían en 0.00
+        f.write(_contenido_dat(nombre, p.presupuesto, p.radio, p.c1, p.c2, filas, fmt_prob=".6f"))
+    return {
+        "ok": True,
+        "message": f"Instancia '{nombre}' creada con {len(filas)} puntos.",
+        "path": str(file_path),
+        "N": len(filas),
+        "n_camaras": int(len(camaras_xy)),
+        "n_demanda": int(len(grid_xy)),
+        "n_reportes": n_reportes,
+        "n_reportes_asignados": int(conteos.sum()),
+    }
+
+# ===================== Respuestas pre-serializadas =====================
+# (endpoint, parámetros) -> {"etag", "identity", "gzip", "br"}; las capas no cambian después de cargarse
+_respuestas: "OrderedDict[Tuple[Any, ...], Dict[str, Any]]" = OrderedDict()  # LRU, hasta MAX_RESPUESTAS
+_respuestas_lock = threading.Lock()  # sólo cubre el diccionario, no la serialización
+_locks_respuestas: Dict[Tuple[Any, ...], threading.Lock] = {}  # single-flight por clave
+_SUFIJO_CODIFICACION = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+def _dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    # mismo formato que JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def _serializada(clave: Tuple[Any, ...], construir) -> Dict[str, Any]:
+    """Cuerpo JSON (y comprimido) de 'clave', serializado una sola vez (llamar desde el threadpool)."""
+    with _respuestas_lock:
+        entrada = _respuestas.get(clave)
+        if entrada is not None:
+            _respuestas.move_to_end(clave)
+            return entrada
+        lock_clave = _locks_respuestas.setdefault(clave, threading.Lock())
+    # serializar y comprimir sin el lock global: las demás claves se siguen sirviendo
+    with lock_clave:
+        with _respuestas_lock:
+            entrada = _respuestas.get(clave)
+        if entrada is not None:
+            return entrada
+        try:
+            cuerpo = _dumps(construir())
+            entrada = {
+                "etag": hashlib.sha1(cuerpo).hexdigest()[:20],
+                "identity": cuerpo,
+                "gzip": gzip.compress(cuerpo, compresslevel=6),
+                "br": brotli.compress(cuerpo, quality=9) if brotli is not None else None,
+            }
+            with _respuestas_lock:
+                _respuestas[clave] = entrada
+                while len(_respuestas) > MAX_RESPUESTAS:
+                    _respuestas.popitem(last=False)
+        finally:
+            with _respuestas_lock:
+                _locks_respuestas.pop(clave, None)
+    return entrada
+
+def _calidades_codificacion(cabecera: str) -> Dict[str, float]:
+    """Accept-Encoding -> {codificación: q} ('gzip;q=0' es rechazo, no aceptación)."""
+    calidades = {}
+    for parte in cabecera.split(","):
+        nombre, _, params = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            k, _, v = param.partition("=")
+            if k.strip().lower() == "q":
+                try:
+                    q = float(v.strip())
+                except ValueError:
+                    q = 0.0
+        calidades[nombre] = q
+    return calidades
+
+def _elegir_codificacion(entrada: Dict[str, Any], cabecera: str) -> str:
+    """br o gzip con el mayor q aceptado (br en empate); si ninguno, identity."""
+    calidades = _calidades_codificacion(cabecera)
+    def q(c):
+        return calidades.get(c, calidades.get("*", 0.0))
+    candidatas = [c for c in ("br", "gzip") if entrada[c] is not None and q(c) > 0]
+    return max(candidatas, key=q) if candidatas else "identity"
+
+def _responder_serializada(request: Request, clave: Tuple[Any, ...], construir) -> Response:
+    """
+    Respuesta con ETag fuerte: 304 si If-None-Match coincide; si no, br/gzip
+    según Accept-Encoding. Cada codificación lleva su sufijo en el ETag, pero
+    cualquiera de ellos valida la entidad.
+    """
+    entrada = _serializada(clave, construir)
+    codificacion = _elegir_codificacion(entrada, request.headers.get("accept-encoding", ""))
+    headers = {
+        "ETag": f'"{entrada["etag"]}{_SUFIJO_CODIFICACION[codificacion]}"',
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",  # siempre se revalida (304) por si el servidor recargó las capas
+    }
+    etiquetas = [t.strip().strip('"') for t in request.headers.get("if-none-match", "").split(",")]
+    if "*" in etiquetas or any(t.split("-")[0] == entrada["etag"] for t in etiquetas if t):
+        return Response(status_code=304, headers=headers)
+    if codificacion != "identity":
+        headers["Content-Encoding"] = codificacion
+    return Response(entrada[codificacion], media_type="application/json", headers=headers)
+
+# ===================== Teselas vectoriales =====================
+# capa -> (carga de la capa base, features WGS84 de esa capa)
+_FUENTES_TESELAS = {
+    "camaras": (lambda: _ensure_points_meta(), lambda: _cache_points.get("features", [])),
+    "reportes": (lambda: _ensure_reports_meta(), lambda: _reportes_cache.get("features", [])),
+    "colonias": (lambda: _ensure_colonias(), lambda: _colonias_cache["features"]),
+    "hulls": (lambda: _ensure_hulls(), lambda: _hulls_cache.get("features", [])),
+}
+_capas_teselas: Dict[str, teselas.CapaTeselas] = {}
+_locks_teselas = {nombre: threading.Lock() for nombre in _FUENTES_TESELAS}
+_cache_teselas = teselas.CacheTeselas()
+
+def _capa_teselas(nombre: str) -> teselas.CapaTeselas:
+    """Capa proyectada e indexada (se arma una vez, single-flight por capa)."""
+    capa = _capas_teselas.get(nombre)
+    if capa is not None:
+        return capa
+    with _locks_teselas[nombre]:
+        capa = _capas_teselas.get(nombre)
+        if capa is None:
+            cargar, features = _FUENTES_TESELAS[nombre]
+            cargar()
+            capa = teselas.CapaTeselas.desde_features(nombre, features())
+            _capas_teselas[nombre] = capa
+    return capa
+
+def _tesela(nombre: str, z: int, x: int, y: int) -> bytes:
+    return _cache_teselas.obtener(_capa_teselas(nombre), z, x, y)
+
+# ===================== Precarga =====================
+def _precargar_capas():
+    """Carga las cuatro capas en paralelo (lo llama el lifespan al arrancar)."""
+    t0 = time.perf_counter()
+    cargas = (_ensure_points_meta, _ensure_reports_meta, _ensure_hulls, _ensure_colonias)
+    with ThreadPoolExecutor(max_workers=len(cargas), thread_name_prefix="precarga") as pool:
+        futuros = [(carga.__name__, pool.submit(carga)) for carga in cargas]
+    for nombre, fut in futuros:
+        if fut.exception() is not None:
+            print(f"[app] Precarga de {nombre} falló: {fut.exception()}")
+    print(f"[app] Capas precargadas en {time.perf_counter() - t0:.2f} s")
+
 # ===================== Rutas =====================
 @app.get("/")
 async def index():
     return FileResponse(BASE / "index.html")
 
 @app.get("/meta")
-async def meta():
-    _ensure_points_meta()
-    return JSONResponse(_meta_cache)
+async def meta(request: Request):
+    await _asegurar(_ensure_points_meta)
+    meta_actual = _meta_cache
+    # meta crece cuando termina de cargar otra capa: las claves presentes son parte de la clave
+    return await run_in_threadpool(_responder_serializada, request, ("meta", tuple(sorted(meta_actual))),
+                                   lambda: meta_actual)
 
 @app.get("/hulls")
-async def hulls():
-    _ensure_hulls()
-    return JSONResponse(_hulls_cache)
+async def hulls(request: Request):
+    await _asegurar(_ensure_hulls)
+    return await run_in_threadpool(_responder_serializada, request, ("hulls",), lambda: _hulls_cache)
 
 @app.get("/colonias")
-async def colonias(alcaldia: str = Query(..., description="Alcaldía exacta para limitar la respuesta")):
+async def colonias(request: Request, alcaldia: str = Query(..., description="Alcaldía exacta para limitar la respuesta")):
     """Devuelve las colonias (polígonos) de la alcaldía dada."""
-    _ensure_colonias()
-    feats = _colonias_cache["by_alc"].get(alcaldia, [])
-    return JSONResponse({
+    await _asegurar(_ensure_colonias)
+    # alcaldías desconocidas comparten una entrada vacía (no crece la caché con cualquier parámetro)
+    clave = alcaldia if alcaldia in _colonias_cache["by_alc"] else None
+    return await run_in_threadpool(_responder_serializada, request, ("colonias", clave), lambda: {
         "type":"FeatureCollection",
         "crs": _colonias_cache["crs"],
-        "features": feats,
+        "features": _colonias_cache["by_alc"].get(clave, []),
     })
 
 @app.get("/reportes")
@@ -366,9 +837,8 @@ async def reportes(
     alcaldia: str = Query(..., description="Alcaldía exacta para filtrar"),
     impacto_delito: Optional[str] = Query(None, description="Filtrar por 'DELITO DE ALTO IMPACTO' o 'DELITO DE BAJO IMPACTO'")
 ):
-    _ensure_reports_meta()
-    feats = _reportes_cache.get("features", [])
-    filtered = _filter_reports(feats, alcaldia, impacto_delito)
+    await _asegurar(_ensure_reports_meta)
+    filtered = _filter_reports(alcaldia, impacto_delito)
     return JSONResponse({
         "type": "FeatureCollection",
         "name": "reportes_filtrados",
@@ -377,6 +847,22 @@ async def reportes(
         "count": len(filtered),
     })
 
+@app.get("/densidad")
+async def densidad(
+    request: Request,
+    alcaldia: Optional[str] = Query(None, description="Alcaldía exacta (todas si se omite)"),
+    impacto_delito: Optional[str] = Query(None, description="'DELITO DE ALTO IMPACTO' o 'DELITO DE BAJO IMPACTO'"),
+    forma: str = Query("hex", pattern="^(hex|cuadrada)$", description="hex (radio tam_m) o cuadrada (lado tam_m)"),
+    tam_m: float = Query(250, ge=25, le=5000),
+):
+    """Densidad de reportes agregada en celdas: n por celda, peso = n / total y centro (lon, lat)."""
+    await _asegurar(_ensure_reports_meta)
+    alc = alcaldia.strip() if alcaldia and alcaldia.strip() else None
+    imp = impacto_delito.strip() if impacto_delito and impacto_delito.strip() else None
+    clave = ("densidad", forma, float(tam_m), _normalize(alc) if alc else None, imp)
+    return await run_in_threadpool(_responder_serializada, request, clave,
+                                   lambda: _densidad_geojson(forma, float(tam_m), alc, imp))
+
 @app.post("/create_instance")
 async def create_instance(payload: InstancePayload = Body(...)):
     """
@@ -388,45 +874,24 @@ async def create_instance(payload: InstancePayload = Body(...)):
     if not payload.points:
         return JSONResponse(status_code=400, content={"error": "La lista de puntos no puede estar vacía."})
 
-    # Transformar coordenadas de WGS84 (lat,lon) a UTM (x,y)
+    # Transformar coordenadas de WGS84 (lat,lon) a UTM (x,y), todas de una vez
+    xs, ys = _xy_wgs_to_utm([p.lon for p in payload.points], [p.lat for p in payload.points])
+    ok = np.isfinite(xs) & np.isfinite(ys)
     transformed_points = []
     for i, p in enumerate(payload.points):
-        try:
-            x, y = _tf_wgs2utm.transform(p.lon, p.lat)
-            transformed_points.append({
-                "id": i + 1,
-                "x": x,
-                "y": y,
-                "flag": p.flag,
-                "prob": p.prob
-            })
-        except Exception as e:
-            print(f"Error transformando punto: {p}, error: {e}")
+        if not ok[i]:
+            print(f"Error transformando punto: {p}")
             continue # Ignorar puntos con error de transformación
+        transformed_points.append({
+            "id": i + 1,
+            "x": float(xs[i]),
+            "y": float(ys[i]),
+            "flag": p.flag,
+            "prob": p.prob
+        })
 
     N = len(transformed_points)
-    nombre_instancia = payload.name
-
-    # Crear el contenido del archivo .dat
-    content_lines = [
-        "/* CONJUNTOS */",
-        f"set N:= {N} ;",
-        "",
-        "/* PARAMETROS */",
-        f"param P:= {payload.presupuesto} ;",
-        f"param R:= {payload.radio} ;",
-        f"param c1:= {payload.c1} ;",
-        f"param c2:= {payload.c2} ;",
-        f'param nombre_instancia := "{nombre_instancia}" ;',
-        "",
-        "param : coordx coordy flag prob_ohca:="
-    ]
-
-    for p in transformed_points:
-        line = f"{p['id']} {p['x']:.6f} {p['y']:.6f} {p['flag']} {p['prob']:.2f}"
-        content_lines.append(line)
-    
-    content_lines.append(";")
+    filas = [(p["id"], p["x"], p["y"], p["flag"], p["prob"]) for p in transformed_points]
 
     # Guardar el archivo
     try:
@@ -435,7 +900,7 @@ async def create_instance(payload: InstancePayload = Body(...)):
         file_path = instance_dir / payload.name
         
         with open(file_path, "w", encoding="utf-8") as f:
-            f.write("\n".join(content_lines))
+            f.write(_contenido_dat(payload.name, payload.presupuesto, payload.radio, payload.c1, payload.c2, filas))
             
         return {
             "ok": True, 
@@ -447,14 +912,26 @@ async def create_instance(payload: InstancePayload = Body(...)):
 
 
 
+@app.post("/build_instance")
+async def build_instance(payload: BuildInstancePayload = Body(...)):
+    """
+    Construye el .dat en el servidor a partir de la alcaldía (malla de candidatos,
+    cámaras y reportes en caché); ver _construir_instancia.
+    """
+    try:
+        return await run_in_threadpool(_construir_instancia, payload)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except OSError as e:
+        return JSONResponse(status_code=500, content={"error": f"Error al guardar el archivo: {e}"})
+
 @app.get("/data")
 async def data(
     alcaldia: Optional[str] = Query(default=None, description="Alcaldía exacta"),
     limit: Optional[int] = Query(default=None, ge=1, le=100000),
 ):
-    _ensure_points_meta()
-    feats = _cache_points.get("features", [])
-    feats = _filter_points_by_alcaldia(feats, alcaldia) if alcaldia else []
+    await _asegurar(_ensure_points_meta)
+    feats = _filter_points_by_alcaldia(alcaldia)
     if limit: feats = feats[:limit]
     return JSONResponse({
         "type":"FeatureCollection",
@@ -471,11 +948,22 @@ async def grid(
     min_dist_m: float = Query(0, ge=0, le=2000),
     limit: Optional[int] = Query(None, ge=1, le=100000),
 ):
-    _ensure_points_meta()
-    _ensure_hulls()
+    await _asegurar(_ensure_points_meta, _ensure_hulls)
     fc = _generate_candidates_for_alcaldia(alcaldia, spacing_m, min_dist_m, limit)
     return JSONResponse(fc)
 
+@app.get("/tiles/{layer}/{z}/{x}/{y}.mvt")
+async def tiles(layer: str, z: int, x: int, y: int):
+    """Tesela vectorial (MVT) de camaras, reportes, colonias o hulls; ver teselas.py."""
+    if layer not in _FUENTES_TESELAS:
+        return JSONResponse(status_code=404, content={"error": f"Capa desconocida: {layer}",
+                                                      "capas": list(_FUENTES_TESELAS)})
+    if not teselas.tesela_valida(z, x, y):
+        return JSONResponse(status_code=400, content={"error": f"Tesela fuera de rango: {z}/{x}/{y}"})
+    cuerpo = await run_in_threadpool(_tesela, layer, z, x, y)
+    return Response(cuerpo, media_type="application/vnd.mapbox-vector-tile",
+                    headers={"Cache-Control": "public, max-age=300"})
+
 if __name__ == "__main__":
     # uvicorn app:app --reload --host 127.0.0.1 --port 8000
     uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,399 @@
+"""
+Archivo binario por corrida: todas las generaciones en un solo archivo.
+
+Reemplaza el ir y venir de cientos de POF_<inst>_GEN_<n>.dat (y los
+aeds/FrentesDePareto derivados) por un archivo de sólo-agregar:
+
+    cabecera (16 B): b"MOEADRUN", versión u32, reservado u32
+    bloque por generación:
+        cabecera (40 B): b"GEN\\0", gen u32, n u32, m u32, n_ids u64, flags u8, relleno, largo u64
+        carga (opcionalmente zlib):
+            obj       float64 (n, m)   objetivos en columnas contiguas por fila
+            indptr    int64   (n + 1)  CSR de los IDs instalados de cada fila
+            cobertura float64 (n)      si flags & COBERTURA (aeds)
+            ids       int32   (n_ids)
+            pareto    uint8   (n)      si flags & PARETO (aeds)
+
+Cada segmento se alinea a 8 bytes, así que sin compresión el lector entrega
+vistas NumPy directas sobre el mmap (sin copiar). La tabla de offsets por
+generación se agrega en '<archivo>.idx'; si falta o no coincide (corte a mitad
+de escritura) se reconstruye recorriendo las cabeceras.
+
+Conversión de los textos existentes:
+    python archivo_corrida.py <instancia.dat> [--comprimir]
+"""
+import glob
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from frentes import gen_number_from_path, parse_line_with_ids
+
+MAGIA = b"MOEADRUN"
+VERSION = 1
+CABECERA = struct.Struct("<8sII")
+BLOQUE = struct.Struct("<4sIIIQB7xQ")
+MAGIA_BLOQUE = b"GEN\0"
+IDX = np.dtype([("gen", "<u4"), ("n", "<u4"), ("offset", "<u8")])
+
+ZLIB = 1
+PARETO = 2
+COBERTURA = 4
+
+SUFIJO = ".run"
+
+
+def ruta_archivo(instancia, carpeta=os.path.join("SAVING", "MOEAD", "POF")):
+    """SAVING/MOEAD/POF/POF_<inst>.run"""
+    return os.path.join(carpeta, f"POF_{instancia}{SUFIJO}")
+
+
+def _pad8(n):
+    return (-n) % 8
+
+
+def _csr(lista_ids):
+    indptr = np.zeros(len(lista_ids) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in lista_ids], out=indptr[1:])
+    ids = np.fromiter((i for fila in lista_ids for i in fila), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, ids
+
+
+class EscritorArchivo:
+    """Agrega generaciones al final del archivo; nunca reescribe bloques anteriores."""
+
+    def __init__(self, path, comprimir=False, nuevo=False):
+        self.path = path
+        self.comprimir = comprimir
+        existe = os.path.exists(path) and not nuevo
+        if existe:
+            # descarta un bloque final incompleto (corte durante la escritura)
+            tabla, fin = _recorrer(path)
+            self._f = open(path, "r+b")
+            self._f.truncate(fin)
+            self._f.seek(fin)
+            self._idx = open(path + ".idx", "wb")
+            self._idx.write(tabla.tobytes())
+        else:
+            self._f = open(path, "wb")
+            self._f.write(CABECERA.pack(MAGIA, VERSION, 0))
+            self._idx = open(path + ".idx", "wb")
+
+    def agregar(self, gen, objetivos, lista_ids=None, indptr=None, ids=None, pareto=None, cobertura=None):
+        """
+        objetivos: (n, m). IDs como lista de listas o ya en CSR (indptr, ids).
+        pareto / cobertura: columnas opcionales por fila (archivos aeds).
+        """
+        obj = np.ascontiguousarray(objetivos, dtype=np.float64)
+        obj = obj.reshape(len(obj), -1) if obj.size else obj.reshape(0, 2)
+        n, m = obj.shape
+        if indptr is None:
+            indptr, ids = _csr(lista_ids if lista_ids is not None else [[] for _ in range(n)])
+        indptr = np.asarray(indptr, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int32)
+
+        flags = 0
+        partes = [obj.tobytes(), indptr.tobytes()]
+        if cobertura is not None:
+            flags |= COBERTURA
+            partes.append(np.asarray(cobertura, dtype=np.float64).tobytes())
+        partes.append(ids.tobytes() + b"\0" * _pad8(ids.nbytes))
+        if pareto is not None:
+            flags |= PARETO
+            p = np.asarray(pareto, dtype=np.uint8).tobytes()
+            partes.append(p + b"\0" * _pad8(len(p)))
+        carga = b"".join(partes)
+        if self.comprimir:
+            flags |= ZLIB
+            carga = zlib.compress(carga, 6)
+            carga += b"\0" * _pad8(len(carga))
+
+        offset = self._f.tell()
+        self._f.write(BLOQUE.pack(MAGIA_BLOQUE, int(gen), n, m, len(ids), flags, len(carga)))
+        self._f.write(carga)
+        self._idx.write(np.array([(gen, n, offset)], dtype=IDX).tobytes())
+
+    def cerrar(self):
+        self._f.close()
+        self._idx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def _recorrer(path):
+    """Reconstruye la tabla de offsets recorriendo las cabeceras. Devuelve (tabla, fin_valido)."""
+    filas = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        magia, version, _ = CABECERA.unpack(f.read(CABECERA.size))
+        if magia != MAGIA or version != VERSION:
+            raise ValueError(f"{path}: no es un archivo de corrida v{VERSION}")
+        offset = CABECERA.size
+        while offset + BLOQUE.size <= size:
+            f.seek(offset)
+            mb, gen, n, _, _, _, largo = BLOQUE.unpack(f.read(BLOQUE.size))
+            if mb != MAGIA_BLOQUE or offset + BLOQUE.size + largo > size:
+                break
+            filas.append((gen, n, offset))
+            offset += BLOQUE.size + largo
+    return np.array(filas, dtype=IDX), offset
+
+
+class Generacion:
+    """Vista de una generación: obj (n, m), indptr, ids, y pareto/cobertura si existen."""
+
+    __slots__ = ("gen", "obj", "indptr", "ids", "pareto", "cobertura")
+
+    def __init__(self, gen, obj, indptr, ids, pareto=None, cobertura=None):
+        self.gen = gen
+        self.obj = obj
+        self.indptr = indptr
+        self.ids = ids
+        self.pareto = pareto
+        self.cobertura = cobertura
+
+    def __len__(self):
+        return len(self.obj)
+
+    def ids_de(self, k):
+        return self.ids[self.indptr[k]:self.indptr[k + 1]]
+
+    def entradas(self):
+        """[(x, y, ids)] como pipeline.leer_generacion (sólo 2 objetivos)."""
+        xs = self.obj[:, 0].tolist()
+        ys = self.obj[:, 1].tolist()
+        ids = self.ids.tolist()
+        ptr = self.indptr.tolist()
+        return [(xs[k], ys[k], ids[ptr[k]:ptr[k + 1]]) for k in range(len(xs))]
+
+
+class LectorArchivo:
+    """Lector por mmap: abrir la corrida es un open() + mmap, las generaciones se leen bajo demanda."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        st = os.stat(path)
+        try:
+            tabla = np.fromfile(path + ".idx", dtype=IDX)
+        except (OSError, ValueError):
+            tabla = None
+        # el índice vale si su último bloque termina justo donde termina el archivo
+        if tabla is None or self._fin_tabla(tabla) != st.st_size:
+            tabla = _recorrer(path)[0]
+        self._tabla = tabla
+        self._pos = {int(g): k for k, g in enumerate(tabla["gen"])}
+        self.mtime_ns = st.st_mtime_ns
+        self.en_uso = 0  # lecturas en curso (leer_entradas); ver abrir
+        self.retirado = False
+
+    def _fin_tabla(self, tabla):
+        if not len(tabla):
+            return CABECERA.size
+        offset = int(tabla["offset"][-1])
+        if offset + BLOQUE.size > len(self._mm):
+            return None
+        return offset + BLOQUE.size + BLOQUE.unpack_from(self._mm, offset)[-1]
+
+    def generaciones(self):
+        return [int(g) for g in self._tabla["gen"]]
+
+    def __len__(self):
+        return len(self._tabla)
+
+    def __contains__(self, gen):
+        return gen in self._pos
+
+    def leer(self, gen):
+        offset = int(self._tabla["offset"][self._pos[gen]])
+        _, g, n, m, n_ids, flags, largo = BLOQUE.unpack_from(self._mm, offset)
+        ini = offset + BLOQUE.size
+        if flags & ZLIB:
+            buf = zlib.decompress(self._mm[ini:ini + largo])
+            base = 0
+        else:
+            buf = self._mm
+            base = ini
+
+        def tomar(dtype, count):
+            nonlocal base
+            arr = np.frombuffer(buf, dtype=dtype, count=count, offset=base)
+            base += arr.nbytes + _pad8(arr.nbytes)
+            return arr
+
+        obj = tomar(np.float64, n * m).reshape(n, m)
+        indptr = tomar(np.int64, n + 1)
+        cobertura = tomar(np.float64, n) if flags & COBERTURA else None
+        ids = tomar(np.int32, n_ids)
+        pareto = tomar(np.uint8, n).astype(bool) if flags & PARETO else None
+        return Generacion(g, obj, indptr, ids, pareto, cobertura)
+
+    def cerrar(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # alguien conserva vistas de leer(): el mmap se libera cuando las suelte
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+# lectores abiertos por proceso (los workers del pipeline reutilizan el mmap)
+_lectores = {}
+_lock = threading.Lock()
+
+
+def _abrir(path, tomar=False):
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        lector = _lectores.get(path)
+        if lector is None or lector.mtime_ns != mtime:
+            if lector is not None:
+                # el archivo se reemplazó: el lector viejo se cierra apenas nadie lo esté leyendo
+                lector.retirado = True
+                if not lector.en_uso:
+                    lector.cerrar()
+            lector = _lectores[path] = LectorArchivo(path)
+        if tomar:
+            lector.en_uso += 1
+        return lector
+
+
+def abrir(path):
+    """LectorArchivo compartido en el proceso; se reabre si el archivo cambió (y se cierra el anterior)."""
+    return _abrir(path)
+
+
+def leer_entradas(path, gen):
+    """[(x, y, ids)] de la generación 'gen' del archivo (ver pipeline.leer_generacion)."""
+    lector = _abrir(path, tomar=True)
+    try:
+        return lector.leer(gen).entradas()
+    finally:
+        with _lock:
+            lector.en_uso -= 1
+            if lector.retirado and not lector.en_uso:
+                lector.cerrar()
+
+
+def ruta_temporal(destino):
+    """Temporal por proceso e hilo: dos /load, o un /load y un /run, pueden escribir la misma corrida."""
+    return f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def reemplazar(tmp, destino):
+    """Publica el archivo escrito en tmp (ruta_temporal) y su índice."""
+    # primero los datos: un índice viejo junto a datos nuevos no pasa la validación de LectorArchivo
+    os.replace(tmp, destino)
+    os.replace(tmp + ".idx", destino + ".idx")
+
+
+def descartar(tmp):
+    for path in (tmp, tmp + ".idx"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# ---------- conversión desde los textos ----------
+def _leer_texto(file):
+    filas = []
+    with open(file) as f:
+        for ln in f:
+            try:
+                parsed = parse_line_with_ids(ln)
+            except (ValueError, IndexError):
+                continue
+            if parsed is not None:
+                filas.append(parsed)
+    return filas
+
+
+def convertir_pof(files, destino, comprimir=False):
+    """Archiva los POF_<inst>_GEN_<n>.dat (archivo nuevo, en orden de generación)."""
+    with EscritorArchivo(destino, comprimir=comprimir, nuevo=True) as w:
+        for file in sorted(files, key=gen_number_from_path):
+            filas = _leer_texto(file)
+            w.agregar(gen_number_from_path(file), [(x, y) for (x, y, _, _, _) in filas],
+                      [ids for (_, _, ids, _, _) in filas])
+    return destino
+
+
+def convertir_aeds(files, destino, comprimir=False):
+    """Archiva aeds/<inst>/*_Ubicaciones_GEN<i>.dat con sus columnas P/D y cobertura."""
+    with EscritorArchivo(destino, comprimir=comprimir, nuevo=True) as w:
+        for file in sorted(files, key=gen_number_from_path):
+            filas = _leer_texto(file)
+            w.agregar(gen_number_from_path(file), [(x, y) for (x, y, _, _, _) in filas],
+                      [ids for (_, _, ids, _, _) in filas],
+                      pareto=[flag == "P" for (_, _, _, flag, _) in filas],
+                      cobertura=[np.nan if c is None else c for (_, _, _, _, c) in filas])
+    return destino
+
+
+def archivo_al_dia(instancia, raw_files, comprimir=False):
+    """
+    Ruta del archivo de la corrida de 'instancia' con las generaciones de raw_files;
+    lo (re)genera desde los textos si falta, si es más viejo que algún POF o si
+    no tiene las mismas generaciones. Las corridas de /run ya lo dejan escrito
+    (trabajos.py lo arma mientras procesa cada generación).
+    """
+    destino = ruta_archivo(instancia, os.path.dirname(raw_files[0]))
+    gens = sorted(gen_number_from_path(f) for f in raw_files)
+    try:
+        st = os.stat(destino)
+        if st.st_mtime_ns >= max(os.stat(f).st_mtime_ns for f in raw_files) and \
+                abrir(destino).generaciones() == gens:
+            return destino
+    except (OSError, ValueError):
+        pass
+    tmp = ruta_temporal(destino)
+    convertir_pof(raw_files, tmp, comprimir)
+    reemplazar(tmp, destino)
+    return destino
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    comprimir = "--comprimir" in sys.argv
+    instancia = args[0] if args else "100-3.dat"
+    base_name = os.path.splitext(instancia)[0]
+
+    files = sorted(glob.glob(f"SAVING/MOEAD/POF/POF_{instancia}_GEN_*.dat"), key=gen_number_from_path)
+    if not files:
+        sys.exit(f"No hay POF para {instancia}")
+    t0 = time.perf_counter()
+    destino = convertir_pof(files, ruta_archivo(instancia), comprimir)
+    t_conv = time.perf_counter() - t0
+    aeds = glob.glob(os.path.join("aeds", base_name, f"{base_name}_Ubicaciones_GEN*.dat"))
+    if aeds:
+        convertir_aeds(aeds, os.path.join("aeds", base_name, f"{base_name}_Ubicaciones{SUFIJO}"), comprimir)
+
+    t0 = time.perf_counter()
+    texto = [_leer_texto(f) for f in files]
+    t_txt = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    with LectorArchivo(destino) as r:
+        bin_ = [r.leer(g).entradas() for g in r.generaciones()]
+    t_bin = time.perf_counter() - t0
+
+    iguales = all([(x, y, ids) for (x, y, ids, _, _) in a] == b for a, b in zip(texto, bin_))
+    tam_txt = sum(os.path.getsize(f) for f in files)
+    print(f"{len(files)} generaciones: {tam_txt} B en texto -> {os.path.getsize(destino)} B ({destino})")
+    print(f"conversión {t_conv:.3f} s | lectura texto {t_txt:.3f} s | lectura mmap {t_bin:.3f} s | iguales: {iguales}")
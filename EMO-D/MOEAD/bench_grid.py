@@ -0,0 +1,107 @@
+"""
+Benchmark de la malla de candidatos de app.py (/grid) en las 16 alcaldías.
+
+Compara, para cada alcaldía y spacing, la generación de candidatos anterior
+(cámaras transformadas una a una + buffer y consulta al STRtree por candidato,
+copiada tal cual) con la actual (app._candidatos_utm: cKDTree sobre toda la
+malla). Las dos usan la malla actual de _grid_points_in_polygon_utm.
+
+El filtro anterior sólo comparaba cajas: descartaba un candidato si la caja del
+buffer tocaba una cámara, o sea con |dx| y |dy| <= min_dist (un cuadrado). El
+actual usa la distancia real (< min_dist), así que conserva todo lo que
+conservaba el anterior más los candidatos de las esquinas de ese cuadrado; la
+columna 'esquinas' cuenta esa diferencia y 'incluye' verifica que sea sólo eso.
+
+Uso:
+    python bench_grid.py [--spacing 250 100 50] [--min-dist 100]
+"""
+import argparse
+import time
+
+import numpy as np
+from shapely.geometry import Point
+from shapely.strtree import STRtree
+
+import app
+
+
+def candidatos_anterior(alcaldia, spacing_m, min_dist_m):
+    """
+    Candidatos (x, y) en UTM como los armaba _generate_candidates_for_alcaldia antes
+    del cKDTree (sin la conversión a features). Único cambio: la firma nueva de
+    _filter_points_by_alcaldia.
+    """
+    app._ensure_points_meta()
+    hull_wgs = app._get_hull_geometry_wgs(alcaldia)
+    if hull_wgs is None:
+        return np.empty((0, 2))
+
+    hull_utm = app._geom_wgs_to_utm(hull_wgs)
+
+    feats = app._filter_points_by_alcaldia(alcaldia)
+    existing_pts_utm = []
+    for f in feats:
+        g = f.get("geometry") or {}
+        if g.get("type") != "Point": continue
+        lonlat = g.get("coordinates") or []
+        if len(lonlat) < 2: continue
+        lon, lat = float(lonlat[0]), float(lonlat[1])
+        x, y = app._tf_wgs2utm.transform(lon, lat)
+        existing_pts_utm.append(Point(x, y))
+    tree = STRtree(existing_pts_utm) if existing_pts_utm else None
+
+    grid_xy = app._grid_points_in_polygon_utm(hull_utm, spacing_m)
+
+    candidates = []
+    for (x, y) in grid_xy.tolist():
+        pt = Point(x, y)
+
+        # filtro de distancia mínima robusto
+        if tree is not None and float(min_dist_m) > 0:
+            try:
+                buf = pt.buffer(float(min_dist_m))
+                near = tree.query(buf)  # len(...) > 0 si hay algo cerca
+                n = len(near) if hasattr(near, "__len__") else (0 if near is None else 1)
+                if n > 0:
+                    continue
+            except Exception:
+                # fallback
+                if any(pt.distance(g) < float(min_dist_m) for g in existing_pts_utm):
+                    continue
+
+        candidates.append((x, y))
+    return np.asarray(candidates).reshape(-1, 2)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de /grid por alcaldía y spacing.")
+    ap.add_argument("--spacing", type=float, nargs="+", default=[250, 100, 50])
+    ap.add_argument("--min-dist", type=float, default=100)
+    args = ap.parse_args(argv)
+
+    app._ensure_points_meta()
+    app._ensure_hulls()
+    alcaldias = sorted(f["properties"]["alcaldia"] for f in app._hulls_cache["features"])
+
+    print(f"{'alcaldía':<24}{'spacing':>8}{'antes':>8}{'ahora':>8}{'antes s':>10}{'ahora s':>10}{'x':>7}"
+          f"{'esquinas':>10}  incluye")
+    for alc in alcaldias:
+        for spacing in args.spacing:
+            t0 = time.perf_counter()
+            antes = candidatos_anterior(alc, spacing, args.min_dist)
+            t_antes = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            res = app._candidatos_utm(alc, spacing, args.min_dist, None)
+            t_ahora = time.perf_counter() - t0
+            ahora = res[0] if res is not None else np.empty((0, 2))
+
+            # misma malla: los candidatos se comparan por igualdad exacta de coordenadas
+            vistos = set(map(tuple, ahora.tolist()))
+            incluye = all(p in vistos for p in map(tuple, antes.tolist()))
+            print(f"{alc[:23]:<24}{spacing:>8.0f}{len(antes):>8}{len(ahora):>8}{t_antes:>10.3f}{t_ahora:>10.4f}"
+                  f"{t_antes / max(t_ahora, 1e-9):>7.0f}{len(ahora) - len(antes):>10}  {incluye}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Caché en disco de las capas derivadas de app.py.
+
+Cargar las capas desde los GeoJSON crudos implica json.load, reproyectar a
+WGS84 y, para las fronteras, disolver todos los polígonos demográficos con
+unary_union. El resultado sólo depende de los archivos fuente, así que se
+guarda en pickle (protocolo 5) en CACHE_DIR/<capa>-<firma>.pkl:
+
+    firma = sha1(VERSION, ruta absoluta, tamaño y mtime_ns de cada fuente)
+
+Si una fuente cambia, cambia la firma y la capa se reconstruye; las versiones
+viejas de esa capa se borran al guardar la nueva. La escritura es atómica
+(tmp + os.replace), así que varios workers pueden arrancar a la vez.
+GEO_CACHE_DIR="" desactiva la caché.
+"""
+import glob
+import hashlib
+import os
+import pickle
+import threading
+
+CACHE_DIR = os.getenv("GEO_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "SAVING", "GEO_CACHE"))
+# subir si cambia cómo app.py construye las capas
+VERSION = 1
+
+
+def firma(fuentes):
+    """Firma de los archivos fuente; None si alguno no existe."""
+    h = hashlib.sha1(f"capas-geo-v{VERSION}\0".encode())
+    for path in fuentes:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        h.update(f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    return h.hexdigest()[:20]
+
+
+def ruta(nombre, f):
+    return os.path.join(CACHE_DIR, f"{nombre}-{f}.pkl")
+
+
+def cargar_o_construir(nombre, fuentes, construir):
+    """Capa 'nombre' desde disco si las fuentes no cambiaron; si no, construir() y guardarla."""
+    f = firma(fuentes) if CACHE_DIR else None
+    if f is None:
+        return construir()  # sin caché, o falta una fuente (construir() reporta el error)
+    path = ruta(nombre, f)
+    try:
+        with open(path, "rb") as fh:
+            return pickle.load(fh)
+    except FileNotFoundError:
+        pass
+    except Exception as e:  # archivo truncado o de otra versión de Python: se reconstruye
+        print(f"[cache_geo] No se pudo leer {path}: {e}")
+
+    datos = construir()
+    guardar(nombre, f, datos)
+    return datos
+
+
+def guardar(nombre, f, datos):
+    path = ruta(nombre, f)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp, "wb") as fh:
+            pickle.dump(datos, fh, protocol=5)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[cache_geo] No se pudo guardar {nombre}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    for viejo in glob.glob(os.path.join(CACHE_DIR, f"{nombre}-*.pkl")):
+        if viejo != path:
+            try:
+                os.remove(viejo)
+            except OSError:
+                pass
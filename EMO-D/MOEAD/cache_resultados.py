@@ -0,0 +1,137 @@
+"""
+Caché de resultados de /run direccionada por contenido.
+
+Clave = sha256(bytes del .dat, semilla, num_var, SETTINGS/algorithms/*, binario ./MOEAD);
+en una instancia reducida (reduccion.py) también el mapa de IDs y la original.
+MOEAD es determinista para esa combinación, así que un pedido repetido se
+responde restaurando los archivos guardados (POF, aeds, FrentesDePareto y el
+resumen de HV) sin volver a ejecutar ./MOEAD.
+
+Cada entrada es un directorio CACHE_DIR/<clave>/ con meta.json. El tamaño total
+se acota con RESULT_CACHE_MAX_MB; al excederlo se borran las entradas usadas
+hace más tiempo (LRU por el mtime de meta.json, que se actualiza en cada acierto).
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from reduccion import ruta_mapa, ruta_original
+
+CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join("SAVING", "RESULTADOS_CACHE"))
+MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MAX_MB", 512)) * 1024 * 1024)
+SETTINGS_ALG = os.path.join("SETTINGS", "algorithms")
+BINARIO = "./MOEAD"
+
+_lock = threading.Lock()
+
+
+def _hash_archivo(h, path):
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+
+
+def clave_resultado(instancia_path, semilla, num_var):
+    h = hashlib.sha256(b"moead-resultado-v1\0")
+    _hash_archivo(h, instancia_path)
+    if os.path.exists(ruta_mapa(instancia_path)):
+        # reducida: los aeds/ guardados van con los IDs y la cobertura de la original
+        _hash_archivo(h, ruta_mapa(instancia_path))
+        _hash_archivo(h, ruta_original(instancia_path))
+    h.update(f"\0{int(semilla)}\0{int(num_var)}\0".encode())
+    for path in sorted(glob.glob(os.path.join(SETTINGS_ALG, "*"))):
+        h.update(os.path.basename(path).encode() + b"\0")
+        _hash_archivo(h, path)
+    if os.path.exists(BINARIO):
+        _hash_archivo(h, BINARIO)
+    return h.hexdigest()
+
+
+def _tamano(dir_path):
+    total = 0
+    for raiz, _, archivos in os.walk(dir_path):
+        for fn in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, fn))
+            except OSError:
+                pass
+    return total
+
+
+def _copiar(archivos, destino):
+    os.makedirs(destino, exist_ok=True)
+    nombres = []
+    for src in archivos:
+        shutil.copy2(src, os.path.join(destino, os.path.basename(src)))
+        nombres.append(os.path.basename(src))
+    return nombres
+
+
+def obtener(clave, base_name):
+    """
+    Si la clave está en caché, restaura los archivos en sus carpetas de trabajo
+    y devuelve {"files": [aeds...], "hv": [...]}; si no, None.
+    """
+    entrada = os.path.join(CACHE_DIR, clave)
+    meta_path = os.path.join(entrada, "meta.json")
+    with _lock:
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(meta_path)  # LRU
+
+        pof_dir = os.path.join("SAVING", "MOEAD", "POF")
+        aeds_folder = os.path.join("aeds", base_name)
+        fp_folder = os.path.join("FrentesDePareto", base_name)
+        for sub, destino, nombres in (("pof", pof_dir, meta["pof"]),
+                                      ("aeds", aeds_folder, meta["aeds"]),
+                                      ("frentes", fp_folder, meta["frentes"])):
+            os.makedirs(destino, exist_ok=True)
+            for fn in nombres:
+                shutil.copy2(os.path.join(entrada, sub, fn), os.path.join(destino, fn))
+    print(f"[cache_resultados] Acierto {clave[:12]} ({meta['instancia']}, semilla {meta['semilla']})")
+    return {"files": [os.path.join(aeds_folder, fn) for fn in meta["aeds"]], "hv": meta["hv"]}
+
+
+def guardar(clave, instancia, semilla, num_var, pof_files, aed_files, fp_files, hv):
+    """Guarda una corrida completa y aplica el límite de tamaño."""
+    entrada = os.path.join(CACHE_DIR, clave)
+    tmp = f"{entrada}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        meta = {
+            "instancia": instancia, "semilla": semilla, "num_var": num_var, "creado": time.time(),
+            "pof": _copiar(pof_files, os.path.join(tmp, "pof")),
+            "aeds": _copiar(aed_files, os.path.join(tmp, "aeds")),
+            "frentes": _copiar(fp_files, os.path.join(tmp, "frentes")),
+            "hv": list(hv),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        with _lock:
+            if os.path.exists(entrada):
+                shutil.rmtree(entrada, ignore_errors=True)
+            os.replace(tmp, entrada)
+            _desalojar()
+    except OSError as e:
+        print(f"[cache_resultados] No se pudo guardar {clave[:12]}: {e}")
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _desalojar():
+    """Borra las entradas menos usadas hasta quedar bajo MAX_BYTES (llamar con _lock tomado)."""
+    entradas = []
+    for entrada in glob.glob(os.path.join(CACHE_DIR, "*", "meta.json")):
+        d = os.path.dirname(entrada)
+        entradas.append((os.path.getmtime(entrada), _tamano(d), d))
+    total = sum(t for _, t, _ in entradas)
+    for _, tam, d in sorted(entradas):
+        if total <= MAX_BYTES:
+            break
+        shutil.rmtree(d, ignore_errors=True)
+        total -= tam
@@ -0,0 +1,251 @@
+"""
+Motor de cobertura vectorizado para instancias DRP.
+
+Mantiene la instancia como arreglos NumPy (coordenadas, flags, probabilidades)
+y una matriz de incidencia dispersa CSR sitio -> nodos de demanda a distancia <= R.
+La matriz se construye una sola vez por instancia (KD-tree sobre la demanda) y se
+guarda junto al .dat como '<instancia>.cov.npz'; se invalida si cambia el mtime
+del .dat o el radio R.
+
+La cobertura de cualquier conjunto de IDs es la unión de sus filas CSR más un
+producto punto con el vector de probabilidades. Devuelve exactamente la misma
+tupla que ``server.cobertura_por_ids``:
+    (n_cubiertos, prob_cubierta, porc, total_prob, n_demand)
+
+Benchmark contra la versión original:
+    python cobertura.py "INSTANCES/alcaldia_iztapalapa.dat" [n_soluciones] [k_ids]
+"""
+import os
+
+import numpy as np
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from instancias import cargar_instancia
+
+SUFIJO_CSR = ".cov.npz"
+
+
+def ruta_csr(instancia_path):
+    return instancia_path + SUFIJO_CSR
+
+
+def construir_csr(xy, dem_xy, radio, bloque=1024):
+    """
+    Filas = todos los nodos (candidatos a sitio), columnas = nodos de demanda.
+    Devuelve (indptr, indices) con el criterio exacto dx²+dy² <= R².
+    Se consulta por bloques de filas para acotar la memoria con R grandes.
+    """
+    n = xy.shape[0]
+    if n == 0 or dem_xy.shape[0] == 0:
+        return np.zeros(n + 1, dtype=np.int64), np.empty(0, dtype=np.int32)
+    r2 = float(radio) * float(radio)
+    tree = cKDTree(dem_xy)
+    largos = np.zeros(n, dtype=np.int64)
+    partes = []
+    for ini in range(0, n, bloque):
+        centros = xy[ini:ini + bloque]
+        # radio levemente holgado para el árbol; el filtro exacto va después
+        vecinos = tree.query_ball_point(centros, float(radio) * (1 + 1e-9) + 1e-9, return_sorted=True)
+        cuantos = np.fromiter((len(v) for v in vecinos), dtype=np.int64, count=len(vecinos))
+        filas = np.repeat(np.arange(len(vecinos), dtype=np.int32), cuantos)
+        cols = np.fromiter((j for v in vecinos for j in v), dtype=np.int32, count=int(cuantos.sum()))
+        dx = dem_xy[cols, 0] - centros[filas, 0]
+        dy = dem_xy[cols, 1] - centros[filas, 1]
+        keep = dx * dx + dy * dy <= r2
+        largos[ini:ini + len(vecinos)] = np.bincount(filas[keep], minlength=len(vecinos))
+        partes.append(cols[keep])
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(largos, out=indptr[1:])
+    return indptr, np.concatenate(partes)
+
+
+def cargar_csr(path, mtime, radio, n_nodos):
+    """Lee el sidecar si existe y corresponde al mismo .dat (mtime, R, N); si no, None."""
+    try:
+        with np.load(path) as z:
+            if (float(z["mtime"]) != float(mtime) or float(z["radio"]) != float(radio)
+                    or int(z["n_nodos"]) != int(n_nodos)):
+                return None
+            return z["indptr"], z["indices"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def guardar_csr(path, indptr, indices, mtime, radio, n_nodos):
+    """Escritura atómica (tmp + replace) para que varios workers no lean a medias."""
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(tmp, indptr=indptr, indices=indices,
+                 mtime=np.float64(mtime), radio=np.float64(radio), n_nodos=np.int64(n_nodos))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[cobertura] No se pudo guardar {path}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class MotorCobertura:
+    """
+    Arreglos por nodo (ids, xy, flag, prob) con flag 0 demanda, 1 preinstalado.
+    radio: radio de cobertura R de la instancia.
+    csr:   (indptr, indices) ya calculado; si es None se construye.
+    """
+
+    def __init__(self, ids, xy, flag, prob, radio, csr=None):
+        if radio is None:
+            raise ValueError("La instancia no define 'param R'")
+        self.radio = float(radio)
+
+        self.ids = np.asarray(ids, dtype=np.int64)
+        n = len(self.ids)
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(n, 2)
+        self.flag = np.asarray(flag)
+        self.prob = np.asarray(prob, dtype=np.float64)
+
+        # mismo criterio que coords_by_id: si un id se repite gana el último
+        self._fila_por_id = {idx: k for k, idx in enumerate(self.ids.tolist())}
+
+        es_demanda = self.flag == 0
+        self.dem_xy = self.xy[es_demanda]
+        self.dem_prob = self.prob[es_demanda]
+        self.n_demand = int(self.dem_xy.shape[0])
+        self.total_prob = float(self.dem_prob.sum())
+
+        if csr is None:
+            csr = construir_csr(self.xy, self.dem_xy, self.radio)
+        self.indptr, self.indices = csr
+        self.matriz = sparse.csr_matrix(
+            (np.ones(len(self.indices), dtype=np.int8), self.indices, self.indptr),
+            shape=(n, self.n_demand))
+
+        self._mask_pre = self._mascara(np.flatnonzero(self.flag == 1))
+
+    @classmethod
+    def desde_nodes(cls, nodes, radio, csr=None):
+        """nodes: [(idx, x, y, flag, prob)] como en server.cargar_instancia_coords_y_demanda."""
+        n = len(nodes)
+        return cls(np.fromiter((nd[0] for nd in nodes), dtype=np.int64, count=n),
+                   np.array([(nd[1], nd[2]) for nd in nodes], dtype=np.float64).reshape(n, 2),
+                   np.fromiter((nd[3] for nd in nodes), dtype=np.int64, count=n),
+                   np.fromiter((nd[4] for nd in nodes), dtype=np.float64, count=n),
+                   radio, csr=csr)
+
+    @classmethod
+    def desde_instancia(cls, inst):
+        """
+        inst: instancias.Instancia. Usa el sidecar CSR si sigue vigente
+        (mismo mtime, R y N); si no, lo reconstruye y guarda.
+        """
+        path = ruta_csr(inst.path)
+        n = len(inst.ids)
+        csr = cargar_csr(path, inst.mtime, inst.radio, n) if inst.radio is not None else None
+        motor = cls(inst.ids, inst.xy, inst.flag, inst.prob, inst.radio, csr=csr)
+        if csr is None:
+            guardar_csr(path, motor.indptr, motor.indices, inst.mtime, motor.radio, n)
+        return motor
+
+    # ---------- internos ----------
+    def _filas(self, ids):
+        filas = []
+        for i in ids:
+            k = self._fila_por_id.get(int(i))
+            if k is not None:
+                filas.append(k)
+        return filas
+
+    def _mascara(self, filas):
+        mask = np.zeros(self.n_demand, dtype=bool)
+        for k in filas:
+            mask[self.indices[self.indptr[k]:self.indptr[k + 1]]] = True
+        return mask
+
+    # ---------- API ----------
+    def cobertura(self, ids_instalados, incluir_preinstalados=True):
+        """Cobertura de una sola solución (lista de IDs instalados)."""
+        return self.cobertura_lote([ids_instalados], incluir_preinstalados)[0]
+
+    def cobertura_lote(self, lista_ids, incluir_preinstalados=True):
+        """
+        lista_ids: [[ids...], ...] una lista de IDs instalados por solución.
+        Devuelve una tupla (n_cubiertos, prob_cubierta, porc, total_prob, n_demand)
+        por solución, en el mismo orden.
+        """
+        filas_por_sol = [self._filas(ids) for ids in lista_ids]
+        n_sol = len(filas_por_sol)
+        if n_sol == 0:
+            return []
+
+        # S (soluciones x sitios) @ A (sitios x demanda) = unión de filas por solución
+        largos = [len(f) for f in filas_por_sol]
+        sel = sparse.csr_matrix(
+            (np.ones(sum(largos), dtype=np.int32),
+             (np.repeat(np.arange(n_sol), largos), [k for f in filas_por_sol for k in f])),
+            shape=(n_sol, self.matriz.shape[0]))
+        cub = sel @ self.matriz  # int32 (sel) evita desbordar el int8 de la matriz
+        cub.data[:] = 1  # binaria: cubierto o no
+
+        n_cub = np.asarray(cub.sum(axis=1)).ravel().astype(np.int64)
+        prob_cub = cub @ self.dem_prob
+        if incluir_preinstalados:
+            base = self._mask_pre
+            # |S ∪ B| = |S| + |B| - |S ∩ B|
+            n_cub = n_cub + int(base.sum()) - (cub @ base.astype(np.int64))
+            prob_base = self.dem_prob * base
+            prob_cub = prob_cub + float(prob_base.sum()) - (cub @ prob_base)
+
+        out = []
+        for n, p in zip(n_cub, prob_cub):
+            p = float(p)
+            porc = (p / self.total_prob * 100.0) if self.total_prob > 0 else 0.0
+            out.append((int(n), p, porc, self.total_prob, self.n_demand))
+        return out
+
+
+
+def obtener_motor_cobertura(instancia_path):
+    """
+    Motor de cobertura compartido por /run, /load, /map y /map_json. Vive junto
+    a la instancia cacheada (instancias.py), así que se reconstruye sólo si cambia el .dat.
+    """
+    inst = cargar_instancia(instancia_path)
+    if inst.motor is None:
+        inst.motor = MotorCobertura.desde_instancia(inst)
+    return inst.motor
+
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from server import cargar_instancia_coords_y_demanda, cobertura_por_ids
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "INSTANCES/100-3.dat"
+    n_sol = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    k_ids = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    nodes, coords_by_id, demanda, preinst, radio = cargar_instancia_coords_y_demanda(path)
+    rnd = random.Random(0)
+    todos = list(coords_by_id)
+    soluciones = [rnd.sample(todos, min(k_ids, len(todos))) for _ in range(n_sol)]
+
+    t0 = time.perf_counter()
+    ref = [cobertura_por_ids([coords_by_id[i] for i in ids], demanda, preinst, radio) for ids in soluciones]
+    t_ref = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    motor = MotorCobertura.desde_nodes(nodes, radio)
+    t_init = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    nuevo = motor.cobertura_lote(soluciones)
+    t_new = time.perf_counter() - t0
+
+    for a, b in zip(ref, nuevo):
+        assert a[0] == b[0] and a[4] == b[4], (a, b)
+        assert abs(a[1] - b[1]) <= 1e-9 * max(1.0, abs(a[1])), (a, b)
+
+    print(f"Instancia: {path} ({len(nodes)} nodos, {len(demanda)} demanda, R={radio})")
+    print(f"{n_sol} soluciones x {k_ids} IDs")
+    print(f"cobertura_por_ids : {t_ref:.4f} s")
+    print(f"MotorCobertura    : {t_new:.4f} s (+ {t_init:.4f} s construyendo la matriz CSR)")
+    print(f"Aceleración       : {t_ref / max(t_new + t_init, 1e-12):.1f}x")
@@ -0,0 +1,141 @@
+"""
+Lectura/escritura de los archivos de frentes: POF_*_GEN_*.dat del motor C++,
+aeds/<inst>/*_Ubicaciones_GEN*.dat y FrentesDePareto/<inst>/*_GEN*.dat.
+"""
+import os
+import re
+
+
+def gen_number_from_path(path: str) -> int:
+    """
+    Extrae el número de generación desde nombres tipo:
+      ...GEN_36.dat, ...GEN36.dat, ..._GEN_36.txt, etc.
+    """
+    base = os.path.basename(path)
+    m = re.search(r'GEN[_-]?(\d+)', base)
+    return int(m.group(1)) if m else 10**9  # grande si no matchea
+
+
+def save_front_to_file(points, filepath):
+    """
+    points: lista [(x,y)] ya filtrada (Pareto) y sin duplicados.
+    Ordena por f1 asc, luego f2 asc. Escribe con alta precisión y SIN '#'.
+    """
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    ordered = sorted(points, key=lambda p: (p[0], p[1]))  # f1 asc, f2 asc
+    with open(filepath, "w") as f:
+        for x, y in ordered:
+            f.write(f"{x:.10f} {y:.10f}\n")
+
+
+def calcular_referencia_global(files):
+    all_points = []
+    for file in files:
+        with open(file) as f:
+            lines = [line for line in f if line.strip() and not line.startswith("#")]
+            pts = [list(map(float, line.split()[:2])) for line in lines]
+            all_points.extend(pts)
+    max_x = max(p[0] for p in all_points)
+    max_y = max(p[1] for p in all_points)
+    ref_x, ref_y = referencia_desde_maximos(max_x, max_y)
+    print(f"Punto de referencia global: ({ref_x}, {ref_y})")
+    return (ref_x, ref_y)
+
+
+def referencia_desde_maximos(max_x, max_y):
+    """Punto de referencia para HV a partir de los máximos de f1 y f2 de todas las generaciones."""
+    ref_x = max_x + abs(max_x) * 0.001
+    ref_y = max_y + abs(max_y) * 0.001
+    if ref_x == 0:
+        ref_x = 0.1
+    return (ref_x, ref_y)
+
+
+def parse_line_with_ids(line):
+    """
+    Soporta:
+      - 'x y - IDs instalados: 2 3 5'
+      - 'x y 2 3 5'
+      - 'x y P 2 3 5 | 98.00' o 'x y D 2 3 5 | 75.00' (aeds existentes)
+    Retorna (x, y, ids:list[int], flag:str|None, coverage:float|None)
+    """
+    s = line.strip()
+    if not s or s.startswith("#"):
+        return None
+
+    coverage = None
+    if "|" in s:
+        left, right = s.split("|", 1)
+        s = left.strip()
+        try:
+            coverage = float(right.strip().split()[0])
+        except Exception:
+            coverage = None
+
+    if "- IDs instalados:" in s:
+        left, right = s.split("- IDs instalados:", 1)
+        nums = left.strip().split()
+        x, y = float(nums[0]), float(nums[1])
+        ids = [int(tok) for tok in right.strip().split() if tok.isdigit()]
+        return (x, y, ids, None, coverage)
+
+    toks = s.split()
+    x, y = float(toks[0]), float(toks[1])
+    flag = None
+    start = 2
+    if len(toks) >= 3 and not toks[2].replace('.', '', 1).isdigit():
+        if toks[2] in ("P", "D"):
+            flag = toks[2]
+            start = 3
+    ids = []
+    for tok in toks[start:]:
+        try:
+            ids.append(int(tok))
+        except ValueError:
+            pass
+    return (x, y, ids, flag, coverage)
+
+
+def save_aeds_with_flags_and_coverage(entries_all, filepath):
+    """
+    entries_all: [(x,y, ids:list[int], is_pareto:bool, coverage:float|None)]
+    Regla de desempatado por (x,y):
+      1) P > D
+      2) IDs lexicográficamente menores
+      3) primero que llegó
+    Orden de salida final: f1 asc, luego f2 asc.
+    Devuelve SOLO coordenadas Pareto (ordenadas igual) para HV.
+    """
+    best = {}  # key=(x,y) -> (x,y,ids,is_par,cov)
+    for x, y, ids, is_par, cov in entries_all:
+        key = (x, y)
+        cand = (x, y, list(ids or []), bool(is_par),
+                float(cov) if cov is not None else None)
+        if key not in best:
+            best[key] = cand
+        else:
+            bx, by, b_ids, b_par, b_cov = best[key]
+            # 1) Pareto primero
+            if (not b_par) and is_par:
+                best[key] = cand
+            elif (b_par == is_par):
+                # 2) IDs lexicográficos menores
+                if tuple(ids or []) < tuple(b_ids or []):
+                    best[key] = cand
+                # 3) else: se queda el existente
+
+    # ordenar por f1 asc, f2 asc
+    ordered = sorted(best.values(), key=lambda p: (p[0], p[1]))
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, "w") as f:
+        f.write("#\n")
+        for x, y, ids, is_par, cov in ordered:
+            flag = "P" if is_par else "D"
+            tail = (" " + " ".join(map(str, ids))) if ids else ""
+            cov_str = f" | {cov:.4f}" if cov is not None else ""
+            f.write(f"{x:.10f} {y:.10f} {flag}{tail}{cov_str}\n")
+        f.write("#\n")
+
+    # coords Pareto en el MISMO orden para el archivo de frente
+    return [(x, y) for (x, y, ids, is_par, cov) in ordered if is_par]
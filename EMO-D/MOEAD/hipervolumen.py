@@ -0,0 +1,135 @@
+"""
+Hipervolumen exacto en proceso (minimización), sin lanzar el binario hv-1.3.
+
+- 2 objetivos: barrido ordenado por f1, O(n log n).
+- 3+ objetivos: WFG (While, Bradstreet, Barone 2012) con caso base 2-D.
+
+Los puntos que no dominan estrictamente al punto de referencia no aportan
+volumen y se descartan, igual que en hv-1.3.
+
+Validación contra el binario sobre los frentes guardados:
+    python hipervolumen.py <instancia.dat>      (usa SAVING/MOEAD/POF/POF_<inst>_GEN_*.dat)
+"""
+import numpy as np
+
+from pareto import indices_no_dominados
+
+
+def _filtrar(puntos, ref):
+    P = np.asarray(puntos, dtype=np.float64)
+    if P.size == 0:
+        return P.reshape(0, len(ref))
+    P = P.reshape(len(P), -1)
+    return P[np.all(P < np.asarray(ref, dtype=np.float64), axis=1)]
+
+
+def _hv2d(P, ref):
+    """P ya filtrado (n, 2)."""
+    if not len(P):
+        return 0.0
+    P = P[np.lexsort((P[:, 1], P[:, 0]))]
+    # sólo aportan los puntos que bajan el mínimo de f2 acumulado
+    prev = np.concatenate(([ref[1]], np.minimum.accumulate(P[:, 1])[:-1]))
+    aporte = np.clip(prev - P[:, 1], 0.0, None)
+    return float(np.sum((ref[0] - P[:, 0]) * aporte))
+
+
+def _no_dominados(P):
+    if len(P) <= 1:
+        return P
+    return P[indices_no_dominados(P.tolist())]
+
+
+def _wfg(P, ref):
+    m = P.shape[1]
+    if len(P) == 0:
+        return 0.0
+    if m == 2:
+        return _hv2d(P, ref)
+    # ordenar por el último objetivo de peor a mejor reduce el tamaño de los limitsets
+    P = P[np.argsort(-P[:, -1], kind="stable")]
+    total = 0.0
+    for k in range(len(P)):
+        incl = float(np.prod(ref - P[k]))
+        resto = P[k + 1:]
+        if len(resto):
+            limit = _no_dominados(np.maximum(resto, P[k]))
+            total += incl - _wfg(limit, ref)
+        else:
+            total += incl
+    return total
+
+
+def hipervolumen(puntos, ref):
+    """puntos: [(f1, f2[, f3...]), ...] o arreglo (n, m); ref: punto de referencia."""
+    ref = np.asarray(ref, dtype=np.float64)
+    P = _filtrar(puntos, ref)
+    if ref.size == 2:
+        return _hv2d(P, ref)
+    return _wfg(_no_dominados(P), ref)
+
+
+class HipervolumenIncremental:
+    """
+    Calcula el HV generación tras generación con un punto de referencia fijo y
+    reutiliza el resultado anterior cuando el frente no cambió.
+    """
+
+    def __init__(self, ref):
+        self.ref = np.asarray(ref, dtype=np.float64)
+        self._clave = None
+        self._valor = 0.0
+        self.reutilizados = 0
+
+    def calcular(self, puntos):
+        P = _filtrar(puntos, self.ref)
+        P = P[np.lexsort(P.T[::-1])] if len(P) else P
+        clave = P.tobytes()
+        if clave == self._clave:
+            self.reutilizados += 1
+            return self._valor
+        self._clave = clave
+        self._valor = _hv2d(P, self.ref) if self.ref.size == 2 else _wfg(_no_dominados(P), self.ref)
+        return self._valor
+
+
+if __name__ == "__main__":
+    import glob
+    import os
+    import sys
+    import tempfile
+    import time
+
+    from frentes import calcular_referencia_global, gen_number_from_path, parse_line_with_ids, save_front_to_file
+    from server import calculate_hv, get_non_dominated_idx
+
+    instancia = sys.argv[1] if len(sys.argv) > 1 else "100-3.dat"
+    files = sorted(glob.glob(f"SAVING/MOEAD/POF/POF_{instancia}_GEN_*.dat"), key=gen_number_from_path)
+    if not files:
+        sys.exit(f"No hay frentes guardados para {instancia}")
+    ref = calcular_referencia_global(files)
+
+    frentes = []
+    for file in files:
+        with open(file) as f:
+            pts = [p[:2] for p in map(parse_line_with_ids, f) if p is not None]
+        frentes.append(sorted({pts[i] for i in get_non_dominated_idx(pts)}))
+
+    t0 = time.perf_counter()
+    nativo = [hipervolumen(fr, ref) for fr in frentes]
+    t_nat = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    binario = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, fr in enumerate(frentes, start=1):
+            fp = os.path.join(tmp, f"GEN{i}.dat")
+            save_front_to_file(fr, fp)
+            binario.append(calculate_hv(fp, ref))
+    t_bin = time.perf_counter() - t0
+
+    peor = max(abs(a - b) / max(1.0, abs(b)) for a, b in zip(nativo, binario))
+    print(f"{len(frentes)} generaciones de {instancia}")
+    print(f"binario hv : {t_bin:.4f} s")
+    print(f"nativo     : {t_nat:.4f} s")
+    print(f"máx. error relativo: {peor:.3e}")
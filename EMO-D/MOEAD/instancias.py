@@ -0,0 +1,136 @@
+"""
+Caché de instancias .dat parseadas, compartida por todo el proceso.
+
+Cada instancia se guarda en columnas NumPy (ids, xy, flag, prob) más el radio R.
+- En memoria: LRU acotado, con clave (ruta absoluta, mtime del .dat).
+- En disco: '<instancia>.inst.npz' junto al .dat; un arranque en frío lo carga
+  sin volver a parsear el texto. Se invalida si cambia el mtime del .dat.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+RE_FLOAT = r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?'
+RE_R = re.compile(r'param\s+R\s*:=\s*(' + RE_FLOAT + r')')
+RE_NODO = re.compile(r'^\d+')
+
+SUFIJO_SIDECAR = ".inst.npz"
+MAX_INSTANCIAS_CACHE = int(os.getenv("MAX_INSTANCIAS_CACHE", 8))
+
+_cache = OrderedDict()  # ruta absoluta -> Instancia
+_lock = threading.Lock()
+
+
+class Instancia:
+    """Instancia en columnas; las vistas en listas/dict se construyen una vez y se reutilizan."""
+
+    def __init__(self, path, mtime, ids, xy, flag, prob, radio):
+        self.path = path
+        self.mtime = mtime
+        self.ids = ids
+        self.xy = xy
+        self.flag = flag
+        self.prob = prob
+        self.radio = radio
+        self.motor = None  # MotorCobertura asociado (lo llena cobertura.obtener_motor_cobertura)
+        self._tupla = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def como_tupla(self):
+        """(nodes, coords_por_id, demanda, preinstalados, radio) como cargar_instancia_coords_y_demanda."""
+        if self._tupla is None:
+            ids = self.ids.tolist()
+            xs = self.xy[:, 0].tolist()
+            ys = self.xy[:, 1].tolist()
+            flags = self.flag.tolist()
+            probs = self.prob.tolist()
+            nodes = list(zip(ids, xs, ys, flags, probs))
+            coords = {idx: (x, y) for idx, x, y in zip(ids, xs, ys)}
+            demanda = [(x, y, p) for (_, x, y, f, p) in nodes if f == 0]
+            preinstalados = [(x, y) for (_, x, y, f, _) in nodes if f == 1]
+            self._tupla = (nodes, coords, demanda, preinstalados, self.radio)
+        return self._tupla
+
+
+def ruta_sidecar(instancia_path):
+    return instancia_path + SUFIJO_SIDECAR
+
+
+def parsear_dat(instancia_path):
+    """Parsea el .dat de una sola lectura. Devuelve (ids, xy, flag, prob, radio)."""
+    with open(instancia_path, 'r', encoding='utf-8', errors='ignore') as f:
+        text = f.read()
+    m = RE_R.search(text)
+    radio = float(m.group(1)) if m else None
+
+    ids, xs, ys, flags, probs = [], [], [], [], []
+    for line in text.splitlines():
+        if RE_NODO.match(line):
+            parts = line.split()
+            if len(parts) >= 5:
+                try:
+                    idx = int(parts[0])
+                    x, y = float(parts[1]), float(parts[2])
+                    flag = int(parts[3])    # 0 demanda, 1 preinstalado
+                    prob = float(parts[4])
+                except ValueError:
+                    continue
+                ids.append(idx); xs.append(x); ys.append(y); flags.append(flag); probs.append(prob)
+
+    n = len(ids)
+    xy = np.column_stack((np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64))).reshape(n, 2)
+    return (np.asarray(ids, dtype=np.int64), xy, np.asarray(flags, dtype=np.int64),
+            np.asarray(probs, dtype=np.float64), radio)
+
+
+def _leer_sidecar(path, mtime):
+    try:
+        with np.load(path) as z:
+            if float(z["mtime"]) != float(mtime):
+                return None
+            radio = float(z["radio"])
+            return (z["ids"], z["xy"], z["flag"], z["prob"], None if np.isnan(radio) else radio)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _escribir_sidecar(path, mtime, ids, xy, flag, prob, radio):
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(tmp, ids=ids, xy=xy, flag=flag, prob=prob, mtime=np.float64(mtime),
+                 radio=np.float64(np.nan if radio is None else radio))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[instancias] No se pudo guardar {path}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def cargar_instancia(instancia_path):
+    """Devuelve la Instancia (memoria -> sidecar .npz -> parseo del .dat)."""
+    key = os.path.abspath(instancia_path)
+    mtime = os.path.getmtime(instancia_path)
+    with _lock:
+        inst = _cache.get(key)
+        if inst is not None and inst.mtime == mtime:
+            _cache.move_to_end(key)
+            return inst
+
+    sidecar = ruta_sidecar(instancia_path)
+    cols = _leer_sidecar(sidecar, mtime)
+    if cols is None:
+        cols = parsear_dat(instancia_path)
+        _escribir_sidecar(sidecar, mtime, *cols)
+    inst = Instancia(instancia_path, mtime, *cols)
+
+    with _lock:
+        _cache[key] = inst
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_INSTANCIAS_CACHE:
+            _cache.popitem(last=False)
+    return inst
@@ -0,0 +1,210 @@
+"""
+Ejecutor en paralelo de los lotes ejecuciones*.txt (reemplaza a ./ejec).
+
+Cada línea "./MOEAD <instancia> <semilla> <num_var>" se corre en su propio
+directorio LOTES/<instancia>_s<semilla>_v<num_var>/ (con SETTINGS enlazado y su
+propio SAVING/), así varias corridas de la misma instancia no pisan sus
+POF_<inst>_GEN_*.dat ni execution_time.log.
+
+Al terminar cada corrida se agrega una fila a LOTES/resultados.csv con el tiempo
+de pared, el RSS máximo de MOEAD (VmHWM muestreado) y el HV del frente final
+(referencia global de la corrida, igual que /run). Las corridas con estado "ok" en esa tabla se
+saltan al relanzar el lote (reanudación).
+
+Uso:
+    python lotes.py ejecuciones.txt [ejecuciones_v2.txt ...] [-j 8] [--salida LOTES]
+"""
+import argparse
+import csv
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from frentes import gen_number_from_path, referencia_desde_maximos
+from hipervolumen import hipervolumen
+from pareto import indices_no_dominados
+from pipeline import leer_generacion
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COLUMNAS = ["lote", "instancia", "semilla", "num_var", "estado", "codigo_salida", "tiempo_s",
+            "rss_max_mb", "generaciones", "hv_final", "ref_x", "ref_y", "directorio"]
+
+
+def leer_lote(path):
+    """[(instancia, semilla, num_var)] de un archivo de ejecuciones; ignora líneas incompletas."""
+    corridas = []
+    with open(path) as f:
+        for n, ln in enumerate(f, start=1):
+            parts = ln.split()
+            if not parts:
+                continue
+            if len(parts) < 4 or not parts[0].endswith("MOEAD"):
+                print(f"[lotes] {path}:{n}: línea ignorada: {ln.strip()}")
+                continue
+            try:
+                corridas.append((parts[1], int(parts[2]), int(parts[3])))
+            except ValueError:
+                print(f"[lotes] {path}:{n}: línea ignorada: {ln.strip()}")
+    return corridas
+
+
+def resolver_instancia(instancia, lote_path):
+    """Las líneas usan rutas relativas al directorio del lote; si no está ahí, se busca en INSTANCES/."""
+    for base in (os.path.dirname(os.path.abspath(lote_path)), BASE_DIR, os.path.join(BASE_DIR, "INSTANCES")):
+        cand = os.path.join(base, instancia)
+        if os.path.isfile(cand):
+            return os.path.abspath(cand)
+    return None
+
+
+def clave_corrida(instancia, semilla, num_var):
+    return (os.path.basename(instancia), int(semilla), int(num_var))
+
+
+def leer_resultados(tabla):
+    """{clave: fila} de las corridas ya registradas."""
+    if not os.path.exists(tabla):
+        return {}
+    with open(tabla, newline="") as f:
+        return {clave_corrida(r["instancia"], r["semilla"], r["num_var"]): r for r in csv.DictReader(f)}
+
+
+def preparar_directorio(run_dir):
+    """Directorio aislado: SETTINGS enlazado (lo lee MOEAD) y SAVING/ propio."""
+    if os.path.isdir(run_dir):
+        shutil.rmtree(run_dir)  # restos de una corrida interrumpida
+    for sub in ("POF", "LOG"):
+        os.makedirs(os.path.join(run_dir, "SAVING", "MOEAD", sub))
+    os.symlink(os.path.join(BASE_DIR, "SETTINGS"), os.path.join(run_dir, "SETTINGS"))
+
+
+def hv_final(run_dir, instancia):
+    """(generaciones, hv del último frente, ref) con la referencia global de la corrida."""
+    files = sorted(glob.glob(os.path.join(run_dir, "SAVING", "MOEAD", "POF", f"POF_{instancia}_GEN_*.dat")),
+                   key=gen_number_from_path)
+    max_x = max_y = None
+    ultimo = []
+    for file in files:
+        pts = [(x, y) for (x, y, _) in leer_generacion(file)]
+        if not pts:
+            continue
+        mx, my = max(p[0] for p in pts), max(p[1] for p in pts)
+        max_x = mx if max_x is None else max(max_x, mx)
+        max_y = my if max_y is None else max(max_y, my)
+        ultimo = pts
+    if max_x is None:
+        return len(files), None, (None, None)
+    ref = referencia_desde_maximos(max_x, max_y)
+    frente = [ultimo[i] for i in indices_no_dominados(ultimo)]
+    return len(files), hipervolumen(frente, ref), ref
+
+
+def _vmhwm_kb(pid):
+    """Pico de memoria residente (VmHWM) del proceso, en KB; None si ya no está."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for ln in f:
+                if ln.startswith("VmHWM:"):
+                    return int(ln.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def correr(binario, instancia_path, semilla, num_var, run_dir, intervalo=0.05):
+    """Lanza MOEAD en run_dir y devuelve (codigo_salida, tiempo_s, rss_max_mb o None)."""
+    preparar_directorio(run_dir)
+    t0 = time.perf_counter()
+    rss_kb = None
+    with open(os.path.join(run_dir, "salida.log"), "w") as log:
+        proc = subprocess.Popen([binario, instancia_path, str(semilla), str(num_var)],
+                                cwd=run_dir, stdout=log, stderr=subprocess.STDOUT)
+        # ru_maxrss de wait4 arrastra el RSS de este proceso Python (fork antes del exec),
+        # así que se muestrea VmHWM del hijo; es monótono, sólo se pierde el último intervalo
+        while True:
+            hwm = _vmhwm_kb(proc.pid)
+            if hwm is not None:
+                rss_kb = hwm if rss_kb is None else max(rss_kb, hwm)
+            try:
+                proc.wait(timeout=intervalo)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+    return proc.returncode, time.perf_counter() - t0, None if rss_kb is None else rss_kb / 1024.0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Ejecuta en paralelo los lotes ejecuciones*.txt de MOEAD.")
+    ap.add_argument("lotes", nargs="*", help="archivos de ejecuciones (por defecto ejecuciones*.txt)")
+    ap.add_argument("-j", "--paralelo", type=int, default=os.cpu_count() or 1, help="corridas simultáneas")
+    ap.add_argument("--salida", default=os.path.join(BASE_DIR, "LOTES"), help="directorio de las corridas")
+    ap.add_argument("--binario", default=os.path.join(BASE_DIR, "MOEAD"))
+    ap.add_argument("--rehacer", action="store_true", help="no saltar corridas ya registradas como ok")
+    args = ap.parse_args(argv)
+
+    lotes = args.lotes or sorted(glob.glob(os.path.join(BASE_DIR, "ejecuciones*.txt")))
+    binario = os.path.abspath(args.binario)
+    if not os.path.isfile(binario):
+        sys.exit(f"No existe el binario {binario} (compilar con make)")
+
+    os.makedirs(args.salida, exist_ok=True)
+    tabla = os.path.join(args.salida, "resultados.csv")
+    hechos = {} if args.rehacer else {k: r for k, r in leer_resultados(tabla).items() if r["estado"] == "ok"}
+
+    pendientes, vistas = [], set()
+    for lote in lotes:
+        for instancia, semilla, num_var in leer_lote(lote):
+            clave = clave_corrida(instancia, semilla, num_var)
+            if clave in hechos or clave in vistas:
+                continue
+            vistas.add(clave)
+            pendientes.append((lote, instancia, semilla, num_var))
+    print(f"[lotes] {len(pendientes)} corridas pendientes ({len(hechos)} ya hechas), {args.paralelo} en paralelo")
+
+    lock_tabla = threading.Lock()
+    nueva = not os.path.exists(tabla)
+
+    def registrar(fila):
+        nonlocal nueva
+        with lock_tabla, open(tabla, "a", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=COLUMNAS)
+            if nueva:
+                w.writeheader()
+                nueva = False
+            w.writerow(fila)
+
+    def tarea(lote, instancia, semilla, num_var):
+        nombre = os.path.basename(instancia)
+        run_dir = os.path.join(args.salida, f"{nombre}_s{semilla}_v{num_var}")
+        fila = dict.fromkeys(COLUMNAS, "")
+        fila.update(lote=os.path.basename(lote), instancia=nombre, semilla=semilla, num_var=num_var,
+                    directorio=os.path.relpath(run_dir, args.salida))
+        instancia_path = resolver_instancia(instancia, lote)
+        if instancia_path is None:
+            fila["estado"] = "sin_instancia"
+        else:
+            codigo, tiempo, rss = correr(binario, instancia_path, semilla, num_var, run_dir)
+            gens, hv, ref = hv_final(run_dir, nombre)
+            fila.update(estado="ok" if codigo == 0 and hv is not None else "error", codigo_salida=codigo,
+                        tiempo_s=f"{tiempo:.3f}", rss_max_mb="" if rss is None else f"{rss:.1f}", generaciones=gens,
+                        hv_final="" if hv is None else f"{hv:.6f}",
+                        ref_x="" if ref[0] is None else ref[0], ref_y="" if ref[1] is None else ref[1])
+        registrar(fila)
+        return fila
+
+    with ThreadPoolExecutor(max_workers=max(1, args.paralelo)) as pool:
+        futuros = [pool.submit(tarea, *p) for p in pendientes]
+        for n, fut in enumerate(as_completed(futuros), start=1):
+            f = fut.result()
+            print(f"[lotes] {n}/{len(futuros)} {f['instancia']} semilla {f['semilla']}: {f['estado']} "
+                  f"t={f['tiempo_s']}s rss={f['rss_max_mb']}MB hv={f['hv_final']}")
+    print(f"[lotes] Resultados en {tabla}")
+
+
+if __name__ == "__main__":
+    main()
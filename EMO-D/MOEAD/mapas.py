@@ -0,0 +1,247 @@
+"""
+Render de la imagen estática de /map, fuera del estado global de pyplot.
+
+- Se dibuja con la API orientada a objetos (Figure + FigureCanvasAgg), así que
+  es seguro desde varios hilos; los radios de cobertura van en una sola
+  PatchCollection en vez de un plt.Circle por AED.
+- El render corre en un pool de procesos ('spawn') y el resultado se guarda en
+  un LRU en memoria con clave (instancia, mtime, hash de los IDs ordenados,
+  show_probs, formato). Pedidos iguales en vuelo comparten el mismo render.
+- La misma clave es el ETag de GET /map/imagen, que sirve el PNG/WebP directo
+  (sin base64) y responde 304 si el navegador ya lo tiene.
+
+Para /map_json: capas_mapa() arma las capas del mapa interactivo en columnas
+NumPy, recortadas a un viewport y con la demanda agregada en grilla cuando hay
+más puntos de los que se pueden dibujar; empaquetar_binario() las serializa
+como Float32 little-endian con una cabecera JSON chica.
+"""
+import hashlib
+import io
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import numpy as np
+
+MAPA_WORKERS = int(os.getenv("MAPA_WORKERS", 2))
+MAX_MAPAS_CACHE = int(os.getenv("MAX_MAPAS_CACHE", 64))
+FORMATOS = {"png": "image/png", "webp": "image/webp"}
+MAGIA_BINARIO = b"MAP1"
+MAX_PUNTOS_DEMANDA = int(os.getenv("MAX_PUNTOS_DEMANDA", 20000))
+CELDA_PX = 4  # lado de la celda de agregación, en píxeles de pantalla
+
+
+def hash_ids(ids):
+    """Hash de los IDs sin importar orden ni repetidos."""
+    ids = np.unique(np.asarray(list(ids), dtype=np.int64))
+    return hashlib.sha1(ids.tobytes()).hexdigest()[:16]
+
+
+def etag_mapa(instancia_path, ids, show_probs, formato="png"):
+    mtime = os.path.getmtime(instancia_path)
+    clave = f"{os.path.abspath(instancia_path)}|{mtime}|{hash_ids(ids)}|{int(bool(show_probs))}|{formato}"
+    return hashlib.sha1(clave.encode()).hexdigest()
+
+
+def dibujar_mapa(instancia_path, ids, show_probs, formato="png"):
+    """Bytes de la imagen del mapa (mismo dibujo que /map)."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import PatchCollection
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Circle
+
+    from instancias import cargar_instancia
+
+    inst = cargar_instancia(instancia_path)
+    base_name = os.path.splitext(os.path.basename(instancia_path))[0]
+    radio = inst.radio
+    x, y = inst.xy[:, 0], inst.xy[:, 1]
+    sel = np.isin(inst.ids, np.asarray(list(ids), dtype=np.int64))
+    dem, pre = inst.flag == 0, inst.flag == 1
+    size = inst.prob * 200 if show_probs else np.full(len(inst), 20.0)
+
+    fig = Figure(figsize=(15, 8), dpi=180)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    m = ~sel & dem  # demanda no cubierta
+    ax.scatter(x[m], y[m], s=size[m], c='blue', label='Nodos de Demanda', alpha=0.6, edgecolors='k')
+    m = ~sel & pre  # origen AEDs movidos
+    ax.scatter(x[m], y[m], s=size[m], facecolors='none', edgecolors='red', linewidth=1.5, label='AED movido')
+    m = sel & pre   # preinstalados que se quedaron
+    ax.scatter(x[m], y[m], c='orange', s=120, marker='*', label='Equipo Preinstalado (mantenido)',
+               edgecolors='k', zorder=4)
+    m = sel & dem   # nuevos AEDs
+    ax.scatter(x[m], y[m], c='green', s=120, marker='*', label='AED instalado (Nuevo)', edgecolors='k', zorder=5)
+
+    finales = sel & (dem | pre)
+    if finales.any() and radio:
+        circulos = [Circle((cx, cy), radio) for cx, cy in zip(x[finales].tolist(), y[finales].tolist())]
+        ax.add_collection(PatchCollection(circulos, facecolor='gray', edgecolor='gray', alpha=0.15, zorder=1))
+
+    if len(inst):
+        pad = radio or 0.0
+        ax.set_xlim(x.min() - pad, x.max() + pad)
+        ax.set_ylim(y.min() - pad, y.max() + pad)
+
+    ax.set_aspect('equal', adjustable='box')
+    ax.autoscale(enable=False)
+    ax.set_xlabel("X")
+    ax.set_ylabel("Y")
+    ax.set_title(f"Mapa: {base_name}")
+    ax.grid(True)
+    ax.legend(loc='center left', bbox_to_anchor=(1.02, 0.85), framealpha=0.95)
+    fig.tight_layout(rect=[0, 0, 0.88, 1])
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format=formato, bbox_inches='tight', pad_inches=0.15)
+    return buf.getvalue()
+
+
+class RenderizadorMapas:
+    def __init__(self, workers=MAPA_WORKERS, max_cache=MAX_MAPAS_CACHE):
+        self.workers = max(1, int(workers))
+        self.max_cache = max_cache
+        self._cache = OrderedDict()  # etag -> bytes
+        self._en_vuelo = {}          # etag -> Future
+        # reentrante: add_done_callback corre _guardar en el acto si el render ya terminó
+        self._lock = threading.RLock()
+        self._pool = None
+
+    def _pool_(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    def solicitar(self, instancia_path, ids, show_probs, formato="png"):
+        """Lanza (o reutiliza) el render y devuelve el ETag sin esperar la imagen."""
+        self._futuro(instancia_path, ids, show_probs, formato)
+        return etag_mapa(instancia_path, ids, show_probs, formato)
+
+    def obtener(self, instancia_path, ids, show_probs, formato="png"):
+        """(bytes, etag) de la imagen; bloquea hasta que esté."""
+        etag = etag_mapa(instancia_path, ids, show_probs, formato)
+        while True:
+            fut = self._futuro(instancia_path, ids, show_probs, formato, etag)
+            if fut is not None:
+                return fut.result(), etag
+            with self._lock:
+                img = self._cache.get(etag)
+            if img is not None:  # si no, se desalojó entre medio: se vuelve a pedir
+                return img, etag
+
+    def _futuro(self, instancia_path, ids, show_probs, formato, etag=None):
+        etag = etag or etag_mapa(instancia_path, ids, show_probs, formato)
+        ids = sorted(set(int(i) for i in ids))
+        with self._lock:
+            if etag in self._cache:
+                self._cache.move_to_end(etag)
+                return None
+            fut = self._en_vuelo.get(etag)
+            if fut is None:
+                try:
+                    fut = self._pool_().submit(dibujar_mapa, instancia_path, ids, bool(show_probs), formato)
+                except BrokenProcessPool:  # un worker murió: se levanta un pool nuevo
+                    self._pool = None
+                    fut = self._pool_().submit(dibujar_mapa, instancia_path, ids, bool(show_probs), formato)
+                self._en_vuelo[etag] = fut
+                fut.add_done_callback(lambda f, e=etag: self._guardar(e, f))
+            return fut
+
+    def _guardar(self, etag, fut):
+        with self._lock:
+            self._en_vuelo.pop(etag, None)
+            if fut.cancelled() or fut.exception() is not None:
+                return
+            self._cache[etag] = fut.result()
+            self._cache.move_to_end(etag)
+            while len(self._cache) > self.max_cache:
+                self._cache.popitem(last=False)
+
+
+# ---------- /map_json ----------
+def capas_mapa(inst, ids, show_probs, bbox=None, px=None, max_puntos=MAX_PUNTOS_DEMANDA):
+    """
+    Capas del mapa interactivo como columnas NumPy:
+      demanda (x, y, s[, n]), preinstalados_movidos_origen (x, y, s),
+      seleccionados_nuevos (x, y), seleccionados_existentes (x, y), coords_finales_aeds (x, y)
+    bbox: (xmin, ymin, xmax, ymax) opcional; demanda y movidos se recortan a él.
+    px: ancho del gráfico en píxeles; si la demanda visible supera max_puntos se
+        agrega en una grilla de CELDA_PX píxeles (centroide ponderado por prob, s sumado, n puntos).
+    Devuelve (capas, lod).
+    """
+    x, y = inst.xy[:, 0], inst.xy[:, 1]
+    sel = np.isin(inst.ids, np.asarray(list(ids), dtype=np.int64))
+    dem, pre = inst.flag == 0, inst.flag == 1
+    size = inst.prob * 200 if show_probs else np.full(len(inst), 20.0)
+
+    visible = np.ones(len(inst), dtype=bool)
+    if bbox is not None:
+        xmin, ymin, xmax, ymax = bbox
+        visible = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+
+    m = ~sel & dem & visible
+    capas = {"demanda": {"x": x[m], "y": y[m], "s": size[m]}}
+    lod = {"agregado": False, "n_original": int(m.sum())}
+    if px and lod["n_original"] > max_puntos:
+        capas["demanda"], lod = _agregar_grilla(x[m], y[m], size[m], inst.prob[m], bbox, px)
+
+    m = ~sel & pre & visible
+    capas["preinstalados_movidos_origen"] = {"x": x[m], "y": y[m], "s": size[m]}
+    capas["seleccionados_nuevos"] = {"x": x[sel & dem], "y": y[sel & dem]}
+    capas["seleccionados_existentes"] = {"x": x[sel & pre], "y": y[sel & pre]}
+    # mismo orden que antes: nuevos y después preinstalados mantenidos
+    capas["coords_finales_aeds"] = {"x": np.concatenate((x[sel & dem], x[sel & pre])),
+                                    "y": np.concatenate((y[sel & dem], y[sel & pre]))}
+    return capas, lod
+
+
+def _agregar_grilla(x, y, s, prob, bbox, px):
+    if bbox is None:
+        bbox = (x.min(), y.min(), x.max(), y.max())
+    xmin, ymin, xmax, _ = bbox
+    celda = max((xmax - xmin) / max(1.0, px / CELDA_PX), 1e-9)
+    cx = np.floor((x - xmin) / celda).astype(np.int64)
+    cy = np.floor((y - ymin) / celda).astype(np.int64)
+    _, inv, n = np.unique(np.stack((cx, cy), axis=1), axis=0, return_inverse=True, return_counts=True)
+    inv = inv.ravel()
+    peso = np.where(prob > 0, prob, 1e-12)
+    w = np.bincount(inv, weights=peso)
+    agregada = {
+        "x": np.bincount(inv, weights=x * peso) / w,
+        "y": np.bincount(inv, weights=y * peso) / w,
+        "s": np.bincount(inv, weights=s),
+        "n": n.astype(np.float64),
+    }
+    return agregada, {"agregado": True, "n_original": int(len(x)), "celda": float(celda)}
+
+
+def capas_a_listas(capas):
+    return {nombre: {k: v.tolist() for k, v in cols.items()} for nombre, cols in capas.items()}
+
+
+def empaquetar_binario(cabecera, capas):
+    """
+    b"MAP1" | u32 largo de la cabecera | cabecera JSON (UTF-8, rellena a 4 bytes) | columnas Float32 LE.
+    La cabecera agrega capas[nombre] = {"n", "campos", "offset"}: offset en bytes desde el inicio
+    de las columnas (8 + largo de la cabecera); las columnas de una capa van seguidas, n valores cada una.
+    """
+    cab = dict(cabecera, capas={})
+    bloques = []
+    offset = 0
+    for nombre, cols in capas.items():
+        campos = list(cols)
+        n = len(cols[campos[0]]) if campos else 0
+        cab["capas"][nombre] = {"n": n, "campos": campos, "offset": offset}
+        for c in campos:
+            b = np.asarray(cols[c], dtype="<f4").tobytes()
+            bloques.append(b)
+            offset += len(b)
+    texto = json.dumps(cab, ensure_ascii=False).encode()
+    texto += b" " * ((-len(texto)) % 4)
+    return MAGIA_BINARIO + struct.pack("<I", len(texto)) + texto + b"".join(bloques)
@@ -0,0 +1,85 @@
+"""
+Ordenamiento no dominado (minimización) con rangos completos.
+
+- 2 objetivos: ordenar + barrido con búsqueda binaria sobre los frentes, O(n log n).
+- 3 o más objetivos: fast non-dominated sort (Deb et al.) vectorizado con NumPy.
+
+Rango 0 = primer frente (los 'P' de save_aeds_with_flags_and_coverage), 1 = segundo, ...
+Los puntos repetidos no se dominan entre sí: reciben el mismo rango, y el
+desempate por (x, y) lo sigue haciendo save_aeds_with_flags_and_coverage.
+"""
+import numpy as np
+
+
+def _rangos_2d(pts):
+    n = len(pts)
+    rangos = [0] * n
+    orden = sorted(range(n), key=lambda i: (pts[i][0], pts[i][1]))
+    # ultimo[k] = último punto agregado al frente k (mínimo f2 del frente)
+    ultimo = []
+
+    def dominado_por_frente(k, x, y):
+        ux, uy = ultimo[k]
+        return uy < y or (uy == y and ux < x)
+
+    for i in orden:
+        x, y = pts[i][0], pts[i][1]
+        lo, hi = 0, len(ultimo)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if dominado_por_frente(mid, x, y):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(ultimo):
+            ultimo.append((x, y))
+        else:
+            ultimo[lo] = (x, y)
+        rangos[i] = lo
+    return rangos
+
+
+def _rangos_nd(F):
+    """Fast non-dominated sort; F es (n, m)."""
+    n = F.shape[0]
+    menor_igual = np.all(F[:, None, :] <= F[None, :, :], axis=2)
+    menor = np.any(F[:, None, :] < F[None, :, :], axis=2)
+    domina = menor_igual & menor  # domina[i, j]: i domina a j
+    n_dominadores = domina.sum(axis=0)
+    rangos = np.full(n, -1, dtype=np.int64)
+    frente = np.flatnonzero(n_dominadores == 0)
+    r = 0
+    while frente.size:
+        rangos[frente] = r
+        n_dominadores = n_dominadores - domina[frente].sum(axis=0)
+        n_dominadores[rangos >= 0] = -1
+        frente = np.flatnonzero(n_dominadores == 0)
+        r += 1
+    return rangos.tolist()
+
+
+def rangos_no_dominados(puntos):
+    """
+    puntos: [(f1, f2, ...), ...] (todos con el mismo número de objetivos).
+    Devuelve una lista con el rango de no dominación de cada punto.
+    """
+    if not puntos:
+        return []
+    m = len(puntos[0])
+    if m == 2:
+        return _rangos_2d(puntos)
+    return _rangos_nd(np.asarray(puntos, dtype=np.float64).reshape(len(puntos), m))
+
+
+def frentes(puntos):
+    """Agrupa índices por frente: [[idx rango 0], [idx rango 1], ...]."""
+    rangos = rangos_no_dominados(puntos)
+    out = [[] for _ in range(max(rangos) + 1)] if rangos else []
+    for i, r in enumerate(rangos):
+        out[r].append(i)
+    return out
+
+
+def indices_no_dominados(puntos):
+    """Índices del primer frente, en el orden original (igual que get_non_dominated_idx)."""
+    return [i for i, r in enumerate(rangos_no_dominados(puntos)) if r == 0]
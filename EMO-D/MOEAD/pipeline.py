@@ -0,0 +1,336 @@
+"""
+Pipeline por generación usado por /run y /load.
+
+Etapas por archivo POF_<inst>_GEN_<n>.dat (independientes entre generaciones):
+    parseo -> separación P/D (pareto.py) -> cobertura (cobertura.py)
+    -> escritura aeds/<inst>/..._Ubicaciones_GEN<i>.dat y FrentesDePareto/<inst>/..._GEN<i>.dat
+
+procesar_en_vivo() reparte las generaciones en un pool de procesos y las entrega
+en orden, tanto de una lista (/load) como a medida que MOEAD las escribe (/run,
+con vigilar_generaciones; ver trabajos.py y /jobs/<id>/events). En la
+misma pasada cada etapa informa los máximos de f1/f2, así que el punto de
+referencia global sale sin releer los archivos (antes: calcular_referencia_global).
+El HV se calcula al final, en orden, con hipervolumen.HipervolumenIncremental.
+Con el mapa de revisar.py (o hasheando cada POF al llegar), las generaciones
+idénticas a una anterior no se vuelven a procesar: se copian sus archivos y su HV.
+"""
+import glob
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from archivo_corrida import leer_entradas
+from cobertura import obtener_motor_cobertura
+from frentes import (gen_number_from_path, parse_line_with_ids, referencia_desde_maximos,
+                     save_aeds_with_flags_and_coverage, save_front_to_file)
+from hipervolumen import HipervolumenIncremental
+from pareto import indices_no_dominados
+from reduccion import traducir_ids
+from revisar import DeduplicadorGeneraciones
+
+# por debajo de esto el costo de levantar el pool no compensa
+MIN_GEN_PARALELO = int(os.getenv("MIN_GEN_PARALELO", 16))
+# generaciones en vuelo por worker antes de esperar a la más vieja
+VENTANA_POR_WORKER = 2
+
+
+def leer_generacion(file):
+    """
+    [(x, y, ids)] de un archivo POF de una generación, o de (archivo .run, gen)
+    si la corrida ya está en archivo_corrida.py (un mmap en vez de parsear texto).
+    Una lista se toma como las entradas ya leídas (procesar_en_vivo con archivo).
+    """
+    if isinstance(file, list):
+        return file
+    if isinstance(file, tuple):
+        return leer_entradas(*file)
+    entries_raw = []
+    with open(file) as f:
+        for ln in f:
+            try:
+                parsed = parse_line_with_ids(ln)
+            except (ValueError, IndexError):
+                continue  # línea truncada (p. ej. MOEAD detenido a mitad de escritura)
+            if parsed is not None:
+                x, y, ids, _, _ = parsed
+                entries_raw.append((x, y, ids))
+    return entries_raw
+
+
+def procesar_generacion(i, file, instancia_path, base_name, fp_folder, aeds_folder, traduccion=None):
+    """
+    Procesa la generación i (1-based) y devuelve un dict con:
+      i, aeds_file (None si vacía), coords_hv (Pareto ordenado), max_x, max_y
+    traduccion: opcional, IDs originales de una instancia reducida (ver reduccion.py);
+                los IDs de cada solución se pasan a los de la original.
+    """
+    entries_raw = leer_generacion(file)
+    if traduccion is not None:
+        entries_raw = [(x, y, traducir_ids(traduccion, ids)) for (x, y, ids) in entries_raw]
+    if not entries_raw:
+        return {"i": i, "aeds_file": None, "coords_hv": [], "max_x": None, "max_y": None}
+
+    # separar P/D
+    nd_set = set(indices_no_dominados([(x, y) for (x, y, _) in entries_raw]))
+    nd_entries  = [(x, y, ids, True)  for k, (x, y, ids) in enumerate(entries_raw) if k in nd_set]
+    dom_entries = [(x, y, ids, False) for k, (x, y, ids) in enumerate(entries_raw) if k not in nd_set]
+
+    # cobertura de toda la generación en un lote
+    entries_gen = nd_entries + dom_entries
+    coberturas = obtener_motor_cobertura(instancia_path).cobertura_lote([ids for (_, _, ids, _) in entries_gen])
+    entries_all = [(x, y, ids, is_par, cov[2])
+                   for (x, y, ids, is_par), cov in zip(entries_gen, coberturas)]
+
+    aeds_file = os.path.join(aeds_folder, f"{base_name}_Ubicaciones_GEN{i}.dat")
+    coords_hv = save_aeds_with_flags_and_coverage(entries_all, aeds_file)
+
+    fp_file = os.path.join(fp_folder, f"{base_name}_GEN{i}.dat")
+    save_front_to_file(coords_hv, fp_file)
+
+    return {"i": i, "aeds_file": aeds_file, "coords_hv": coords_hv,
+            "max_x": max(x for x, _, _ in entries_raw), "max_y": max(y for _, y, _ in entries_raw)}
+
+
+def _init_worker(instancia_path):
+    # deja la instancia y su matriz CSR cargadas (desde los sidecars .npz) en cada worker
+    obtener_motor_cobertura(instancia_path)
+
+
+def duplicar_generacion(res, i, base_name, fp_folder, aeds_folder):
+    """Resultado de la generación i cuando su POF es idéntico al de res: copia los archivos."""
+    nuevo = dict(res, i=i, canonica=res["i"])
+    if res["aeds_file"] is not None:
+        nuevo["aeds_file"] = os.path.join(aeds_folder, f"{base_name}_Ubicaciones_GEN{i}.dat")
+        shutil.copyfile(res["aeds_file"], nuevo["aeds_file"])
+        shutil.copyfile(os.path.join(fp_folder, f"{base_name}_GEN{res['i']}.dat"),
+                        os.path.join(fp_folder, f"{base_name}_GEN{i}.dat"))
+    return nuevo
+
+
+def _gen_de(file):
+    return file[1] if isinstance(file, tuple) else gen_number_from_path(file)
+
+
+class PipelineCancelado(Exception):
+    pass
+
+
+def _hecho(res):
+    fut = Future()
+    fut.set_result(res)
+    return fut
+
+
+def procesar_en_vivo(instancia_path, fuentes, base_name, fp_folder, aeds_folder, workers=None,
+                     dedup=None, traduccion=None, cancelar=None, archivo=None):
+    """
+    Generador: procesa las generaciones de 'fuentes' a medida que llegan y entrega
+    (res, ref) en orden; res es el de procesar_generacion (más 'archivo', la fuente) y
+    ref la referencia provisional con los máximos vistos hasta ahí (None si no hay).
+    fuentes: lista de POF o de (archivo .run, gen) (/load), o un iterable que las va
+             entregando mientras MOEAD corre (vigilar_generaciones con latido, /run);
+             un None ahí sólo quiere decir "nada nuevo todavía".
+    dedup: {gen: gen canónica} de revisar.cargar_mapa; si es None cada POF se hashea al
+           llegar (revisar.DeduplicadorGeneraciones). Las idénticas a una anterior copian
+           los archivos de ésa.
+    cancelar: threading.Event opcional; si se activa se lanza PipelineCancelado y lo que
+              quedaba en el pool se descarta sin esperarlo.
+    archivo: archivo_corrida.EscritorArchivo opcional; cada POF se parsea una vez acá, se
+             agrega al archivo de la corrida y el worker recibe las entradas ya leídas.
+    """
+    workers = workers or os.cpu_count() or 1
+    # en vivo no se sabe cuántas vienen; con una lista corta el pool no compensa
+    paralelo = workers > 1 and (not isinstance(fuentes, list) or len(fuentes) >= MIN_GEN_PARALELO)
+    # ventana acotada: al cancelar sólo quedan en vuelo unas pocas generaciones
+    ventana = workers * VENTANA_POR_WORKER if paralelo else 0
+    # la instancia se carga/construye una vez en el padre: así los sidecars quedan listos
+    obtener_motor_cobertura(instancia_path)
+
+    deduplicador = DeduplicadorGeneraciones() if dedup is None else None
+    pos_de_gen = {}
+    resultados = []
+    en_curso = deque()  # (i, canónica, fuente, future; None si es copia de una anterior)
+    max_x = max_y = None
+    pool = None
+
+    def entregar(limite):
+        """Entrega en orden las que ya terminaron; espera mientras haya más de 'limite' en curso."""
+        nonlocal max_x, max_y
+        while en_curso:
+            i, c, fuente, fut = en_curso[0]
+            if fut is not None and not fut.done() and len(en_curso) <= limite:
+                return
+            if cancelar is not None and cancelar.is_set():
+                raise PipelineCancelado()
+            en_curso.popleft()
+            if fut is None:
+                res = duplicar_generacion(resultados[c - 1], i, base_name, fp_folder, aeds_folder)
+            else:
+                res = fut.result()
+            res["archivo"] = fuente
+            resultados.append(res)
+            if res["max_x"] is not None:
+                max_x = res["max_x"] if max_x is None else max(max_x, res["max_x"])
+                max_y = res["max_y"] if max_y is None else max(max_y, res["max_y"])
+            yield res, (referencia_desde_maximos(max_x, max_y) if max_x is not None else None)
+
+    try:
+        for fuente in fuentes:
+            if cancelar is not None and cancelar.is_set():
+                raise PipelineCancelado()
+            if fuente is not None:
+                i = len(resultados) + len(en_curso) + 1
+                if deduplicador is not None:
+                    c = deduplicador.agregar(i, fuente)
+                else:
+                    # posición (1-based) de la primera generación con el mismo contenido
+                    pos_de_gen[_gen_de(fuente)] = i
+                    c = pos_de_gen.get(dedup.get(_gen_de(fuente)), i)
+                dato = fuente
+                if archivo is not None:
+                    dato = leer_generacion(fuente)
+                    archivo.agregar(_gen_de(fuente), [(x, y) for (x, y, _) in dato],
+                                    [ids for (_, _, ids) in dato])
+                fut = None
+                if c == i:
+                    tarea = (i, dato, instancia_path, base_name, fp_folder, aeds_folder, traduccion)
+                    if not paralelo:
+                        fut = _hecho(procesar_generacion(*tarea))
+                    else:
+                        if pool is None:
+                            # 'spawn': el servidor Flask usa hilos y no conviene hacer fork desde ahí
+                            n = min(workers, len(fuentes)) if isinstance(fuentes, list) else workers
+                            pool = ProcessPoolExecutor(max_workers=n, mp_context=get_context("spawn"),
+                                                       initializer=_init_worker, initargs=(instancia_path,))
+                        fut = pool.submit(procesar_generacion, *tarea)
+                en_curso.append((i, c, fuente, fut))
+            yield from entregar(ventana)
+        yield from entregar(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def ejecutar_pipeline(instancia_path, raw_files, base_name, fp_folder, aeds_folder, workers=None,
+                      progreso=None, cancelar=None, dedup=None, traduccion=None, etiqueta=None):
+    """
+    Procesa todas las generaciones, escribe <base>_HV_summary.txt y devuelve (aed_files, hv_results).
+    progreso(evento, datos): opcional, se llama con ("generacion", res) por cada generación
+                             procesada y con ("hv", {"i", "hv"}) por cada HV calculado.
+    cancelar: threading.Event opcional; si se activa no se procesan más generaciones
+              (las que esperan en el pool se cancelan) y se lanza PipelineCancelado.
+    dedup: opcional, {gen: gen canónica} de revisar.cargar_mapa; las generaciones
+           idénticas a una anterior copian sus archivos y su HV en vez de recalcularlos.
+    traduccion: opcional, IDs originales si la corrida es de una instancia reducida;
+                en ese caso instancia_path es la original.
+    etiqueta: opcional, línea extra para el resumen (reduccion.etiqueta_ids).
+    """
+    os.makedirs(fp_folder, exist_ok=True)
+    os.makedirs(aeds_folder, exist_ok=True)
+
+    resultados = []
+    vivo = procesar_en_vivo(instancia_path, list(raw_files), base_name, fp_folder, aeds_folder, workers,
+                            dedup=dedup or {}, traduccion=traduccion, cancelar=cancelar)
+    try:
+        for res, _ in vivo:
+            resultados.append(res)
+            if progreso is not None:
+                progreso("generacion", res)
+    finally:
+        vivo.close()  # con cancelación: descarta lo que sigue en el pool sin esperarlo
+    return cerrar_pipeline(resultados, base_name, fp_folder, progreso, etiqueta)
+
+
+def referencia_de_resultados(resultados):
+    """Punto de referencia global a partir de los máximos que informa cada generación."""
+    max_x = max_y = None
+    for res in resultados:
+        if res["max_x"] is not None:
+            max_x = res["max_x"] if max_x is None else max(max_x, res["max_x"])
+            max_y = res["max_y"] if max_y is None else max(max_y, res["max_y"])
+    if max_x is None:
+        max_x = max_y = 0.0
+    return referencia_desde_maximos(max_x, max_y)
+
+
+def cerrar_pipeline(resultados, base_name, fp_folder, progreso=None, etiqueta=None):
+    """
+    Con las generaciones ya procesadas (en orden): fija la referencia global, calcula
+    los HV y escribe <base>_HV_summary.txt. Devuelve (aed_files, hv_results).
+    etiqueta: opcional, línea de comentario ('# ...') que se agrega al resumen.
+    """
+    ref_point = referencia_de_resultados(resultados)
+    print(f"Punto de referencia global: ({ref_point[0]}, {ref_point[1]})")
+
+    hv_calc = HipervolumenIncremental(ref_point)
+    hv_results, aed_files = [], []
+    os.makedirs(fp_folder, exist_ok=True)
+    resumen_path = os.path.join(fp_folder, f"{base_name}_HV_summary.txt")
+    with open(resumen_path, "w") as resumen_file:
+        resumen_file.write(f"{ref_point[0]} {ref_point[1]}\n")
+        for res in resultados:
+            i = res["i"]
+            if res["aeds_file"] is None:
+                hv = 0.0
+                resumen_file.write(f"GEN{i} 0.0\n")
+            elif "canonica" in res:
+                aed_files.append(res["aeds_file"])
+                hv = hv_results[res["canonica"] - 1]
+                resumen_file.write(f"GEN{i} {hv:.4f}\n")
+            else:
+                aed_files.append(res["aeds_file"])
+                hv = hv_calc.calcular(res["coords_hv"])
+                print(f"Hipervolumen calculado para generación {i}: {hv}")
+                resumen_file.write(f"GEN{i} {hv:.4f}\n")
+            hv_results.append(hv)
+            if progreso is not None:
+                progreso("hv", {"i": i, "hv": hv})
+        if etiqueta:
+            resumen_file.write(f"{etiqueta}\n")
+        resumen_file.write("#\n")
+
+    return aed_files, hv_results
+
+
+def _firma(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def instantanea_pof(patron):
+    """{ruta: (mtime_ns, size)} de los POF ya existentes, para distinguirlos de los nuevos."""
+    return {f: _firma(f) for f in glob.glob(patron)}
+
+
+def vigilar_generaciones(patron, proceso, previos, cancelar=None, intervalo=0.25, latido=False):
+    """
+    Generador: entrega, en orden de generación, los archivos POF que MOEAD va
+    terminando mientras 'proceso' sigue vivo. El archivo GEN_n se da por
+    completo cuando aparece uno posterior o cuando el proceso terminó.
+    previos: instantanea_pof() tomada antes de lanzar el proceso (restos de corridas anteriores).
+    latido: si es True entrega None en cada vuelta sin archivos nuevos (procesar_en_vivo
+            aprovecha para entregar lo que terminó mientras tanto).
+    """
+    entregados = set()
+    while True:
+        termino = proceso.poll() is not None
+        nuevos = sorted((f for f in glob.glob(patron) if previos.get(f) != _firma(f)),
+                        key=gen_number_from_path)
+        for f in nuevos:
+            if f in entregados:
+                continue
+            if not termino and f == nuevos[-1]:
+                break  # puede estar escribiéndose todavía
+            entregados.add(f)
+            yield f
+        if termino or (cancelar is not None and cancelar.is_set()):
+            return
+        if latido:
+            yield None
+        time.sleep(intervalo)
@@ -0,0 +1,370 @@
+"""
+Reducción exacta de instancias DRP antes de correr MOEAD.
+
+En la evaluación de MOEAD (TestInstance.cpp) todo nodo es un sitio candidato
+y todo nodo con prob_ohca > 0 es demanda, cubierta si algún sitio elegido está
+a distancia <= R (R entero, como lo lee Reader_DRP). Sin cambiar el frente de
+Pareto alcanzable se puede:
+
+  - Quitar sitios dominados: un sitio nuevo (flag 0) cuya demanda cubierta está
+    contenida en la de otro sitio. Cambiarlo por el que lo domina nunca baja la
+    cobertura ni sube el costo (todo sitio nuevo cuesta lo mismo y volver a
+    usar un preinstalado cuesta menos). Con coberturas iguales se queda el
+    preinstalado o, si no hay, el de menor ID. Los preinstalados (flag 1) no se
+    tocan: de ellos depende el costo de reubicación.
+  - Agregar demanda: nodos cuyo conjunto de sitios que los cubren (entre los
+    que quedan) es el mismo se juntan en uno solo sumando prob_ohca.
+
+Un nodo sale del .dat sólo si su sitio es dominado y su demanda (si tiene) se
+puede pasar a un nodo que queda con el mismo conjunto de cubridores; si no,
+se queda. Los IDs de la instancia reducida son 1..N en el orden original y el
+mapa <reducida>.dat.red.json guarda el ID original de cada uno: /load y /run
+escriben los aeds/ con los IDs de la original, y /map, /map/imagen y /map_json
+los resuelven contra la original (ruta_original). MOEAD se corre con
+num_vars = N de la reducida.
+
+Después de escribirla se verifica (verificar) evaluando soluciones al azar como
+lo hace MOEAD (DRP_Evaluate_v2) sobre los dos .dat: una solución de la reducida
+pasada a IDs de la original tiene los mismos objetivos en las dos, y cambiar en
+una solución de la original cada sitio quitado por su reemplazo no la empeora.
+
+Uso:
+    python reduccion.py "INSTANCES/alcaldia_iztapalapa.dat" [-o INSTANCES/salida.dat] [--verificar 200]
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import numpy as np
+from scipy import sparse
+
+from cobertura import construir_csr
+from instancias import RE_FLOAT, parsear_dat
+
+SUFIJO_MAPA = ".red.json"
+SUFIJO_REDUCIDA = "_red"
+VERSION = 1
+
+RE_PARAM = {k: re.compile(r'param\s+' + k + r'\s*:=\s*(' + RE_FLOAT + r')') for k in ("P", "R", "c1", "c2")}
+
+
+def ruta_mapa(instancia_path):
+    return instancia_path + SUFIJO_MAPA
+
+
+def leer_parametros(instancia_path):
+    """{'P', 'R', 'c1', 'c2'} como texto, tal como están en el .dat."""
+    with open(instancia_path, 'r', encoding='utf-8', errors='ignore') as f:
+        text = f.read()
+    params = {}
+    for k, patron in RE_PARAM.items():
+        m = patron.search(text)
+        if m is None:
+            raise ValueError(f"Falta 'param {k}' en {instancia_path}")
+        params[k] = m.group(1)
+    return params
+
+
+def matriz_cobertura(xy, prob, radio):
+    """CSR sitio (todos los nodos) x demanda (nodos con prob > 0), con R truncado como en MOEAD."""
+    dem = np.flatnonzero(prob > 0)
+    indptr, indices = construir_csr(xy, xy[dem], int(float(radio)))
+    datos = np.ones(len(indices), dtype=np.int32)
+    return sparse.csr_matrix((datos, indices, indptr), shape=(len(xy), len(dem))), dem
+
+
+def sitios_dominados(M, flag, bloque=1024):
+    """
+    dominador[i] = sitio que domina a i (-1 si no es dominado). Sólo se marcan sitios flag 0.
+    Se compara por bloques de filas: solapes = M[bloque] @ M.T, y a es dominado por b si
+    solape(a, b) = |a| y b cubre más, o cubre lo mismo con prioridad (preinstalado o ID menor).
+    """
+    n = M.shape[0]
+    grado = np.diff(M.indptr)
+    dominador = np.full(n, -1, dtype=np.int64)
+    nuevos = np.flatnonzero(flag == 0)
+    MT = M.T.tocsr()
+    for ini in range(0, len(nuevos), bloque):
+        filas = nuevos[ini:ini + bloque]
+        solape = (M[filas] @ MT).tocoo()
+        a = filas[solape.row]
+        b = solape.col
+        ok = ((solape.data == grado[a]) & (b != a)
+              & ((grado[b] > grado[a]) | (flag[b] == 1) | (b < a)))
+        # el primero de cada fila alcanza; a[ok] va por filas así que np.unique da el primero
+        sel, pos = np.unique(a[ok], return_index=True)
+        dominador[sel] = b[ok][pos]
+
+    # sitios que no cubren demanda: cualquier otro sitio los domina (salvo el primero si todos son vacíos)
+    vacios = nuevos[grado[nuevos] == 0]
+    if len(vacios) and n > 1:
+        mejor = int(np.argmax(grado)) if grado.max() > 0 else None
+        for a in vacios.tolist():
+            if mejor is not None:
+                dominador[a] = mejor
+            else:
+                otros = np.flatnonzero((flag == 1) | (np.arange(n) < a))
+                if len(otros):
+                    dominador[a] = otros[0]
+    return dominador
+
+
+def grupos_demanda(M, quedan):
+    """Grupo de cada columna de demanda según el conjunto de sitios que quedan y la cubren."""
+    cubridores = M[quedan].tocsc()
+    cubridores.sort_indices()
+    claves = {}
+    grupo = np.empty(M.shape[1], dtype=np.int64)
+    ptr, ind = cubridores.indptr, cubridores.indices
+    for j in range(M.shape[1]):
+        grupo[j] = claves.setdefault(ind[ptr[j]:ptr[j + 1]].tobytes(), len(claves))
+    return grupo, len(claves)
+
+
+def reducir(ids, xy, flag, prob, radio):
+    """
+    Devuelve (quedan, prob_nueva, dominador):
+      quedan: índices (orden original) de los nodos de la instancia reducida,
+      prob_nueva: prob_ohca de esos nodos tras agregar la demanda,
+      dominador: {índice quitado: índice que queda y lo reemplaza como sitio}.
+    """
+    n = len(ids)
+    M, dem = matriz_cobertura(xy, prob, radio)
+    dominador = sitios_dominados(M, flag)
+    quitar = dominador >= 0
+
+    # punto fijo: dejar un sitio agrega un cubridor y puede separar grupos de demanda
+    while True:
+        quedan = np.flatnonzero(~quitar)
+        grupo, n_grupos = grupos_demanda(M, quedan)
+        tiene_anfitrion = np.zeros(n_grupos, dtype=bool)
+        tiene_anfitrion[grupo[~quitar[dem]]] = True
+        forzados = dem[quitar[dem] & ~tiene_anfitrion[grupo]]
+        if not len(forzados):
+            break
+        quitar[forzados] = False
+
+    # anfitrión de cada grupo: el primer nodo que queda; recibe la suma del grupo
+    anfitrion = np.full(n_grupos, n, dtype=np.int64)
+    np.minimum.at(anfitrion, grupo[~quitar[dem]], dem[~quitar[dem]])
+    prob_nueva = np.where(prob > 0, 0.0, prob)
+    np.add.at(prob_nueva, anfitrion[grupo], prob[dem])
+
+    # cada quitado apunta a un sitio que queda (las cadenas de dominancia terminan)
+    reemplazo = {}
+    for i in np.flatnonzero(quitar).tolist():
+        j = int(dominador[i])
+        while quitar[j]:
+            j = int(dominador[j])
+        reemplazo[i] = j
+    return quedan, prob_nueva[quedan], reemplazo
+
+
+def ruta_reducida(instancia_path):
+    base, ext = os.path.splitext(instancia_path)
+    return f"{base}{SUFIJO_REDUCIDA}{ext or '.dat'}"
+
+
+def escribir_reducida(instancia_path, destino=None):
+    """Escribe la instancia reducida y su mapa de IDs. Devuelve (destino, resumen)."""
+    destino = destino or ruta_reducida(instancia_path)
+    params = leer_parametros(instancia_path)
+    ids, xy, flag, prob, radio = parsear_dat(instancia_path)
+    quedan, prob_red, reemplazo = reducir(ids, xy, flag, prob, float(params["R"]))
+
+    nombre = os.path.basename(destino)
+    lineas = [
+        "/* CONJUNTOS */",
+        f"set N:= {len(quedan)} ;",
+        "",
+        "/* PARAMETROS */",
+        f"param P:= {params['P']} ;",
+        f"param R:= {params['R']} ;",
+        f"param c1:= {params['c1']} ;",
+        f"param c2:= {params['c2']} ;",
+        f'param nombre_instancia := "{nombre}" ;',
+        "",
+        "param : coordx coordy flag prob_ohca:=",
+    ]
+    lineas += [f"{k} {x:.6f} {y:.6f} {f} {p:.6f}"
+               for k, (x, y, f, p) in enumerate(zip(xy[quedan, 0].tolist(), xy[quedan, 1].tolist(),
+                                                    flag[quedan].tolist(), prob_red.tolist()), start=1)]
+    lineas.append(";")
+
+    ids_originales = ids[quedan].tolist()
+    mapa = {
+        "version": VERSION,
+        "original": os.path.basename(instancia_path),
+        "ids": ids_originales,  # ids[k - 1] = ID original del nodo k de la reducida
+        "reemplazos": {str(int(ids[i])): int(ids[j]) for i, j in reemplazo.items()},
+    }
+    _escribir_atomico(destino, "\n".join(lineas))
+    _escribir_atomico(ruta_mapa(destino), json.dumps(mapa))
+
+    resumen = {
+        "nodos": (int(len(ids)), int(len(quedan))),
+        "demanda": (int((prob > 0).sum()), int((prob_red > 0).sum())),
+        "prob_total": (float(prob[prob > 0].sum()), float(prob_red[prob_red > 0].sum())),
+    }
+    return destino, resumen
+
+
+def _escribir_atomico(path, texto):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(tmp, path)
+
+
+def cargar_mapa(instancia_path):
+    """Mapa de la instancia reducida ({'original', 'ids', 'firma', ...}) o None si no es una reducida."""
+    try:
+        with open(ruta_mapa(instancia_path), "rb") as f:
+            datos = f.read()
+        mapa = json.loads(datos)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[reduccion] No se pudo leer el mapa de {instancia_path}: {e}")
+        return None
+    mapa["ids"] = np.asarray(mapa["ids"], dtype=np.int64)
+    mapa["firma"] = hashlib.blake2b(datos, digest_size=8).hexdigest()
+    return mapa
+
+
+def etiqueta_ids(mapa):
+    """
+    Línea que se deja en <base>_HV_summary.txt cuando los aeds/ se escribieron con los
+    IDs de la original: /load la busca antes de devolver los aeds/ sin recalcular.
+    """
+    return f"# ids {mapa['original']} {mapa['firma']}"
+
+
+def ruta_original(instancia_path):
+    """
+    Instancia en la que se leen los IDs de los resultados: los aeds/ de una reducida
+    (de /load y de /run) se escriben con los IDs de la original.
+    """
+    mapa = cargar_mapa(instancia_path)
+    return os.path.join(os.path.dirname(instancia_path), mapa["original"]) if mapa else instancia_path
+
+
+def traducir_ids(ids_originales, ids):
+    """IDs de la instancia reducida (1-based) -> IDs de la original."""
+    return ids_originales[np.asarray(ids, dtype=np.int64) - 1].tolist() if len(ids) else []
+
+
+def _instancia_para_evaluar(instancia_path):
+    params = leer_parametros(instancia_path)
+    ids, xy, flag, prob, _ = parsear_dat(instancia_path)
+    pos = {int(k): j for j, k in enumerate(ids.tolist())}
+    # R entero como en Reader_DRP (input >> int)
+    return pos, xy, flag, prob, int(float(params["R"])), float(params["c1"]), float(params["c2"])
+
+
+def evaluar(inst, ids_sel):
+    """
+    (cobertura, costo) de la solución ids_sel (IDs de nodo) con las mismas cuentas que
+    DRP_Evaluate_v2 (TestInstance.cpp); inst sale de _instancia_para_evaluar.
+    """
+    pos, xy, flag, prob, radio, c1, c2 = inst
+    x = np.zeros(len(xy), dtype=bool)
+    x[[pos[int(k)] for k in ids_sel]] = True
+
+    removidos = int(((flag == 1) & ~x).sum())
+    nuevos = int(((flag == 0) & x).sum())
+    reubicaciones = min(removidos, nuevos)
+    costo = 0.0
+    costo += reubicaciones * c2
+    costo += (nuevos - reubicaciones) * c1
+
+    dem = prob > 0
+    if not x.any():
+        return 0.0, costo
+    dx = xy[dem, 0][:, None] - xy[x, 0][None, :]
+    dy = xy[dem, 1][:, None] - xy[x, 1][None, :]
+    cubierto = (np.sqrt(dx * dx + dy * dy) <= radio).any(axis=1)
+    return float(prob[dem][cubierto].sum()), costo
+
+
+def verificar(instancia_path, reducida_path, n=200, semilla=0):
+    """
+    Compara la reducida contra la original con n soluciones al azar de cada tipo:
+      iguales: soluciones de la reducida, evaluadas en la reducida y (con IDs originales)
+               en la original; deben dar la misma cobertura y el mismo costo.
+      dominadas: soluciones de la original (también con sitios quitados); su imagen
+                 (cada quitado -> su reemplazo) evaluada en la reducida no debe tener
+                 menos cobertura ni más costo.
+    Devuelve {'iguales': fallas, 'dominadas': fallas, 'n': n}.
+    """
+    mapa = cargar_mapa(reducida_path)
+    if mapa is None:
+        raise ValueError(f"{reducida_path} no tiene mapa {SUFIJO_MAPA}")
+    orig = _instancia_para_evaluar(instancia_path)
+    red = _instancia_para_evaluar(reducida_path)
+    ids_orig = np.asarray(sorted(orig[0]), dtype=np.int64)
+    n_red = len(mapa["ids"])
+    a_reducida = {int(k): j for j, k in enumerate(mapa["ids"].tolist(), start=1)}
+    reemplazos = {int(k): v for k, v in mapa["reemplazos"].items()}
+    # la prob total de la reducida es la misma sumada en otro orden
+    tol = 1e-9 * max(1.0, float(orig[3][orig[3] > 0].sum()))
+
+    rng = np.random.default_rng(semilla)
+    pre_red = [j for j in range(1, n_red + 1) if red[2][j - 1] == 1]
+
+    def al_azar(universo, preinstalados):
+        k = int(rng.integers(0, min(len(universo), 40) + 1))
+        sel = set(rng.choice(universo, size=k, replace=False).tolist()) if k else set()
+        if preinstalados and rng.random() < 0.5:  # como las soluciones iniciales: parte de los preinstalados
+            sel |= set(rng.choice(preinstalados, size=int(rng.integers(0, len(preinstalados) + 1)),
+                                  replace=False).tolist())
+        return sorted(int(v) for v in sel)
+
+    fallas_iguales = fallas_dominadas = 0
+    for _ in range(n):
+        sel = al_azar(np.arange(1, n_red + 1), pre_red)
+        cov_r, costo_r = evaluar(red, sel)
+        cov_o, costo_o = evaluar(orig, traducir_ids(mapa["ids"], sel))
+        if abs(cov_r - cov_o) > tol or costo_r != costo_o:
+            fallas_iguales += 1
+            print(f"[reduccion] distinta: {sel} reducida=({cov_r}, {costo_r}) original=({cov_o}, {costo_o})")
+
+    pre_orig = [int(k) for k in ids_orig.tolist() if orig[2][orig[0][k]] == 1]
+    for _ in range(n):
+        sel = al_azar(ids_orig, pre_orig)
+        imagen = sorted({a_reducida[reemplazos.get(k, k)] for k in sel})
+        cov_o, costo_o = evaluar(orig, sel)
+        cov_r, costo_r = evaluar(red, imagen)
+        if cov_r < cov_o - tol or costo_r > costo_o:
+            fallas_dominadas += 1
+            print(f"[reduccion] empeora: {sel} original=({cov_o}, {costo_o}) reducida=({cov_r}, {costo_r})")
+    return {"iguales": fallas_iguales, "dominadas": fallas_dominadas, "n": n}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Reducción exacta de una instancia .dat (sitios dominados + demanda agregada).")
+    ap.add_argument("instancia")
+    ap.add_argument("-o", "--salida", default=None, help="por defecto <instancia>_red.dat")
+    ap.add_argument("--verificar", type=int, default=200, metavar="N",
+                    help="soluciones al azar para verificar la reducida (0: no verificar)")
+    args = ap.parse_args(argv)
+
+    destino, r = escribir_reducida(args.instancia, args.salida)
+    print(f"[reduccion] {args.instancia} -> {destino}")
+    print(f"[reduccion] nodos: {r['nodos'][0]} -> {r['nodos'][1]} (num_vars={r['nodos'][1]})")
+    print(f"[reduccion] nodos con demanda: {r['demanda'][0]} -> {r['demanda'][1]}")
+    print(f"[reduccion] prob_ohca total: {r['prob_total'][0]:.6f} -> {r['prob_total'][1]:.6f}")
+
+    if args.verificar > 0:
+        v = verificar(args.instancia, destino, args.verificar)
+        print(f"[reduccion] verificación ({v['n']} + {v['n']} soluciones): "
+              f"{v['iguales']} con objetivos distintos, {v['dominadas']} empeoradas por la reducción")
+        if v["iguales"] or v["dominadas"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
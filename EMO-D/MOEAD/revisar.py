@@ -1,21 +1,32 @@
 import glob
 import hashlib
+import json
 import os
 import re
+import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # --- CONFIGURACIÓN ---
 # Carpeta donde están los archivos
 folder = "SAVING/MOEAD/POF"
 # Patrón para encontrar todos los archivos de interés
 pattern = os.path.join(folder, "POF_*_GEN*.dat")
+# Hilos para hashear (hashlib libera el GIL con bloques grandes)
+HILOS = min(32, (os.cpu_count() or 1) * 2)
+BLOQUE = 1 << 20
 
 # --- FUNCIONES AUXILIARES ---
 
 def file_hash(path):
-    """Calcula el hash MD5 del contenido de un archivo."""
+    """(tamaño, blake2b de 128 bits) del contenido, leyendo el archivo por bloques una sola vez."""
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
     with open(path, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
+        for bloque in iter(lambda: f.read(BLOQUE), b""):
+            h.update(bloque)
+            size += len(bloque)
+    return (size, h.digest())
 
 def compactar_indices(indices):
     """Recibe una lista de índices y devuelve una cadena con rangos compactados.
@@ -45,90 +56,147 @@ def get_gen_number(filepath):
         return int(match.group(1))
     return 0 # Devuelve 0 si no encuentra el patrón, para ordenar al principio
 
-# --- SCRIPT PRINCIPAL ---
-
-# 1. Encontrar todos los archivos que coinciden con el patrón
-all_files = glob.glob(pattern)
+def _firma(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
 
-if not all_files:
-    print("⚠️ No se encontraron archivos con el patrón especificado.")
-    exit()
-
-print(f"✅ Se encontraron {len(all_files)} archivos en total. Agrupando por instancia...")
+class DeduplicadorGeneraciones:
+    """
+    Asigna a cada generación su generación canónica: la primera con contenido idéntico.
+    Cada archivo se lee una sola vez: con (tamaño, blake2b de 128 bits) una colisión
+    entre generaciones distintas es despreciable, así que no se compara byte a byte.
+    """
 
-# 2. Agrupar archivos por su nombre de instancia
-instance_files = defaultdict(list)
-for filepath in all_files:
-    # Extraemos el nombre de la instancia (ej: "POF_100-3.dat")
-    # del nombre completo del archivo (ej: "POF_100-3.dat_GEN_1.dat")
-    filename = os.path.basename(filepath)
-    instance_name = filename.split('_GEN_')[0]
-    instance_files[instance_name].append(filepath)
+    def __init__(self):
+        self._por_hash = {}  # hash -> gen canónica
 
-if not instance_files:
-    print("🤷 No se pudo agrupar ningún archivo por instancia. Revisa los nombres de archivo.")
-    exit()
+    def agregar(self, gen, path, h=None):
+        """Registra la generación (en orden) y devuelve su generación canónica."""
+        h = file_hash(path) if h is None else h
+        return self._por_hash.setdefault(h, gen)
 
-# 3. Analizar cada grupo de instancia por separado
-for instance_name, files in instance_files.items():
-    print("\n" + "="*50)
-    print(f"📊 Analizando Instancia: {instance_name}")
-    print("="*50)
+def hashes_en_paralelo(files, hilos=HILOS):
+    """Hash de cada archivo (una lectura por archivo), en el orden de 'files'."""
+    if len(files) <= 1:
+        return [file_hash(f) for f in files]
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        return list(pool.map(file_hash, files))
 
-    # Ordenar los archivos de la instancia actual por su número de generación
+def mapa_dedup(files, hilos=HILOS):
+    """{generación: generación canónica} para los archivos POF de una instancia."""
     files = sorted(files, key=get_gen_number)
-    
-    # Extraer los números de generación para un etiquetado correcto
-    gen_numbers = [get_gen_number(f) for f in files]
-
-    print(f"🔍 Se encontraron {len(files)} generaciones para esta instancia.\n")
-
-    # --- Análisis 1: Grupos de generaciones consecutivas con el mismo contenido ---
-    prev_hash = None
-    start_gen = None
+    dedup = DeduplicadorGeneraciones()
+    return {get_gen_number(f): dedup.agregar(get_gen_number(f), f, h)
+            for f, h in zip(files, hashes_en_paralelo(files, hilos))}
+
+def ruta_mapa(instance_name, carpeta=folder):
+    """Mapa de una instancia: SAVING/MOEAD/POF/POF_<inst>_DEDUP.json"""
+    return os.path.join(carpeta, f"{instance_name}_DEDUP.json")
+
+def guardar_mapa(instance_name, files, mapa, carpeta=folder):
+    path = ruta_mapa(instance_name, carpeta)
+    datos = {
+        "instancia": instance_name,
+        "generaciones": {str(g): c for g, c in sorted(mapa.items())},
+        "firmas": {str(get_gen_number(f)): _firma(f) for f in files},
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(datos, fh)
+    os.replace(tmp, path)
+    return path
+
+def cargar_mapa(instancia, files, carpeta=folder):
+    """
+    Mapa de dedup de 'instancia' (p. ej. '100-3.dat') para los POF en 'files'.
+    Reutiliza el JSON si los archivos no cambiaron (mtime y tamaño); si no, lo recalcula y guarda.
+    """
+    instance_name = f"POF_{instancia}"
+    try:
+        with open(ruta_mapa(instance_name, carpeta)) as fh:
+            datos = json.load(fh)
+        firmas = {str(get_gen_number(f)): _firma(f) for f in files}
+        if datos.get("firmas") == firmas:
+            return {int(g): c for g, c in datos["generaciones"].items()}
+    except (OSError, ValueError, KeyError):
+        pass
+    mapa = mapa_dedup(files)
+    try:
+        guardar_mapa(instance_name, files, mapa, carpeta)
+    except OSError as e:
+        print(f"[revisar] No se pudo guardar el mapa de {instancia}: {e}")
+    return mapa
+
+def grupos_consecutivos(gens, mapa):
+    """[(inicio, fin)] de generaciones consecutivas con el mismo contenido."""
     groups = []
-
-    for i, file in enumerate(files):
-        current_hash = file_hash(file)
-        current_gen = gen_numbers[i]
-
-        if prev_hash is None: # Primera iteración
-            prev_hash = current_hash
-            start_gen = current_gen
-        elif current_hash != prev_hash:
-            # Fin del grupo anterior. Lo guardamos.
-            end_gen = gen_numbers[i-1]
-            groups.append((start_gen, end_gen))
-            # Empezamos un nuevo grupo
-            start_gen = current_gen
-            prev_hash = current_hash
-
-    # Guardar el último grupo
-    if start_gen is not None:
-        groups.append((start_gen, gen_numbers[-1]))
-
-    print("📌 Grupos de generaciones consecutivas iguales:")
-    for inicio, fin in groups:
-        if inicio == fin:
-            print(f"Generación: {inicio}")
+    for g in gens:
+        if groups and mapa[g] == mapa[groups[-1][1]]:
+            groups[-1] = (groups[-1][0], g)
         else:
-            print(f"Generaciones: {inicio} - {fin} (son idénticas)")
-
-    # --- Análisis 2: Todos los archivos iguales, sin importar el orden ---
-    hash_to_gens = defaultdict(list)
-    for i, file in enumerate(files):
-        h = file_hash(file)
-        gen_num = gen_numbers[i]
-        hash_to_gens[h].append(gen_num)
-
-    print("\n📌 Grupos de generaciones idénticas (sin importar el orden):")
-    found_duplicates = False
-    for h, indices in hash_to_gens.items():
-        if len(indices) > 1:
-            found_duplicates = True
-            print(f"  - Grupo de {len(indices)} generaciones idénticas: {compactar_indices(indices)}")
-    
-    if not found_duplicates:
-        print("  - No se encontraron generaciones duplicadas en esta instancia.")
-
-print("\n\n✨ Análisis completado.")
\ No newline at end of file
+            groups.append((g, g))
+    return groups
+
+# --- SCRIPT PRINCIPAL ---
+
+if __name__ == "__main__":
+    # 1. Encontrar todos los archivos que coinciden con el patrón
+    all_files = glob.glob(pattern)
+
+    if not all_files:
+        print("⚠️ No se encontraron archivos con el patrón especificado.")
+        sys.exit()
+
+    print(f"✅ Se encontraron {len(all_files)} archivos en total. Agrupando por instancia...")
+
+    # 2. Agrupar archivos por su nombre de instancia
+    instance_files = defaultdict(list)
+    for filepath in all_files:
+        # Extraemos el nombre de la instancia (ej: "POF_100-3.dat")
+        # del nombre completo del archivo (ej: "POF_100-3.dat_GEN_1.dat")
+        filename = os.path.basename(filepath)
+        instance_name = filename.split('_GEN_')[0]
+        instance_files[instance_name].append(filepath)
+
+    if not instance_files:
+        print("🤷 No se pudo agrupar ningún archivo por instancia. Revisa los nombres de archivo.")
+        sys.exit()
+
+    # 3. Analizar cada grupo de instancia por separado (cada archivo se hashea una sola vez)
+    for instance_name, files in instance_files.items():
+        print("\n" + "="*50)
+        print(f"📊 Analizando Instancia: {instance_name}")
+        print("="*50)
+
+        files = sorted(files, key=get_gen_number)
+        gen_numbers = [get_gen_number(f) for f in files]
+        mapa = mapa_dedup(files)
+
+        print(f"🔍 Se encontraron {len(files)} generaciones para esta instancia.\n")
+
+        # --- Análisis 1: Grupos de generaciones consecutivas con el mismo contenido ---
+        print("📌 Grupos de generaciones consecutivas iguales:")
+        for inicio, fin in grupos_consecutivos(gen_numbers, mapa):
+            if inicio == fin:
+                print(f"Generación: {inicio}")
+            else:
+                print(f"Generaciones: {inicio} - {fin} (son idénticas)")
+
+        # --- Análisis 2: Todos los archivos iguales, sin importar el orden ---
+        canon_to_gens = defaultdict(list)
+        for g in gen_numbers:
+            canon_to_gens[mapa[g]].append(g)
+
+        print("\n📌 Grupos de generaciones idénticas (sin importar el orden):")
+        found_duplicates = False
+        for indices in canon_to_gens.values():
+            if len(indices) > 1:
+                found_duplicates = True
+                print(f"  - Grupo de {len(indices)} generaciones idénticas: {compactar_indices(indices)}")
+
+        if not found_duplicates:
+            print("  - No se encontraron generaciones duplicadas en esta instancia.")
+
+        print(f"\n💾 Mapa de deduplicación: {guardar_mapa(instance_name, files, mapa)}")
+
+    print("\n\n✨ Análisis completado.")
@@ -1,24 +1,30 @@
 import os
-from flask import Flask, request, jsonify, send_from_directory, send_file, abort, url_for
+from flask import (Flask, Response, request, jsonify, send_from_directory, send_file, abort, url_for,
+                   stream_with_context)
 import subprocess, glob
-import matplotlib.pyplot as plt
-import io
-import re
 import base64
+import gzip
+import hashlib
 import json
+import threading
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
 
-def gen_number_from_path(path: str) -> int:
-    """
-    Extrae el número de generación desde nombres tipo:
-      ...GEN_36.dat, ...GEN36.dat, ..._GEN_36.txt, etc.
-    """
-    base = os.path.basename(path)
-    m = re.search(r'GEN[_-]?(\d+)', base)
-    return int(m.group(1)) if m else 10**9  # grande si no matchea
+from archivo_corrida import archivo_al_dia
+from cobertura import obtener_motor_cobertura
+from frentes import gen_number_from_path
+from instancias import cargar_instancia
+from mapas import (FORMATOS as FORMATOS_MAPA, RenderizadorMapas, capas_a_listas, capas_mapa,
+                   empaquetar_binario, etag_mapa, hash_ids)
+from pareto import indices_no_dominados
+from pipeline import ejecutar_pipeline
+from reduccion import cargar_mapa as cargar_mapa_reduccion, etiqueta_ids, ruta_original
+from revisar import cargar_mapa as cargar_mapa_dedup
+from trabajos import GestorTrabajos
 
 
 app = Flask(__name__, static_folder="static", static_url_path="/static")
+renderizador_mapas = RenderizadorMapas()
 
 @app.route("/")
 def main():
@@ -28,91 +34,12 @@ def parse_instance_name(filename):
     return os.path.splitext(os.path.basename(filename))[0]
 
 def get_non_dominated_idx(points_xy):
-    """Devuelve índices de no-dominados para lista [(x,y), ...]."""
-    dominated = set()
-    n = len(points_xy)
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                if (points_xy[j][0] <= points_xy[i][0] and points_xy[j][1] <= points_xy[i][1] and
-                    (points_xy[j][0] < points_xy[i][0] or points_xy[j][1] < points_xy[i][1])):
-                    dominated.add(i)
-                    break
-    return [i for i in range(n) if i not in dominated]
-
-
-def save_front_to_file(points, filepath):
-    """
-    points: lista [(x,y)] ya filtrada (Pareto) y sin duplicados.
-    Ordena por f1 asc, luego f2 asc. Escribe con alta precisión y SIN '#'.
-    """
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    ordered = sorted(points, key=lambda p: (p[0], p[1]))  # f1 asc, f2 asc
-    with open(filepath, "w") as f:
-        for x, y in ordered:
-            f.write(f"{x:.10f} {y:.10f}\n")
-
-def calcular_referencia_global(files):
-    all_points = []
-    for file in files:
-        with open(file) as f:
-            lines = [line for line in f if line.strip() and not line.startswith("#")]
-            pts = [list(map(float, line.split()[:2])) for line in lines]
-            all_points.extend(pts)
-    max_x = max(p[0] for p in all_points)
-    max_y = max(p[1] for p in all_points)
-    ref_x = max_x + abs(max_x) * 0.001
-    ref_y = max_y + abs(max_y) * 0.001
-    if ref_x == 0:
-        ref_x = 0.1
-    print(f"Punto de referencia global: ({ref_x}, {ref_y})")
-    return (ref_x, ref_y)
-
-def parse_line_with_ids(line):
-    """
-    Soporta:
-      - 'x y - IDs instalados: 2 3 5'
-      - 'x y 2 3 5'
-      - 'x y P 2 3 5 | 98.00' o 'x y D 2 3 5 | 75.00' (aeds existentes)
-    Retorna (x, y, ids:list[int], flag:str|None, coverage:float|None)
-    """
-    s = line.strip()
-    if not s or s.startswith("#"):
-        return None
+    """Devuelve índices de no-dominados para lista [(x,y), ...] (O(n log n), ver pareto.py)."""
+    return indices_no_dominados(points_xy)
 
-    coverage = None
-    if "|" in s:
-        left, right = s.split("|", 1)
-        s = left.strip()
-        try:
-            coverage = float(right.strip().split()[0])
-        except Exception:
-            coverage = None
-
-    if "- IDs instalados:" in s:
-        left, right = s.split("- IDs instalados:", 1)
-        nums = left.strip().split()
-        x, y = float(nums[0]), float(nums[1])
-        ids = [int(tok) for tok in right.strip().split() if tok.isdigit()]
-        return (x, y, ids, None, coverage)
-
-    toks = s.split()
-    x, y = float(toks[0]), float(toks[1])
-    flag = None
-    start = 2
-    if len(toks) >= 3 and not toks[2].replace('.', '', 1).isdigit():
-        if toks[2] in ("P", "D"):
-            flag = toks[2]
-            start = 3
-    ids = []
-    for tok in toks[start:]:
-        try:
-            ids.append(int(tok))
-        except ValueError:
-            pass
-    return (x, y, ids, flag, coverage)
 
 def calculate_hv(filepath, ref_point, gen_number=None):
+    """HV con el binario externo hv-1.3. /run y /load usan hipervolumen.py; esto queda como referencia."""
     cmd = ["../../material/hv-1.3-src/hv", "-r", f"{ref_point[0]} {ref_point[1]}", filepath]
     print("Ejecutando:", " ".join(cmd))
     result = subprocess.run(cmd, capture_output=True, text=True)
@@ -128,7 +55,7 @@ def calculate_hv(filepath, ref_point, gen_number=None):
         return 0.0
 
 # --------- helpers para instancias / cobertura ----------
-RE_FLOAT = r'[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?'
+# El parseo del .dat y su caché (memoria LRU + sidecar .npz) viven en instancias.py
 
 def leer_R_desde_dat(instancia_path: str):
     """
@@ -136,44 +63,18 @@ def leer_R_desde_dat(instancia_path: str):
     Devuelve float o None si no se encontró.
     """
     try:
-        with open(instancia_path, 'r', encoding='utf-8', errors='ignore') as f:
-            text = f.read()
-        m = re.search(r'param\s+R\s*:=\s*(' + RE_FLOAT + r')', text)
-        if m:
-            return float(m.group(1))
+        return cargar_instancia(instancia_path).radio
     except Exception:
-        pass
-    return None
+        return None
 
 
 def cargar_instancia_coords_y_demanda(instancia_path):
     """Devuelve (nodes, coords_por_id, demanda, preinstalados, radio)
-       Lee radio R desde INSTANCES/<archivo>.dat.meta.json si existe.
+       desde la caché de instancias parseadas (ver instancias.py).
     """
-    base_name = os.path.splitext(os.path.basename(instancia_path))[0]
-    # 1) R desde .dat
-    radio = leer_R_desde_dat(instancia_path)
-    print(f"[cargar_instancia] Radio leído desde .dat: {radio}")
-
-    # --- Parseo de nodos/coords/preinstalados/demanda ---
-    nodes, coords = [], {}
-    with open(instancia_path, 'r') as f:
-        for line in f:
-            if re.match(r'^\d+', line):
-                parts = line.split()
-                if len(parts) >= 5:
-                    try:
-                        idx = int(parts[0])
-                        x, y = float(parts[1]), float(parts[2])
-                        flag = int(parts[3])    # 0 demanda, 1 preinstalado
-                        prob = float(parts[4])
-                        nodes.append((idx, x, y, flag, prob))
-                        coords[idx] = (x, y)
-                    except ValueError:
-                        continue
-    demanda = [(x, y, p) for (_, x, y, f, p) in nodes if f == 0]
-    preinstalados = [(x, y) for (_, x, y, f, _) in nodes if f == 1]
-    return nodes, coords, demanda, preinstalados, radio
+    inst = cargar_instancia(instancia_path)
+    print(f"[cargar_instancia] Radio leído desde .dat: {inst.radio}")
+    return inst.como_tupla()
 
 
 def cobertura_por_ids(ids_instalados, demanda, preinstalados, radio):
@@ -198,129 +99,79 @@ def cobertura_por_ids(ids_instalados, demanda, preinstalados, radio):
     porc = (prob_cubierta / total_prob * 100.0) if total_prob > 0 else 0.0
     return nodos_cubiertos, prob_cubierta, porc, total_prob, len(demanda)
 
-def save_aeds_with_flags_and_coverage(entries_all, filepath):
-    """
-    entries_all: [(x,y, ids:list[int], is_pareto:bool, coverage:float|None)]
-    Regla de desempatado por (x,y):
-      1) P > D
-      2) IDs lexicográficamente menores
-      3) primero que llegó
-    Orden de salida final: f1 asc, luego f2 asc.
-    Devuelve SOLO coordenadas Pareto (ordenadas igual) para HV.
-    """
-    best = {}  # key=(x,y) -> (x,y,ids,is_par,cov)
-    for x, y, ids, is_par, cov in entries_all:
-        key = (x, y)
-        cand = (x, y, list(ids or []), bool(is_par),
-                float(cov) if cov is not None else None)
-        if key not in best:
-            best[key] = cand
-        else:
-            bx, by, b_ids, b_par, b_cov = best[key]
-            # 1) Pareto primero
-            if (not b_par) and is_par:
-                best[key] = cand
-            elif (b_par == is_par):
-                # 2) IDs lexicográficos menores
-                if tuple(ids or []) < tuple(b_ids or []):
-                    best[key] = cand
-                # 3) else: se queda el existente
-
-    # ordenar por f1 asc, f2 asc
-    ordered = sorted(best.values(), key=lambda p: (p[0], p[1]))
 
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, "w") as f:
-        f.write("#\n")
-        for x, y, ids, is_par, cov in ordered:
-            flag = "P" if is_par else "D"
-            tail = (" " + " ".join(map(str, ids))) if ids else ""
-            cov_str = f" | {cov:.4f}" if cov is not None else ""
-            f.write(f"{x:.10f} {y:.10f} {flag}{tail}{cov_str}\n")
-        f.write("#\n")
-
-    # coords Pareto en el MISMO orden para el archivo de frente
-    return [(x, y) for (x, y, ids, is_par, cov) in ordered if is_par]
 
 
 
 
 # ------------------- /run -------------------
+gestor_trabajos = GestorTrabajos()
+
 @app.route("/run", methods=["POST"])
 def run():
-    instancia = request.json["instancia"]
-    semilla = request.json["semilla"]
-    num_var = request.json["num_var"]
-
-    full_path = os.path.join("INSTANCES", instancia)
-    subprocess.run(["./MOEAD", full_path, str(semilla), str(num_var)])
-
-    base_name = parse_instance_name(instancia)
-    raw_files = glob.glob(f"SAVING/MOEAD/POF/POF_{instancia}_GEN_*.dat")
-    #print("[/run] POF encontrados:", raw_files, flush=True)
-    raw_files = sorted(raw_files, key=gen_number_from_path)
-    #print("[/run] POF GEN ordenados:", [gen_number_from_path(p) for p in raw_files], flush=True)
-    hv_results = []
-
-    fp_folder = os.path.join("FrentesDePareto", base_name)
-    aeds_folder = os.path.join("aeds", base_name)
-    os.makedirs(fp_folder, exist_ok=True)
-    os.makedirs(aeds_folder, exist_ok=True)
-
-    # cargar instancia para cobertura
-    nodes, coords_by_id, demanda, preinst_coords, radio = cargar_instancia_coords_y_demanda(os.path.join("INSTANCES", instancia))
-
-    ref_point = calcular_referencia_global(raw_files)
-    resumen_path = os.path.join(fp_folder, f"{base_name}_HV_summary.txt")
-
-    aed_files = []
-    with open(resumen_path, "w") as resumen_file:
-        resumen_file.write(f"{ref_point[0]} {ref_point[1]}\n")
-        for i, file in enumerate(raw_files, start=1):
-            entries_raw = []
-            with open(file) as f:
-                for ln in f:
-                    parsed = parse_line_with_ids(ln)
-                    if parsed is not None:
-                        x, y, ids, _, _ = parsed
-                        entries_raw.append((x, y, ids))
-
-            if not entries_raw:
-                hv_results.append(0.0)
-                resumen_file.write(f"GEN{i} 0.0\n")
-                continue
-
-            # separar P/D
-            nd_idx = get_non_dominated_idx([(x, y) for (x, y, _) in entries_raw])
-            nd_set = set(nd_idx)
-            nd_entries  = [(x, y, ids, True)  for k, (x, y, ids) in enumerate(entries_raw) if k in nd_set]
-            dom_entries = [(x, y, ids, False) for k, (x, y, ids) in enumerate(entries_raw) if k not in nd_set]
-
-            # calcular cobertura para cada punto
-            entries_all = []
-            for (x, y, ids, is_par) in (nd_entries + dom_entries):
-                coords_inst = [coords_by_id[i] for i in ids if i in coords_by_id]
-                _, prob_cov, porc, _, _ = cobertura_por_ids(coords_inst, demanda, preinst_coords, radio)
-                entries_all.append((x, y, ids, is_par, porc))
-
-            aeds_file = os.path.join(aeds_folder, f"{base_name}_Ubicaciones_GEN{i}.dat")
-            coords_for_hv = save_aeds_with_flags_and_coverage(entries_all, aeds_file)
-            aed_files.append(aeds_file)
-
-            fp_file = os.path.join(fp_folder, f"{base_name}_GEN{i}.dat")
-            save_front_to_file(coords_for_hv, fp_file)
-
-            hv = calculate_hv(fp_file, ref_point, gen_number=i) or 0.0
-            hv_results.append(hv)
-            resumen_file.write(f"GEN{i} {hv:.4f}\n")
-        resumen_file.write("#\n")
-
-    """ print("Archivos AEDs que voy a devolver al front:")
-    for f in aed_files:
-        print(f, os.path.exists(f)) """
-
-
-    return jsonify({"files": aed_files, "hv": hv_results})
+    """Encola MOEAD + post-proceso y responde de inmediato con el id del trabajo."""
+    try:
+        instancia = request.json["instancia"]
+        semilla = int(request.json["semilla"])
+        num_var = int(request.json["num_var"])
+    except (KeyError, ValueError, TypeError):
+        return jsonify({"error": "Datos inválidos"}), 400
+
+    trabajo = gestor_trabajos.enviar(instancia, semilla, num_var)
+    return jsonify({"job_id": trabajo.id, "estado": trabajo.estado,
+                    "status_url": url_for("job_status", job_id=trabajo.id)}), 202
+
+@app.route("/jobs", methods=["GET"])
+def jobs_list():
+    return jsonify({"jobs": gestor_trabajos.listar()})
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Estado, generaciones procesadas y HV parciales; 'files' y 'hv' completos al terminar."""
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(trabajo.como_dict())
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    trabajo = gestor_trabajos.cancelar(job_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(trabajo.como_dict())
+
+@app.route("/jobs/<job_id>/stop", methods=["POST"])
+def job_stop(job_id):
+    """Detiene MOEAD (corrida estancada) y cierra el trabajo con las generaciones ya escritas."""
+    trabajo = gestor_trabajos.detener(job_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(trabajo.como_dict())
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-sent events: una 'generacion' por cada POF terminado y los cambios de 'estado'."""
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    try:
+        desde = int(request.headers.get("Last-Event-ID", -1)) + 1
+    except ValueError:
+        desde = 0
+
+    def stream(desde):
+        while True:
+            eventos, terminado = trabajo.esperar_eventos(desde)
+            for k, ev in eventos:
+                yield f"id: {k}\nevent: {ev['tipo']}\ndata: {json.dumps(ev)}\n\n"
+                desde = k + 1
+            if terminado and desde >= len(trabajo.eventos):
+                return
+            if not eventos:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream(desde)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # ------------------- /load -------------------
 @app.route("/load", methods=["POST"])
@@ -348,66 +199,46 @@ def load():
     aed_files = sorted(aed_files, key=gen_number_from_path)
     print("[/load] AEDs GEN ordenados:", [gen_number_from_path(p) for p in aed_files], flush=True)
 
+    # instancia reducida (reduccion.py): los aeds/ se escriben con los IDs de la original
+    mapa_red = cargar_mapa_reduccion(os.path.join("INSTANCES", instancia))
+    instancia_path = os.path.join("INSTANCES", mapa_red["original"] if mapa_red else instancia)
+    extra = {"instancia_original": mapa_red["original"]} if mapa_red else {}
 
     if (not recalcular) and os.path.exists(resumen_path) and aed_files:
         with open(resumen_path) as f:
-            lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+            todas = [line.strip() for line in f if line.strip()]
+        # reducida: sólo si el resumen dice que los aeds/ tienen los IDs de la original con este mapa
+        if not mapa_red or etiqueta_ids(mapa_red) in todas:
+            lines = [line for line in todas if not line.startswith("#")]
             if len(lines) > 1:
                 hv_results = [float(line.split()[1]) for line in lines[1:]]
-        return jsonify({"files": aed_files, "hv": hv_results})
+            return jsonify({"files": aed_files, "hv": hv_results, **extra})
 
     # recalcular y reescribir aeds/ con cobertura
-    nodes, coords_by_id, demanda, preinst_coords, radio = cargar_instancia_coords_y_demanda(os.path.join("INSTANCES", instancia))
+    # la corrida se lee del archivo binario (un mmap) en vez de parsear cada POF;
+    # generaciones idénticas (mapa de revisar.py) no se vuelven a procesar
+    archivo = archivo_al_dia(instancia, raw_files)
+    fuentes = [(archivo, gen_number_from_path(f)) for f in raw_files]
+    aed_files, hv_results = ejecutar_pipeline(
+        instancia_path, fuentes, base_name, fp_folder, aeds_folder,
+        dedup=cargar_mapa_dedup(instancia, raw_files),
+        traduccion=mapa_red["ids"] if mapa_red else None,
+        etiqueta=etiqueta_ids(mapa_red) if mapa_red else None)
 
-    ref_point = calcular_referencia_global(raw_files)
-    hv_results = []
-    aed_files = []
-
-    with open(resumen_path, "w") as resumen_file:
-        resumen_file.write(f"{ref_point[0]} {ref_point[1]}\n")
-        for i, file in enumerate(raw_files, start=1):
-            entries_raw = []
-            with open(file) as f:
-                for ln in f:
-                    parsed = parse_line_with_ids(ln)
-                    if parsed is not None:
-                        x, y, ids, _, _ = parsed
-                        entries_raw.append((x, y, ids))
-
-            if not entries_raw:
-                hv_results.append(0.0)
-                resumen_file.write(f"GEN{i} 0.0\n")
-                continue
-
-            nd_idx = get_non_dominated_idx([(x, y) for (x, y, _) in entries_raw])
-            nd_set = set(nd_idx)
-            nd_entries  = [(x, y, ids, True)  for k, (x, y, ids) in enumerate(entries_raw) if k in nd_set]
-            dom_entries = [(x, y, ids, False) for k, (x, y, ids) in enumerate(entries_raw) if k not in nd_set]
-
-            entries_all = []
-            for (x, y, ids, is_par) in (nd_entries + dom_entries):
-                coords_inst = [coords_by_id[i] for i in ids if i in coords_by_id]
-                _, prob_cov, porc, _, _ = cobertura_por_ids(coords_inst, demanda, preinst_coords, radio)
-                entries_all.append((x, y, ids, is_par, porc))
-
-            aeds_file = os.path.join(aeds_folder, f"{base_name}_Ubicaciones_GEN{i}.dat")
-            coords_for_hv = save_aeds_with_flags_and_coverage(entries_all, aeds_file)
-            aed_files.append(aeds_file)
-
-            fp_file = os.path.join(fp_folder, f"{base_name}_GEN{i}.dat")
-            save_front_to_file(coords_for_hv, fp_file)
-
-            hv = calculate_hv(fp_file, ref_point, gen_number=i) or 0.0
-            hv_results.append(hv)
-            resumen_file.write(f"GEN{i} {hv:.4f}\n")
-        resumen_file.write("#\n")
-    
-    """ print("Archivos AEDs que voy a devolver al front:")
-    for f in aed_files:
-        print(f, os.path.exists(f))
-    """
+    return jsonify({"files": aed_files, "hv": hv_results, **extra})
 
-    return jsonify({"files": aed_files, "hv": hv_results})
+
+def expand_ranges(texto):
+    """
+    '1-7, 9, 12-15' -> [1,2,3,4,5,6,7, 9, 12,13,14,15] (inverso de compress_ranges)
+    """
+    out = []
+    for parte in texto.replace(" ", "").split(","):
+        if not parte:
+            continue
+        ini, _, fin = parte.partition("-")
+        out.extend(range(int(ini), int(fin or ini) + 1))
+    return out
 
 
 def compress_ranges(seq):
@@ -448,39 +279,16 @@ def generar_mapa():
         return "Datos inválidos", 400
 
     base_name = os.path.splitext(os.path.basename(instancia))[0]
-    archivo = f"INSTANCES/{instancia}"
+    archivo = ruta_original(f"INSTANCES/{instancia}")  # los IDs de una reducida son de la original
     if not os.path.exists(archivo):
         return "Instancia no encontrada", 404
 
     nodes, coords_por_id, demanda, preinstalados, radio = cargar_instancia_coords_y_demanda(archivo)
-    ids_seleccionados_set = set(ids_instalados)
-
-    demanda_x, demanda_y, demanda_s = [], [], []
-    movidos_x, movidos_y, movidos_s = [], [], []
-    nuevos_x, nuevos_y = [], []
-    existentes_x, existentes_y = [], []
-    coords_finales_aeds = []
-
-    for idx, x, y, flag, prob in nodes:
-        size = (prob * 200) if show_probs else 20  # 36 ≈ punto fijo
-
-        if idx in ids_seleccionados_set:
-            if flag == 0:
-                nuevos_x.append(x); nuevos_y.append(y)
-                coords_finales_aeds.append((x, y))
-            elif flag == 1:
-                existentes_x.append(x); existentes_y.append(y)
-                coords_finales_aeds.append((x, y))
-        else:
-            if flag == 0:
-                demanda_x.append(x); demanda_y.append(y); demanda_s.append(size)
-            elif flag == 1:
-                movidos_x.append(x); movidos_y.append(y); movidos_s.append(size)
-    
-    puntos_instalados_finales = [coords_por_id[i] for i in ids_instalados if i in coords_por_id]
+
     # métricas
-    nodos_cubiertos, prob_cubierta, porc, total_prob, total_nodos = cobertura_por_ids(
-        puntos_instalados_finales, demanda, [], radio
+    motor = obtener_motor_cobertura(archivo)
+    nodos_cubiertos, prob_cubierta, porc, total_prob, total_nodos = motor.cobertura(
+        ids_instalados, incluir_preinstalados=False
     )
 
     # resumen formateado con IDs en líneas de 40
@@ -493,129 +301,166 @@ def generar_mapa():
         f" - Nodos y probabilidad cubiertos  : {str(nodos_cubiertos).ljust(4)} - {prob_cubierta:.4f} ({porc:.2f}%)"
     )
 
-    # === Graficar ===
-    fig, ax = plt.subplots(figsize=(15, 8), dpi=180)
-
-    # Demanda no cubierta
-    ax.scatter(demanda_x, demanda_y, s=demanda_s, c='blue', label='Nodos de Demanda', alpha=0.6, edgecolors='k')
-    # Origen AEDs movidos
-    ax.scatter(movidos_x, movidos_y, s=movidos_s, facecolors='none', edgecolors='red', linewidth=1.5, label='AED movido')
-    # AEDs preinstalados que se quedaron
-    ax.scatter(existentes_x, existentes_y, c='orange', s=120, marker='*', label='Equipo Preinstalado (mantenido)', edgecolors='k', zorder=4)
-    # Nuevos AEDs instalados
-    ax.scatter(nuevos_x, nuevos_y, c='green', s=120, marker='*', label='AED instalado (Nuevo)', edgecolors='k', zorder=5)
-   
-
-    for x, y in coords_finales_aeds:
-        ax.add_patch(plt.Circle((x, y), radio, color='gray', alpha=0.15, zorder=1))
-
-    xs = [x for _, x, y, _, _ in nodes]
-    ys = [y for _, x, y, _, _ in nodes]
-    if xs and ys:
-        pad = radio
-        minx, maxx = min(xs) - pad, max(xs) + pad
-        miny, maxy = min(ys) - pad, max(ys) + pad
-        ax.set_xlim(minx, maxx)
-        ax.set_ylim(miny, maxy)
-
-    ax.set_aspect('equal', adjustable='box')
-    ax.autoscale(enable=False)
-    ax.set_xlabel("X")
-    ax.set_ylabel("Y")
-    ax.set_title(f"Mapa: {base_name}")
-    ax.grid(True)
-    ax.legend(loc='center left', bbox_to_anchor=(1.02, 0.85), framealpha=0.95)
-    plt.tight_layout(rect=[0, 0, 0.88, 1])
-
-    img_bytes = io.BytesIO()
-    plt.savefig(img_bytes, format='png', bbox_inches='tight', pad_inches=0.15)
-    plt.close()
-    img_bytes.seek(0)
-
-    img_base64 = base64.b64encode(img_bytes.read()).decode('utf-8')
+    # imagen: render cacheado fuera de pyplot (mapas.py); el cliente puede pedirla
+    # directo en /map/imagen (binario + ETag) con inline=false en vez de base64
+    img_url = url_for("imagen_mapa", instancia=instancia, ids=compress_ranges(ids_instalados).replace(" ", ""),
+                      show_probs=int(show_probs))
+    if not data.get("inline", True):
+        renderizador_mapas.solicitar(archivo, ids_instalados, show_probs)
+        return jsonify({"img_url": img_url, "stats": resumen})
+
+    img, _ = renderizador_mapas.obtener(archivo, ids_instalados, show_probs)
+    img_base64 = base64.b64encode(img).decode('utf-8')
     return jsonify({
         "img": img_base64, 
+        "img_url": img_url,
         "stats": resumen
         })
 
-@app.route("/map_json", methods=["POST"])
+
+@app.route("/map/imagen")
+def imagen_mapa():
+    """PNG/WebP del mapa. ?instancia=..&ids=1-7,9&show_probs=1&formato=png|webp"""
+    try:
+        instancia = request.args["instancia"]
+        ids_instalados = expand_ranges(request.args.get("ids", ""))
+        show_probs = request.args.get("show_probs", "1") not in ("0", "false", "")
+    except (KeyError, ValueError):
+        return "Datos inválidos", 400
+    formato = request.args.get("formato", "png")
+    if formato not in FORMATOS_MAPA:
+        return "Formato no soportado", 400
+
+    archivo = ruta_original(os.path.join("INSTANCES", os.path.basename(instancia)))
+    if not os.path.exists(archivo):
+        return "Instancia no encontrada", 404
+
+    etag = etag_mapa(archivo, ids_instalados, show_probs, formato)
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": "private, max-age=3600"})
+    img, etag = renderizador_mapas.obtener(archivo, ids_instalados, show_probs, formato)
+    resp = Response(img, mimetype=FORMATOS_MAPA[formato])
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, max-age=3600"
+    return resp
+
+def _leer_params_mapa():
+    """Parámetros de /map_json por JSON (POST) o query string (GET; ids como rangos '1-7,9')."""
+    if request.method == "GET":
+        a = request.args
+        data = {k: a.get(k) for k in ("instancia", "ids", "show_probs", "x", "y", "formato", "bbox", "px")
+                if a.get(k) is not None}
+        data["show_probs"] = data.get("show_probs", "1") not in ("0", "false", "")
+        for k in ("x", "y", "px"):
+            if k in data:
+                data[k] = float(data[k])
+    else:
+        data = request.json
+    ids = data["ids"]
+    ids = expand_ranges(ids) if isinstance(ids, str) else [int(i) for i in ids]
+    bbox = data.get("bbox")
+    if isinstance(bbox, str):
+        bbox = [float(v) for v in bbox.split(",")]
+    if bbox is not None and len(bbox) != 4:
+        raise ValueError("bbox")
+    return data, ids, bbox
+
+
+_cache_map_json = OrderedDict()  # etag -> (cuerpo, mimetype, cuerpo gzip o None)
+_lock_map_json = threading.Lock()
+MAX_MAP_JSON_CACHE = 64
+
+
+def _responder_cacheado(etag, construir):
+    """Respuesta con ETag (304 si coincide) y gzip si el cliente lo acepta; el cuerpo se memoiza."""
+    if etag in request.if_none_match:
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+    with _lock_map_json:
+        entrada = _cache_map_json.get(etag)
+        if entrada is not None:
+            _cache_map_json.move_to_end(etag)
+    if entrada is None:
+        cuerpo, mimetype = construir()
+        comprimido = gzip.compress(cuerpo, compresslevel=5) if len(cuerpo) > 1024 else None
+        entrada = (cuerpo, mimetype, comprimido)
+        with _lock_map_json:
+            _cache_map_json[etag] = entrada
+            while len(_cache_map_json) > MAX_MAP_JSON_CACHE:
+                _cache_map_json.popitem(last=False)
+    cuerpo, mimetype, comprimido = entrada
+    usar_gzip = comprimido is not None and "gzip" in request.headers.get("Accept-Encoding", "")
+    resp = Response(comprimido if usar_gzip else cuerpo, mimetype=mimetype)
+    if usar_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "private, max-age=3600"
+    resp.set_etag(etag)
+    return resp
+
+
+@app.route("/map_json", methods=["GET", "POST"])
 def map_json():
-    data = request.json
+    """
+    Capas del mapa interactivo.
+      formato: "json" (por defecto, listas) | "binario" (Float32 LE + cabecera JSON, ver mapas.empaquetar_binario)
+      bbox: [xmin, ymin, xmax, ymax] y px (ancho del gráfico): recorta al viewport y, si la
+            demanda visible no se puede dibujar punto a punto, la devuelve agregada en grilla.
+    """
     try:
+        data, ids_instalados, bbox = _leer_params_mapa()
         instancia = data["instancia"]
-        ids_instalados = [int(i) for i in data["ids"]]
         show_probs = bool(data.get("show_probs", True))
         fx = data.get("x"); fy = data.get("y")
+        formato = data.get("formato", "json")
+        px = data.get("px")
+        px = int(px) if px else None
     except (KeyError, ValueError, TypeError):
         return "Datos inválidos", 400
+    if formato not in ("json", "binario"):
+        return "Formato no soportado", 400
 
     base_name = os.path.splitext(os.path.basename(instancia))[0]
-    archivo = f"INSTANCES/{instancia}"
+    archivo = ruta_original(f"INSTANCES/{instancia}")
     if not os.path.exists(archivo):
         return "Instancia no encontrada", 404
 
-    nodes, coords_por_id, demanda, preinstalados_coords_originales, radio = cargar_instancia_coords_y_demanda(archivo)
-
-    ids_seleccionados_set = set(ids_instalados)
-
-    puntos_demanda = {'x': [], 'y': [], 's': []}
-    preinstalados_movidos_origen = {'x': [], 'y': [], 's': []}
-    seleccionados_nuevos = {'x': [], 'y': []}
-    seleccionados_existentes = {'x': [], 'y': []}
-
-    for idx, x, y, flag, prob in nodes:
-        size = (prob * 200) if show_probs else 20  # 36 ≈ punto fijo
-
-        if idx in ids_seleccionados_set:
-            if flag == 0:
-                seleccionados_nuevos['x'].append(x)
-                seleccionados_nuevos['y'].append(y)
-            elif flag == 1:
-                seleccionados_existentes['x'].append(x)
-                seleccionados_existentes['y'].append(y)
-        else:
-            if flag == 0:
-                puntos_demanda['x'].append(x)
-                puntos_demanda['y'].append(y)
-                puntos_demanda['s'].append(size)
-            elif flag == 1:
-                preinstalados_movidos_origen['x'].append(x)
-                preinstalados_movidos_origen['y'].append(y)
-                preinstalados_movidos_origen['s'].append(size)
-
-    coords_finales_aeds = []
-    if seleccionados_nuevos['x']:
-        coords_finales_aeds.extend(list(zip(seleccionados_nuevos['x'], seleccionados_nuevos['y'])))
-    if seleccionados_existentes['x']:
-        coords_finales_aeds.extend(list(zip(seleccionados_existentes['x'], seleccionados_existentes['y'])))
-
-
-    puntos_instalados_finales_coords = [coords_por_id[i] for i in ids_instalados if i in coords_por_id]
-
-    nodos_cubiertos, prob_cubierta, porc, total_prob, total_nodos_demanda = cobertura_por_ids(
-        puntos_instalados_finales_coords, demanda, [], radio
-    )
-    
-    coord_txt = f" ({fx:.2f}, {fy:.2f})" if isinstance(fx, (int, float)) and isinstance(fy, (int, float)) else ""
-    ids_compact = compress_ranges(ids_instalados)
-
-
-    resumen = (
-        f"📊 Instancia {base_name} - Stats Punto {coord_txt}\n"
-        f" - Estaciones manuales instaladas  : {len(ids_instalados):<4} - Estaciones preinstaladas        : {len(preinstalados_coords_originales)}\n"
-        f" - IDs de estaciones manuales      : {ids_compact or '[]'}\n"
-        f" - Total de nodos y probabilidad   : {total_nodos_demanda:<4} - {total_prob:<4}\n"
-        f" - Nodos y probabilidad cubiertos  : {nodos_cubiertos:<4} - {prob_cubierta:<4} ({porc:.2f}%)"
-    ) 
-    return jsonify({
-        "meta": {"instancia": base_name, "radio": radio},
-        "demanda": puntos_demanda,
-        "preinstalados_movidos_origen": preinstalados_movidos_origen,
-        "seleccionados_nuevos": seleccionados_nuevos,
-        "seleccionados_existentes": seleccionados_existentes,
-        "coords_finales_aeds": coords_finales_aeds,
-        "stats": resumen
-        })
+    clave = json.dumps([os.path.abspath(archivo), os.path.getmtime(archivo), hash_ids(ids_instalados),
+                        show_probs, fx, fy, formato, bbox, px])
+    etag = hashlib.sha1(clave.encode()).hexdigest()
+
+    def construir():
+        inst = cargar_instancia(archivo)
+        capas, lod = capas_mapa(inst, ids_instalados, show_probs, bbox=bbox, px=px)
+
+        motor = obtener_motor_cobertura(archivo)
+        nodos_cubiertos, prob_cubierta, porc, total_prob, total_nodos_demanda = motor.cobertura(
+            ids_instalados, incluir_preinstalados=False
+        )
+
+        coord_txt = f" ({fx:.2f}, {fy:.2f})" if isinstance(fx, (int, float)) and isinstance(fy, (int, float)) else ""
+        ids_compact = compress_ranges(ids_instalados)
+        n_preinstalados = int((inst.flag == 1).sum())
+
+        resumen = (
+            f"📊 Instancia {base_name} - Stats Punto {coord_txt}\n"
+            f" - Estaciones manuales instaladas  : {len(ids_instalados):<4} - Estaciones preinstaladas        : {n_preinstalados}\n"
+            f" - IDs de estaciones manuales      : {ids_compact or '[]'}\n"
+            f" - Total de nodos y probabilidad   : {total_nodos_demanda:<4} - {total_prob:<4}\n"
+            f" - Nodos y probabilidad cubiertos  : {nodos_cubiertos:<4} - {prob_cubierta:<4} ({porc:.2f}%)"
+        )
+        meta = {"instancia": base_name, "radio": inst.radio}
+        if formato == "binario":
+            return empaquetar_binario({"meta": meta, "lod": lod, "stats": resumen}, capas), "application/octet-stream"
+
+        listas = capas_a_listas(capas)
+        finales = listas.pop("coords_finales_aeds")
+        listas["coords_finales_aeds"] = [list(p) for p in zip(finales["x"], finales["y"])]
+        cuerpo = dict(meta=meta, **listas, stats=resumen)
+        if bbox is not None or px:
+            cuerpo["lod"] = lod
+        return json.dumps(cuerpo, ensure_ascii=False, separators=(",", ":")).encode(), "application/json"
+
+    return _responder_cacheado(etag, construir)
 
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
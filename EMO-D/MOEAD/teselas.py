@@ -0,0 +1,275 @@
+"""
+Teselas vectoriales (Mapbox Vector Tile 2.1) para /tiles/{capa}/{z}/{x}/{y}.mvt de app.py.
+
+Cada capa (cámaras, reportes, colonias, fronteras) se proyecta una vez a Web
+Mercator (EPSG:3857) y se indexa con un STRtree. Para cada tesela:
+  - se consultan sólo las geometrías que tocan la tesela (más un borde de BORDE unidades),
+  - los polígonos se recortan a la tesela y se simplifican a SIMPLIFICAR_PX píxeles de pantalla,
+  - los puntos se agrupan por píxel de pantalla hasta ZOOM_DETALLE (propiedad "n" = puntos agrupados),
+  - todo se codifica como protobuf con un codificador propio (sin dependencias extra).
+CacheTeselas guarda las últimas teselas generadas (LRU).
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+from shapely.geometry import shape
+
+EXTENT = 4096
+BORDE = 64  # unidades de tesela alrededor, para que no se vean costuras entre teselas
+PIXELES = 256  # tamaño en pantalla de una tesela
+SIMPLIFICAR_PX = 0.5
+ZOOM_DETALLE = 15  # desde este zoom se mandan todos los puntos
+MAX_ZOOM = 22
+MAX_TESELAS_CACHE = int(os.getenv("MAX_TESELAS_CACHE", 2048))
+
+MEDIO_MUNDO = 20037508.342789244  # mitad del ancho del mundo en EPSG:3857 (m)
+_tf_wgs2merc = Transformer.from_crs(4326, 3857, always_xy=True)
+
+_PUNTO, _LINEA, _POLIGONO = 1, 2, 3
+_MOVER, _LINEA_A, _CERRAR = 1, 2, 7
+
+
+def limites_tesela(z, x, y):
+    """(minx, miny, maxx, maxy) de la tesela z/x/y en EPSG:3857 (esquema XYZ, y hacia abajo)."""
+    lado = 2 * MEDIO_MUNDO / (1 << z)
+    minx = -MEDIO_MUNDO + x * lado
+    maxy = MEDIO_MUNDO - y * lado
+    return minx, maxy - lado, minx + lado, maxy
+
+
+def _a_mercator(coords):
+    return np.column_stack(_tf_wgs2merc.transform(coords[:, 0], coords[:, 1]))
+
+
+# ---------- protobuf ----------
+def _varint(n, out):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _campo_bytes(num, datos, out):
+    _varint((num << 3) | 2, out)
+    _varint(len(datos), out)
+    out += datos
+
+
+def _campo_varint(num, v, out):
+    _varint(num << 3, out)
+    _varint(v, out)
+
+
+def _empaquetados(num, valores, out):
+    buf = bytearray()
+    for v in valores:
+        _varint(v, buf)
+    _campo_bytes(num, buf, out)
+
+
+def _valor(v):
+    """Mensaje Value de MVT."""
+    out = bytearray()
+    if isinstance(v, bool):
+        _campo_varint(7, int(v), out)
+    elif isinstance(v, int):
+        if v >= 0:
+            _campo_varint(5, v, out)
+        else:
+            _campo_varint(6, _zigzag(v), out)
+    elif isinstance(v, float):
+        _varint((3 << 3) | 1, out)
+        out += struct.pack("<d", v)
+    else:
+        _campo_bytes(1, str(v).encode("utf-8"), out)
+    return bytes(out)
+
+
+# ---------- geometría en coordenadas de tesela ----------
+def _anillo(coords):
+    """Anillo redondeado a enteros, sin el punto de cierre ni repetidos consecutivos; None si degenera."""
+    pts = np.rint(coords).astype(np.int64)
+    if len(pts) > 1 and (pts[0] == pts[-1]).all():
+        pts = pts[:-1]
+    if len(pts) > 1:
+        distinto = np.any(pts != np.roll(pts, 1, axis=0), axis=1)
+        pts = pts[distinto]
+    if len(pts) < 3:
+        return None
+    return pts
+
+
+def _area(pts):
+    """Fórmula del topógrafo en coordenadas de tesela (y hacia abajo): > 0 es horario en pantalla."""
+    x, y = pts[:, 0], pts[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2.0
+
+
+def _comandos_poligonos(poligonos, a_tesela):
+    """Comandos de geometría de una lista de shapely.Polygon; exterior horario, agujeros antihorarios."""
+    cmds, cx, cy = [], 0, 0
+    for poly in poligonos:
+        ext = _anillo(a_tesela(np.asarray(poly.exterior.coords)[:, :2]))
+        if ext is None or _area(ext) == 0:
+            continue
+        anillos = [ext if _area(ext) > 0 else ext[::-1]]
+        for interior in poly.interiors:
+            hueco = _anillo(a_tesela(np.asarray(interior.coords)[:, :2]))
+            if hueco is None or _area(hueco) == 0:
+                continue
+            anillos.append(hueco if _area(hueco) < 0 else hueco[::-1])
+        for pts in anillos:
+            lista = pts.tolist()
+            x0, y0 = lista[0]
+            cmds += [(_MOVER | (1 << 3)), _zigzag(x0 - cx), _zigzag(y0 - cy)]
+            cx, cy = x0, y0
+            cmds.append(_LINEA_A | ((len(lista) - 1) << 3))
+            for x, y in lista[1:]:
+                cmds += [_zigzag(x - cx), _zigzag(y - cy)]
+                cx, cy = x, y
+            cmds.append(_CERRAR | (1 << 3))
+    return cmds
+
+
+def _partes_poligonales(geom):
+    if geom is None or geom.is_empty:
+        return []
+    tipo = geom.geom_type
+    if tipo == "Polygon":
+        return [geom]
+    if tipo in ("MultiPolygon", "GeometryCollection"):
+        return [p for g in geom.geoms for p in _partes_poligonales(g)]
+    return []
+
+
+def _propiedades_escalares(props):
+    return {k: v for k, v in (props or {}).items() if isinstance(v, (str, int, float, bool)) and v == v}
+
+
+class CapaTeselas:
+    """Una capa proyectada a EPSG:3857 con su índice espacial."""
+
+    def __init__(self, nombre, geoms, props, puntos):
+        self.nombre = nombre
+        self.geoms = geoms  # arreglo de geometrías shapely (EPSG:3857)
+        self.props = props
+        self.puntos = puntos
+        self.arbol = shapely.STRtree(geoms)
+        if puntos:
+            self.xy = shapely.get_coordinates(geoms)
+
+    @classmethod
+    def desde_features(cls, nombre, features):
+        """Features GeoJSON en WGS84 (las de los caches de app.py)."""
+        validas = [f for f in features if f.get("geometry")]
+        puntos = all(f["geometry"].get("type") == "Point" for f in validas)
+        if puntos:
+            lonlat = np.array([f["geometry"]["coordinates"][:2] for f in validas], dtype=float).reshape(-1, 2)
+            geoms = shapely.points(_a_mercator(lonlat)) if len(lonlat) else np.empty(0, dtype=object)
+        else:
+            geoms = shapely.transform(np.array([shape(f["geometry"]) for f in validas],
+                                               dtype=object), _a_mercator)
+        props = [_propiedades_escalares(f.get("properties")) for f in validas]
+        return cls(nombre, geoms, props, puntos)
+
+    def tesela(self, z, x, y):
+        """Bytes de la capa en la tesela z/x/y (b"" si no hay nada)."""
+        minx, miny, maxx, maxy = limites_tesela(z, x, y)
+        escala = EXTENT / (maxx - minx)
+        b = BORDE / escala
+        idx = self.arbol.query(shapely.box(minx - b, miny - b, maxx + b, maxy + b))
+        if len(idx) == 0:
+            return b""
+        idx = np.sort(idx)  # orden original de los datos
+
+        def a_tesela(c):
+            return np.column_stack(((c[:, 0] - minx) * escala, (maxy - c[:, 1]) * escala))
+
+        feats = []  # (propiedades, tipo, comandos)
+        if self.puntos:
+            pts = np.rint(a_tesela(self.xy[idx])).astype(np.int64)
+            paso = 1 if z >= ZOOM_DETALLE else EXTENT // PIXELES
+            celdas = np.floor_divide(pts, paso)
+            _, primeros, inversa, n = np.unique(celdas, axis=0, return_index=True,
+                                                return_inverse=True, return_counts=True)
+            for j in np.sort(primeros).tolist():
+                props = self.props[idx[j]]
+                k = n[inversa.ravel()[j]]
+                if k > 1:
+                    props = dict(props, n=int(k))
+                px, py = pts[j].tolist()
+                feats.append((props, _PUNTO, [_MOVER | (1 << 3), _zigzag(px), _zigzag(py)]))
+        else:
+            recortes = shapely.clip_by_rect(self.geoms[idx], minx - b, miny - b, maxx + b, maxy + b)
+            tolerancia = SIMPLIFICAR_PX * (maxx - minx) / PIXELES
+            recortes = shapely.simplify(recortes, tolerancia, preserve_topology=True)
+            for i, geom in zip(idx.tolist(), recortes):
+                cmds = _comandos_poligonos(_partes_poligonales(geom), a_tesela)
+                if cmds:
+                    feats.append((self.props[i], _POLIGONO, cmds))
+        return self._codificar(feats)
+
+    def _codificar(self, feats):
+        if not feats:
+            return b""
+        claves, valores = {}, {}
+        capa = bytearray()
+        _campo_varint(15, 2, capa)  # version
+        _campo_bytes(1, self.nombre.encode("utf-8"), capa)
+        for props, tipo, cmds in feats:
+            tags = []
+            for k, v in props.items():
+                tags.append(claves.setdefault(k, len(claves)))
+                tags.append(valores.setdefault((type(v).__name__, v), len(valores)))
+            f = bytearray()
+            if tags:
+                _empaquetados(2, tags, f)
+            _campo_varint(3, tipo, f)
+            _empaquetados(4, cmds, f)
+            _campo_bytes(2, f, capa)
+        for k in claves:
+            _campo_bytes(3, k.encode("utf-8"), capa)
+        for (_, v) in valores:
+            _campo_bytes(4, _valor(v), capa)
+        _campo_varint(5, EXTENT, capa)
+        tile = bytearray()
+        _campo_bytes(3, capa, tile)
+        return bytes(tile)
+
+
+class CacheTeselas:
+    """LRU de teselas ya codificadas: (capa, z, x, y) -> bytes."""
+
+    def __init__(self, max_teselas=MAX_TESELAS_CACHE):
+        self.max_teselas = max_teselas
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, capa, z, x, y):
+        clave = (capa.nombre, z, x, y)
+        with self._lock:
+            cuerpo = self._cache.get(clave)
+            if cuerpo is not None:
+                self._cache.move_to_end(clave)
+                return cuerpo
+        cuerpo = capa.tesela(z, x, y)
+        with self._lock:
+            self._cache[clave] = cuerpo
+            self._cache.move_to_end(clave)
+            while len(self._cache) > self.max_teselas:
+                self._cache.popitem(last=False)
+        return cuerpo
+
+
+def tesela_valida(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
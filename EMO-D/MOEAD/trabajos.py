@@ -0,0 +1,274 @@
+"""
+Cola de trabajos para ejecuciones de MOEAD (/run asíncrono).
+
+Cada trabajo ejecuta ./MOEAD en un pool de hilos acotado a los núcleos
+disponibles. Mientras MOEAD corre, cada POF_<inst>_GEN_<n>.dat que termina de
+escribirse se procesa con pipeline.procesar_en_vivo (P/D, cobertura, HV; lo
+mismo que usa /load) y se publica como evento
+(/jobs/<id>/events, SSE). El HV en vivo usa una referencia provisional (máximos
+vistos hasta ese momento); al terminar se recalcula con la referencia global.
+Cada POF se agrega además al archivo binario de la corrida (archivo_corrida.py)
+y al terminar se guarda su mapa de dedup (revisar.py): el /load siguiente no
+vuelve a parsear ni a hashear los POF.
+
+El cliente consulta el estado y los HV parciales por id, puede cancelar el
+trabajo (descarta resultados) o detenerlo (corta MOEAD y cierra con lo generado;
+si MOEAD todavía no arrancó, el trabajo queda cancelado).
+Si la misma instancia/semilla/num_var ya se corrió, el resultado sale de
+cache_resultados.py sin lanzar MOEAD (desde_cache=True).
+
+Estados: en_cola -> ejecutando -> procesando -> terminado | error | cancelado
+Eventos SSE: 'estado' (cambios de estado, el último trae hv/files finales) y
+'generacion' (i, frente Pareto, aeds_file, hv y ref provisionales).
+"""
+import os
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_resultados
+from archivo_corrida import EscritorArchivo, descartar, reemplazar, ruta_archivo, ruta_temporal
+from frentes import gen_number_from_path
+from hipervolumen import hipervolumen
+from pipeline import (PipelineCancelado, cerrar_pipeline, instantanea_pof, procesar_en_vivo,
+                      vigilar_generaciones)
+from reduccion import cargar_mapa as cargar_mapa_reduccion, etiqueta_ids
+from revisar import guardar_mapa as guardar_mapa_dedup
+
+MAX_TRABAJOS = int(os.getenv("MAX_TRABAJOS", os.cpu_count() or 1))
+MAX_TRABAJOS_GUARDADOS = 200  # terminados que se recuerdan para consultas
+
+ESTADOS_FINALES = ("terminado", "error", "cancelado")
+
+
+class Trabajo:
+    def __init__(self, instancia, semilla, num_var):
+        self.id = uuid.uuid4().hex[:12]
+        self.instancia = instancia
+        self.semilla = semilla
+        self.num_var = num_var
+        self.estado = "en_cola"
+        self.error = None
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.total_generaciones = 0
+        self.generaciones_procesadas = 0
+        self.hv = []
+        self.files = []
+        self.desde_cache = False
+        self.cancelar = threading.Event()
+        self.detener = threading.Event()
+        self.proceso = None
+        self.future = None
+        self.eventos = []  # [(id, dict)] sólo se agregan
+        self._cond = threading.Condition()
+
+    def publicar(self, tipo, **datos):
+        with self._cond:
+            self.eventos.append((len(self.eventos), dict(datos, tipo=tipo)))
+            self._cond.notify_all()
+
+    def esperar_eventos(self, desde, timeout=15.0):
+        """Eventos con id >= desde; bloquea hasta timeout si no hay nuevos. Devuelve (eventos, terminado)."""
+        with self._cond:
+            if len(self.eventos) <= desde and self.estado not in ESTADOS_FINALES:
+                self._cond.wait(timeout)
+            return self.eventos[desde:], self.estado in ESTADOS_FINALES
+
+    def como_dict(self):
+        return {
+            "job_id": self.id,
+            "instancia": self.instancia,
+            "semilla": self.semilla,
+            "num_var": self.num_var,
+            "estado": self.estado,
+            "error": self.error,
+            "creado": self.creado,
+            "inicio": self.inicio,
+            "fin": self.fin,
+            "total_generaciones": self.total_generaciones,
+            "generaciones_procesadas": self.generaciones_procesadas,
+            "hv": list(self.hv),
+            "files": list(self.files),
+            "desde_cache": self.desde_cache,
+        }
+
+
+class GestorTrabajos:
+    def __init__(self, max_trabajos=MAX_TRABAJOS):
+        self.max_trabajos = max(1, int(max_trabajos))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_trabajos, thread_name_prefix="moead")
+        self._trabajos = OrderedDict()  # id -> Trabajo
+        self._lock = threading.Lock()
+        # MOEAD escribe en SAVING/MOEAD/POF/POF_<inst>_GEN_*.dat: una ejecución por instancia a la vez
+        self._locks_instancia = {}
+
+    # ---------- API ----------
+    def enviar(self, instancia, semilla, num_var):
+        t = Trabajo(instancia, semilla, num_var)
+        with self._lock:
+            self._trabajos[t.id] = t
+            self._purgar()
+        t.future = self._pool.submit(self._ejecutar, t)
+        return t
+
+    def obtener(self, job_id):
+        with self._lock:
+            return self._trabajos.get(job_id)
+
+    def listar(self):
+        with self._lock:
+            return [t.como_dict() for t in self._trabajos.values()]
+
+    def cancelar(self, job_id):
+        t = self.obtener(job_id)
+        if t is None:
+            return None
+        t.cancelar.set()
+        if t.future is not None and t.future.cancel():
+            self._finalizar(t, "cancelado")
+        self._terminar_proceso(t)
+        return t
+
+    def detener(self, job_id):
+        """Corta MOEAD (p. ej. corrida estancada) pero cierra con las generaciones ya escritas."""
+        t = self.obtener(job_id)
+        if t is None:
+            return None
+        t.detener.set()
+        self._terminar_proceso(t)
+        return t
+
+    # ---------- internos ----------
+    def _purgar(self):
+        terminados = [k for k, t in self._trabajos.items() if t.estado in ESTADOS_FINALES]
+        for k in terminados[:max(0, len(terminados) - MAX_TRABAJOS_GUARDADOS)]:
+            del self._trabajos[k]
+
+    def _lock_de(self, instancia):
+        with self._lock:
+            return self._locks_instancia.setdefault(instancia, threading.Lock())
+
+    @staticmethod
+    def _terminar_proceso(t):
+        proc = t.proceso
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+
+    def _finalizar(self, t, estado, error=None):
+        t.estado = estado
+        t.error = error
+        t.fin = time.time()
+        t.publicar("estado", estado=estado, error=error, hv=list(t.hv), files=list(t.files))
+
+    def _ejecutar(self, t):
+        if t.cancelar.is_set():
+            self._finalizar(t, "cancelado")
+            return
+        try:
+            with self._lock_de(t.instancia):
+                # cancelado o detenido mientras esperaba a otra corrida de la instancia: no hay
+                # generaciones propias que cerrar y no se toca ningún archivo
+                if t.cancelar.is_set() or t.detener.is_set():
+                    self._finalizar(t, "cancelado")
+                    return
+                t.inicio = time.time()
+                self._correr(t)
+        except PipelineCancelado:
+            self._finalizar(t, "cancelado")
+        except Exception as e:
+            print(f"[trabajos] {t.id} falló: {e}")
+            self._finalizar(t, "error", str(e))
+
+    def _correr(self, t):
+        full_path = os.path.join("INSTANCES", t.instancia)
+        if not os.path.exists(full_path):
+            raise FileNotFoundError(f"Instancia no encontrada: {full_path}")
+
+        base_name = os.path.splitext(os.path.basename(t.instancia))[0]
+        fp_folder = os.path.join("FrentesDePareto", base_name)
+        aeds_folder = os.path.join("aeds", base_name)
+        patron = f"SAVING/MOEAD/POF/POF_{t.instancia}_GEN_*.dat"
+        # instancia reducida (reduccion.py): los aeds/ se escriben con los IDs de la original, como en /load
+        mapa_red = cargar_mapa_reduccion(full_path)
+        ids_path = os.path.join("INSTANCES", mapa_red["original"]) if mapa_red else full_path
+        traduccion = mapa_red["ids"] if mapa_red else None
+
+        # misma instancia/semilla/num_var/parámetros -> mismo resultado: no se vuelve a correr MOEAD
+        clave = cache_resultados.clave_resultado(full_path, t.semilla, t.num_var)
+        guardado = cache_resultados.obtener(clave, base_name)
+        if guardado is not None:
+            t.desde_cache = True
+            t.files, t.hv = guardado["files"], guardado["hv"]
+            t.total_generaciones = t.generaciones_procesadas = len(t.hv)
+            self._finalizar(t, "terminado")
+            return
+
+        if t.cancelar.is_set() or t.detener.is_set():
+            raise PipelineCancelado()  # llegó durante la consulta a la caché: MOEAD no se lanza
+        t.estado = "ejecutando"
+        t.publicar("estado", estado=t.estado)
+        previos = instantanea_pof(patron)
+        t.proceso = subprocess.Popen(["./MOEAD", full_path, str(t.semilla), str(t.num_var)])
+        if t.cancelar.is_set() or t.detener.is_set():
+            self._terminar_proceso(t)  # llegó mientras se lanzaba el proceso
+
+        # cada generación se procesa (en el pool de pipeline.py) apenas MOEAD la termina de escribir
+        # y se agrega al archivo de la corrida, que queda listo para /load
+        resultados = []
+        archivo = ruta_archivo(t.instancia)
+        tmp = ruta_temporal(archivo)
+        fuentes = vigilar_generaciones(patron, t.proceso, previos, cancelar=t.cancelar, latido=True)
+        try:
+            with EscritorArchivo(tmp, nuevo=True) as escritor:
+                vivo = procesar_en_vivo(ids_path, fuentes, base_name, fp_folder, aeds_folder,
+                                        traduccion=traduccion, cancelar=t.cancelar, archivo=escritor)
+                try:
+                    for res, ref in vivo:
+                        resultados.append(res)
+                        i = res["i"]
+                        t.total_generaciones = t.generaciones_procesadas = i
+                        hv = 0.0
+                        if res["aeds_file"] is not None:
+                            t.files.append(res["aeds_file"])
+                            hv = hipervolumen(res["coords_hv"], ref)
+                        t.hv.append(hv)
+                        t.publicar("generacion", i=i, archivo=res["archivo"], aeds_file=res["aeds_file"],
+                                   frente=[list(p) for p in res["coords_hv"]], hv=hv,
+                                   ref=list(ref) if res["aeds_file"] is not None else None)
+                except PipelineCancelado:
+                    t.proceso.wait()  # cancelar() ya le pidió terminar
+                    raise
+                finally:
+                    vivo.close()
+            t.proceso.wait()
+            if t.cancelar.is_set():
+                raise PipelineCancelado()
+        except BaseException:
+            descartar(tmp)
+            raise
+        pof_files = [res["archivo"] for res in resultados]
+        reemplazar(tmp, archivo)
+        # el mapa de dedup también: /load no vuelve a parsear ni a hashear los POF
+        gens = [gen_number_from_path(f) for f in pof_files]
+        guardar_mapa_dedup(f"POF_{t.instancia}", pof_files,
+                           {g: gens[res.get("canonica", res["i"]) - 1] for g, res in zip(gens, resultados)})
+
+        t.estado = "procesando"
+        t.publicar("estado", estado=t.estado)
+        # HV definitivos con la referencia global de toda la corrida
+        aed_files, hv_results = cerrar_pipeline(resultados, base_name, fp_folder,
+                                                etiqueta=etiqueta_ids(mapa_red) if mapa_red else None)
+        t.files, t.hv = aed_files, hv_results
+        if not t.detener.is_set() and t.proceso.returncode == 0:
+            # sólo corridas completas: una detenida no es el resultado de esos parámetros
+            fp_files = [os.path.join(fp_folder, f"{base_name}_GEN{res['i']}.dat")
+                        for res in resultados if res["aeds_file"] is not None]
+            fp_files.append(os.path.join(fp_folder, f"{base_name}_HV_summary.txt"))
+            cache_resultados.guardar(clave, t.instancia, t.semilla, t.num_var,
+                                     pof_files, aed_files, fp_files, hv_results)
+        self._finalizar(t, "terminado")